@@ -0,0 +1,16 @@
+"""
+Offline benchmarks for rodeo's hot paths.
+
+Run them from the repository root with ``python -m benchmarks run``; see
+the Benchmarks section of TESTS.md.  Every benchmark talks to tests/stub_server.py or
+the in-process stub provider, never to the real API.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+for path in (SRC, ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,64 @@
+import os
+import sys
+import json
+import argparse
+from benchmarks import ROOT
+from benchmarks import harness
+
+SUITES = ("bench_cli", "bench_session", "bench_prompt", "bench_search", "bench_throughput")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def _seconds(value):
+    return f"{value * 1000:.2f}ms" if value < 1 else f"{value:.2f}s"
+
+
+def run(args):
+    import importlib
+    for suite in SUITES:
+        importlib.import_module(f"benchmarks.{suite}")
+
+    def progress(name, result):
+        rate = f"  {result['per_second']:,.0f}/s" if "per_second" in result else ""
+        print(f"{name:<70} {_seconds(result['median']):>10}  ±{_seconds(result['stdev'])}{rate}", flush=True)
+
+    results = harness.run(args.filter, quick=args.quick, repeat=args.repeat, progress=progress)
+    output = args.output or os.path.join(RESULTS_DIR, f"{(results['commit'] or 'unknown')[:10]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+
+def compare(args):
+    rows = harness.compare(harness.load(args.base), harness.load(args.new), args.threshold)
+    for name, old, new, ratio, verdict in rows:
+        print(f"{name:<70} {_seconds(old):>10} {_seconds(new):>10} {ratio:6.2f}x  {verdict}")
+    if any(verdict == "slower" for *_, verdict in rows):
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Run or compare rodeo's offline benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks and write their results as JSON")
+    run_parser.add_argument("-k", "--filter", help="Only run benchmarks whose name contains this text")
+    run_parser.add_argument("--quick", action="store_true", help="Run the two smallest sizes of each benchmark once")
+    run_parser.add_argument("--repeat", type=int, help="Timed passes per case (default: per benchmark)")
+    run_parser.add_argument("--output", help="Results file (default: benchmarks/results/COMMIT.json)")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="Compare two results files; exits 1 on a regression")
+    compare_parser.add_argument("base", help="Results of the baseline commit")
+    compare_parser.add_argument("new", help="Results to check against it")
+    compare_parser.add_argument("--threshold", type=float, default=1.1,
+                                help="Median time ratio that counts as a regression (default: 1.1)")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""CLI cold start: a fresh process per invocation, as from a shell."""
+import os
+import sys
+import json
+import subprocess
+from benchmarks import ROOT, SRC
+from benchmarks.harness import benchmark
+from tests.stub_server import StubAPI
+
+RODEO = os.path.join(ROOT, "rodeo")
+
+
+def _env(tmpdir):
+    # Keep the user's config, metrics and cache out of the measurement.
+    env = {k: v for k, v in os.environ.items() if not k.startswith("RODEO_")}
+    env.update(PYTHONPATH=SRC, HOME=tmpdir, ANTHROPIC_API_KEY="bench")
+    return env
+
+
+@benchmark(repeat=10)
+def import_cli(timer):
+    env = _env(timer.tmpdir)
+    for _ in timer:
+        subprocess.run([sys.executable, "-c", "import rodeo.cli"], env=env, check=True)
+
+
+@benchmark(params={"provider": ["stub", "http"]}, repeat=10)
+def one_prompt(timer, provider):
+    """A whole `rodeo "prompt"` run: start-up, session load, request and save."""
+    env = _env(timer.tmpdir)
+    config = os.path.join(timer.tmpdir, "config.json")
+    session = os.path.join(timer.tmpdir, "session")
+    with StubAPI() as api:
+        with open(config, 'w') as f:
+            json.dump({"providers": {"http": {"type": "anthropic", "url": api.url}}}, f)
+        argv = [sys.executable, RODEO, "--no-daemon", "--config", config, "--provider", provider,
+                "--session", session, "hello"]
+        for _ in timer:
+            subprocess.run(argv, env=env, stdin=subprocess.DEVNULL, capture_output=True, check=True)
@@ -0,0 +1,25 @@
+"""Building the prompt from a command and large piped input."""
+from benchmarks.harness import benchmark
+from rodeo.cli import process_command
+
+SIZES = [1_000, 1_000_000, 10_000_000]
+
+
+class NullChat:
+    """Accepts the prompt without sending it, so only the substitution is measured."""
+
+    prompt_cache = False
+
+    def get_response(self, content):
+        return content
+
+
+@benchmark(params={"size": SIZES, "placeholder": [True, False], "prompt_cache": [False, True]})
+def process(timer, size, placeholder, prompt_cache):
+    chat = NullChat()
+    chat.prompt_cache = prompt_cache
+    command = "Summarize this log: $(cat)" if placeholder else "Summarize this log"
+    input_text = ("127.0.0.1 - - GET /index.html 200\n" * (size // 35 + 1))[:size]
+    for _ in timer:
+        process_command(command, chat, input_text)
+    timer.items = size
@@ -0,0 +1,66 @@
+"""History retrieval: building, loading, extending and querying the search index."""
+import os
+import random
+from benchmarks.harness import benchmark
+from rodeo.search import SearchIndex
+
+HISTORY = [1000, 10000, 100000]
+QUERIES = ["rare", "common", "long"]
+
+# A Zipf-like vocabulary, so some words are in most messages and some in few.
+WORDS = [f"word{i}" for i in range(20000)]
+WEIGHTS = [1 / (i + 1) for i in range(len(WORDS))]
+
+
+def make_history(messages, seed=0):
+    rng = random.Random(seed)
+    return [{"role": ("user", "assistant")[i % 2], "content": " ".join(rng.choices(WORDS, WEIGHTS, k=40))}
+            for i in range(messages)]
+
+
+def make_index(tmpdir, messages):
+    history = make_history(messages)
+    path = os.path.join(tmpdir, "session.search")
+    SearchIndex(path).sync(history)
+    return path, history
+
+
+@benchmark(params={"messages": HISTORY}, repeat=3)
+def build(timer, messages):
+    """Indexing a whole existing session, as the first retrieving request does."""
+    history = make_history(messages)
+    for i, _ in enumerate(timer):
+        SearchIndex(os.path.join(timer.tmpdir, f"{i}.search")).sync(history)
+    timer.items = messages
+
+
+@benchmark(params={"messages": HISTORY})
+def load(timer, messages):
+    """Reading a saved index back, as each new invocation does."""
+    path, history = make_index(timer.tmpdir, messages)
+    for _ in timer:
+        SearchIndex(path).sync(history)
+
+
+@benchmark(params={"messages": HISTORY})
+def add_turn(timer, messages):
+    """Indexing one new turn and appending it to the index file."""
+    path, history = make_index(timer.tmpdir, messages)
+    index = SearchIndex(path)
+    index.sync(history)
+    for i, _ in enumerate(timer):
+        history.extend([{"role": "user", "content": f"question {i} about word{i}"},
+                        {"role": "assistant", "content": f"answer {i} about word{i * 7}"}])
+        index.sync(history)
+
+
+@benchmark(params={"messages": HISTORY, "query": QUERIES}, repeat=20)
+def query(timer, messages, query):
+    """Ranking the history against a prompt of rare words, common words, or many words."""
+    text = {"rare": "word15000 word19000", "common": "word40 word50", "long": " ".join(WORDS[20:60:2])}[query]
+    history = make_history(messages)
+    index = SearchIndex()
+    index.sync(history)
+    index.search(text)  # Unpack the postings once, as the process's first query does.
+    for _ in timer:
+        index.search(text, before=messages - 20)
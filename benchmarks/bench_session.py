@@ -0,0 +1,100 @@
+"""Session load and save time, disk footprint, and per-turn request cost, as the history grows."""
+import os
+import json
+from benchmarks.harness import benchmark
+from tests.stub_server import StubAPI
+from rodeo.chat import Chat
+from rodeo.messages import encode_request
+from rodeo.session_manager import open_store
+
+HISTORY = [10, 100, 1000, 10000, 50000]
+BACKENDS = ["jsonl", "sqlite"]
+LAYOUTS = ["tiered", "plain"]
+
+
+def make_session(tmpdir, backend, messages):
+    """Create a session of ``messages`` messages of about 500 characters each."""
+    if backend == "sqlite":
+        spec = f"sqlite:{os.path.join(tmpdir, 'sessions.db')}#bench"
+    else:
+        spec = os.path.join(tmpdir, "session")
+    text = "The quick brown fox jumps over the lazy dog. " * 11
+    history = [{"role": ("user", "assistant")[i % 2], "content": f"{i} {text}"} for i in range(messages)]
+    open_store(spec).append(history)
+    return spec
+
+
+@benchmark(params={"messages": HISTORY, "backend": BACKENDS})
+def load(timer, messages, backend):
+    spec = make_session(timer.tmpdir, backend, messages)
+    for _ in timer:
+        assert len(Chat(spec).messages) == messages
+    timer.items = messages
+
+
+def make_layout(path, layout, messages):
+    """Write a session file whose old turns are moved to cold segments ("tiered") or all kept in the log ("plain")."""
+    store = open_store(path)
+    if layout == "plain":
+        store.hot_messages = float("inf")
+    text = "The quick brown fox jumps over the lazy dog. " * 11
+    store.append([{"role": ("user", "assistant")[i % 2], "content": f"{i} {text}"} for i in range(messages)])
+    return store
+
+
+@benchmark(params={"messages": HISTORY, "layout": LAYOUTS}, repeat=3)
+def footprint(timer, messages, layout):
+    """Writing a session, and the bytes it takes on disk (disk_bytes)."""
+    for _ in timer:
+        store = make_layout(os.path.join(timer.tmpdir, f"session{len(timer.samples)}"), layout, messages)
+    paths = [store.path, store.index_path, store.cold_path]
+    timer.extra["disk_bytes"] = sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+
+@benchmark(params={"messages": HISTORY, "layout": LAYOUTS, "read": ["recent", "all"]})
+def load_layout(timer, messages, layout, read):
+    """Loading a session, then reading its last 20 messages as a windowed turn does, or all of them as an export does."""
+    spec = make_layout(os.path.join(timer.tmpdir, "session"), layout, messages).path
+    for _ in timer:
+        history = Chat(spec).messages
+        if read == "recent":
+            history[-20:]
+        else:
+            list(history)
+    timer.items = messages
+
+
+@benchmark(params={"messages": HISTORY, "backend": BACKENDS})
+def save_turn(timer, messages, backend):
+    """Persisting one new turn onto an already loaded history."""
+    spec = make_session(timer.tmpdir, backend, messages)
+    chat = Chat(spec)
+    chat.messages
+    for _ in timer:
+        chat.messages.extend([{"role": "user", "content": "next"}, {"role": "assistant", "content": "NEXT"}])
+        chat._save_session()
+
+
+@benchmark(params={"messages": HISTORY, "encoder": ["cached", "json"]})
+def request_body(timer, messages, encoder):
+    """Encoding the request body of the next turn: from cached message encodings, or all over again."""
+    chat = Chat(make_session(timer.tmpdir, "jsonl", messages))
+    payload = chat.build_request("next")
+    for _ in timer:
+        if encoder == "cached":
+            body = encode_request(payload)
+        else:
+            body = json.dumps(payload, default=dict).encode()
+    timer.items = len(body)
+
+
+@benchmark(params={"messages": HISTORY}, repeat=3)
+def turn(timer, messages):
+    """A whole turn against the local stub API: payload, request body, HTTP round trip and session append."""
+    spec = make_session(timer.tmpdir, "jsonl", messages)
+    with StubAPI() as api:
+        chat = Chat(spec)
+        chat.api_url = api.url
+        chat.messages
+        for _ in timer:
+            chat.get_response("next")
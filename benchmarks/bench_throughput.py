@@ -0,0 +1,60 @@
+"""Request throughput at increasing concurrency against the local stub API."""
+import asyncio
+import threading
+from benchmarks.harness import benchmark
+from tests.stub_server import StubAPI
+from rodeo.async_chat import AsyncChat
+from rodeo.batch import run_batch
+from rodeo.chat import Chat
+from rodeo.transport import Transport
+
+REQUESTS = 64
+LATENCY = 0.01
+
+
+@benchmark(params={"concurrency": [1, 4, 16], "stream": [False, True]})
+def threads(timer, concurrency, stream):
+    """REQUESTS one-turn chats over a shared Transport from ``concurrency`` threads."""
+    with StubAPI(latency=LATENCY) as api:
+        transport = Transport(pool_size=concurrency)
+
+        def worker(count):
+            for _ in range(count):
+                chat = Chat(None, transport=transport)
+                chat.api_url = api.url
+                if stream:
+                    "".join(chat.stream_response("hello"))
+                else:
+                    chat.get_response("hello")
+
+        try:
+            for _ in timer:
+                workers = [threading.Thread(target=worker, args=(REQUESTS // concurrency,)) for _ in range(concurrency)]
+                for thread in workers:
+                    thread.start()
+                for thread in workers:
+                    thread.join()
+        finally:
+            transport.close()
+    timer.items = REQUESTS
+
+
+@benchmark(params={"concurrency": [4, 16]})
+def batch(timer, concurrency):
+    """`rodeo batch` over REQUESTS prompts."""
+    prompts = [{"prompt": f"prompt {i}"} for i in range(REQUESTS)]
+    with StubAPI(latency=LATENCY) as api:
+        transport = Transport(pool_size=concurrency)
+
+        def make_chat():
+            chat = AsyncChat(transport=transport)
+            chat.chat.api_url = api.url
+            return chat
+
+        try:
+            for _ in timer:
+                results = asyncio.run(run_batch(prompts, make_chat, concurrency=concurrency))
+                assert not any("error" in r for r in results)
+        finally:
+            transport.close()
+    timer.items = REQUESTS
@@ -0,0 +1,165 @@
+"""
+A small asv-style benchmark harness.
+
+Benchmarks are functions registered with ``@benchmark``.  Each receives a
+Timer and one value of each of its parameters; it does its setup, then
+runs the code to measure inside ``for _ in timer:``, which times every
+pass of the loop body separately.  Results are plain JSON so runs from
+different commits can be compared with ``compare``.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import itertools
+import statistics
+import subprocess
+
+BENCHMARKS = []
+
+
+class Timer:
+    """
+    Times each pass of a ``for _ in timer:`` loop.
+
+    :param repeat: Number of passes
+    :param tmpdir: A scratch directory for the benchmark's files
+    """
+
+    def __init__(self, repeat, tmpdir):
+        self.repeat = repeat
+        self.tmpdir = tmpdir
+        self.samples = []
+        self.items = None
+        self.extra = {}
+
+    def __iter__(self):
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            yield
+            self.samples.append(time.perf_counter() - start)
+
+
+class Benchmark:
+    def __init__(self, name, func, params, repeat):
+        self.name = name
+        self.func = func
+        self.params = params
+        self.repeat = repeat
+
+    def cases(self, quick=False):
+        """Yield the parameter dicts to run; ``quick`` keeps the two smallest values of each."""
+        names = list(self.params)
+        values = [self.params[name][:2] if quick else self.params[name] for name in names]
+        for combination in itertools.product(*values):
+            yield dict(zip(names, combination))
+
+
+def benchmark(params=None, repeat=5):
+    """
+    Register a benchmark.
+
+    :param params: Dict mapping parameter name to the values to run with
+    :param repeat: Timed passes per case (at least one even with ``--quick``)
+    """
+    def register(func):
+        name = f"{func.__module__.rpartition('.')[2]}.{func.__name__}"
+        BENCHMARKS.append(Benchmark(name, func, params or {}, repeat))
+        return func
+    return register
+
+
+def case_name(name, params):
+    if not params:
+        return name
+    return f"{name}[{','.join(f'{k}={v}' for k, v in params.items())}]"
+
+
+def run_case(bench, params, repeat):
+    """Run one case of a benchmark and return its result dict."""
+    with tempfile.TemporaryDirectory(prefix="rodeo-bench-") as tmpdir:
+        timer = Timer(repeat, tmpdir)
+        bench.func(timer, **params)
+    if not timer.samples:
+        raise RuntimeError(f"{bench.name} never iterated its timer")
+    result = {
+        "params": params,
+        "repeat": len(timer.samples),
+        "min": min(timer.samples),
+        "median": statistics.median(timer.samples),
+        "mean": statistics.mean(timer.samples),
+        "stdev": statistics.stdev(timer.samples) if len(timer.samples) > 1 else 0.0,
+    }
+    if timer.items:
+        # Throughput of the median pass, e.g. requests or bytes per second.
+        result["items"] = timer.items
+        result["per_second"] = timer.items / result["median"]
+    result.update(timer.extra)
+    return result
+
+
+def run(pattern=None, quick=False, repeat=None, progress=None):
+    """
+    Run the registered benchmarks whose name contains ``pattern``.
+
+    :param quick: Run only the smallest parameter values, once each
+    :param repeat: Override every benchmark's number of passes
+    :param progress: Called with each case name and result as it finishes
+    :return: A results document (see ``environment``)
+    """
+    results = {}
+    for bench in BENCHMARKS:
+        if pattern and pattern not in bench.name:
+            continue
+        for params in bench.cases(quick):
+            passes = 1 if quick else repeat or bench.repeat
+            name = case_name(bench.name, params)
+            results[name] = run_case(bench, params, passes)
+            if progress:
+                progress(name, results[name])
+    return dict(environment(), benchmarks=results)
+
+
+def environment():
+    """Describe where the results come from, so runs can be told apart."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "executable": sys.executable,
+    }
+
+
+def compare(base, new, threshold=1.1):
+    """
+    Compare two results documents case by case.
+
+    :param threshold: Ratio of new to base median time above which a case
+        counts as a regression (and below whose inverse, an improvement)
+    :return: A list of (name, base median, new median, ratio, verdict) for
+        the cases both documents share, verdict being "slower", "faster" or ""
+    """
+    rows = []
+    for name, result in new["benchmarks"].items():
+        old = base["benchmarks"].get(name)
+        if old is None:
+            continue
+        ratio = result["median"] / old["median"] if old["median"] else float("inf")
+        verdict = "slower" if ratio > threshold else "faster" if ratio < 1 / threshold else ""
+        rows.append((name, old["median"], result["median"], ratio, verdict))
+    return rows
+
+
+def load(path):
+    with open(path, 'r') as f:
+        return json.load(f)
@@ -0,0 +1,40 @@
+import asyncio
+from rodeo.chat import Chat
+from rodeo.retry import RetryPolicy
+
+
+class AsyncChat:
+    """
+    An asyncio front end to Chat.
+
+    Requests run on a thread pool over the Chat's pooled
+    transport, so many AsyncChat instances sharing one Transport can be
+    awaited concurrently.  Turns of a single conversation are serialized.
+    Failed requests are retried by the Chat's RetryPolicy.
+
+    :param session_file: Path to the session file, or None to keep the
+        conversation in memory
+    :param max_retries: Retries for rate-limited, overloaded or failed
+        requests, unless a ``retry`` policy is passed
+    :param executor: Thread pool the requests run on (default: the event
+        loop's)
+    """
+
+    def __init__(self, session_file=None, transport=None, max_retries=5, executor=None, **kwargs):
+        kwargs.setdefault("retry", RetryPolicy(max_retries=max_retries))
+        self.chat = Chat(session_file, transport=transport, **kwargs)
+        self.executor = executor
+        self._lock = asyncio.Lock()
+
+    @property
+    def messages(self):
+        return self.chat.messages
+
+    async def get_response(self, user_input):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            return await loop.run_in_executor(self.executor, self.chat.get_response, user_input)
+
+    async def clear_session(self):
+        async with self._lock:
+            self.chat.clear_session()
@@ -0,0 +1,124 @@
+import os
+import sys
+import json
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from rodeo.async_chat import AsyncChat
+from rodeo.providers import load_config, make_provider
+from rodeo.ratelimit import from_config
+from rodeo.telemetry import Telemetry
+from rodeo.transport import Transport
+
+
+def read_prompts(stream):
+    """
+    Read prompts from a text stream.
+
+    Each non-empty line is either a plain prompt or a JSON object with a
+    "prompt" key (any other keys are passed through to the result).
+
+    :param stream: A text stream such as a file or sys.stdin
+    :return: A list of dicts with at least a "prompt" key
+    """
+    prompts = []
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('{'):
+            record = json.loads(line)
+            if "prompt" not in record:
+                raise ValueError(f"JSONL record without a prompt: {line}")
+            prompts.append(record)
+        else:
+            prompts.append({"prompt": line})
+    return prompts
+
+
+async def run_batch(prompts, make_chat, concurrency=8, on_result=None):
+    """
+    Run every prompt in its own conversation with bounded concurrency.
+
+    :param prompts: Records as returned by read_prompts
+    :param make_chat: Factory returning a fresh AsyncChat for each prompt;
+        its requests run on a pool of ``concurrency`` threads, shut down on return
+    :param concurrency: Maximum number of requests in flight
+    :param on_result: Called with each result, in input order, as soon as
+        it and every earlier result are available
+    :return: The list of results in input order
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results = [None] * len(prompts)
+    next_index = 0
+
+    async def run_one(index, record):
+        nonlocal next_index
+        result = dict(record, index=index)
+        async with semaphore:
+            try:
+                chat = make_chat()
+                chat.executor = executor
+                result["response"] = await chat.get_response(record["prompt"])
+            except Exception as e:
+                result["error"] = str(e)
+        results[index] = result
+        while next_index < len(results) and results[next_index] is not None:
+            if on_result:
+                on_result(results[next_index])
+            next_index += 1
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        await asyncio.gather(*(run_one(i, record) for i, record in enumerate(prompts)))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="rodeo batch", description="Run many prompts concurrently")
+    parser.add_argument("input", nargs="?", help="File of prompts, one per line or JSONL (default: stdin)")
+    parser.add_argument("--output", help="Write JSONL results to this file (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum requests in flight")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries for rate-limited or overloaded responses")
+    parser.add_argument("--provider", help="Provider to use (default: from the config file)")
+    parser.add_argument("--model", help="Model to request")
+    parser.add_argument("--config", help="Config file (default: $RODEO_CONFIG or ~/.rodeo/config.json)")
+    parser.add_argument("--max-tokens", type=int, help="Maximum tokens in each response")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds to wait for each response")
+    parser.add_argument("--metrics", metavar="FILE", default=os.getenv('RODEO_METRICS'),
+                        help="Append per-call latency and token metrics to FILE (default: $RODEO_METRICS)")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        with open(args.input, 'r') as f:
+            prompts = read_prompts(f)
+    else:
+        prompts = read_prompts(sys.stdin)
+
+    config = load_config(args.config)
+    provider = make_provider(args.provider, config)
+    model = args.model or (None if args.provider else config.get("model"))
+    transport = Transport(pool_size=args.concurrency, read_timeout=args.timeout)
+    telemetry = Telemetry(args.metrics) if args.metrics else None
+    rate_limit = from_config(config)
+    out = open(args.output, 'w') if args.output else sys.stdout
+
+    def write(result):
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+
+    try:
+        results = asyncio.run(run_batch(
+            prompts,
+            lambda: AsyncChat(transport=transport, max_retries=args.max_retries, telemetry=telemetry,
+                              provider=provider, model=model, max_tokens=args.max_tokens or config.get("max_tokens"),
+                              rate_limit=rate_limit, priority="batch"),
+            concurrency=args.concurrency,
+            on_result=write,
+        ))
+    finally:
+        transport.close()
+        if out is not sys.stdout:
+            out.close()
+
+    if any("error" in r for r in results):
+        sys.exit(1)
@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from rodeo.batch import read_prompts
+from rodeo.chat import Chat
+from rodeo.providers import load_config, make_provider
+from rodeo.retry import RetryPolicy
+
+# The Message Batches API accepts up to 100,000 requests per batch.
+MAX_BATCH_SIZE = 100000
+# Allowed difference between the server's clock and ours when matching a
+# batch whose submission was interrupted to the batches the API lists.
+CLOCK_SKEW = 60.0
+
+
+def _timestamp(created_at):
+    """Convert an RFC 3339 time as returned by the API to a Unix time."""
+    return datetime.fromisoformat(created_at.replace("Z", "+00:00")).timestamp()
+
+
+class BulkJob:
+    """
+    Run prompts through the Message Batches API, resumably.
+
+    Progress is kept in a JSON state file: the batches submitted so far
+    (with the range of prompts each covers) and which of them have had
+    their results written.  Rerunning the same job skips work already
+    done, and results already present in the output file are never
+    written twice.  A submission is recorded as pending, with a random tag
+    that prefixes the custom_id of each of its requests, before it is sent.
+    If the job stops before the batch's id is saved, the rerun looks for
+    the batch among those the API lists, and adopts it once its results
+    carry the tag, instead of paying for it again.
+
+    :param prompts: Records as returned by rodeo.batch.read_prompts
+    :param output: Path of the JSONL results file
+    :param state_file: Path of the JSON state file
+    :param chat: Chat used to build request params and to reach the API
+    :param chunk_size: Prompts per submitted batch
+    :param poll_interval: Seconds between batch status checks
+    :raises ValueError: If the chat does not use the Anthropic API, the only
+        one with the Message Batches API
+    """
+
+    def __init__(self, prompts, output, state_file, chat=None, chunk_size=10000, poll_interval=30.0):
+        self.prompts = prompts
+        self.output = output
+        self.state_file = state_file
+        self.chat = chat or Chat(None)
+        self.chunk_size = min(chunk_size, MAX_BATCH_SIZE)
+        self.poll_interval = poll_interval
+        if self.chat.provider.name != "anthropic":
+            raise ValueError(f"rodeo bulk needs the Message Batches API of the anthropic provider, not {self.chat.provider.name}")
+        self.batches_url = self.chat.api_url + "/batches"
+        self.state = self._load_state()
+
+    def _load_state(self):
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+            if state.get("count") != len(self.prompts):
+                raise ValueError(f"State file {self.state_file} belongs to a different input")
+            return state
+        return {"count": len(self.prompts), "submitted": 0, "batches": []}
+
+    def _save_state(self):
+        tmp_path = self.state_file + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_file)
+
+    @staticmethod
+    def _custom_id(tag, index):
+        return f"{tag}-{index}"
+
+    def submit(self):
+        """Submit every prompt not yet covered by a batch."""
+        pending = self.state.pop("pending", None)
+        if pending is not None:
+            self._reconcile(pending)
+        while self.state["submitted"] < len(self.prompts):
+            start = self.state["submitted"]
+            end = min(start + self.chunk_size, len(self.prompts))
+            tag = os.urandom(4).hex()
+            requests = [
+                {"custom_id": self._custom_id(tag, i), "params": self.chat.build_request(self.prompts[i]["prompt"])}
+                for i in range(start, end)
+            ]
+            self.state["pending"] = {"start": start, "end": end, "time": time.time(), "tag": tag}
+            self._save_state()
+            response = self.chat.retry.call(lambda remaining: self._create_batch(requests), hedge=False)
+            del self.state["pending"]
+            self._add_batch(response.json()["id"], start, end)
+
+    def _create_batch(self, requests):
+        response = self.chat.transport.post(self.batches_url, headers=self.chat._headers(), json={"requests": requests})
+        response.raise_for_status()
+        return response
+
+    def _add_batch(self, batch_id, start, end):
+        self.state["batches"].append({"id": batch_id, "start": start, "end": end, "written": False})
+        self.state["submitted"] = end
+        self._save_state()
+
+    def _reconcile(self, pending):
+        """Adopt the batch of a submission that was interrupted after it was sent, if the API has it."""
+        known = {batch["id"] for batch in self.state["batches"]}
+        size = pending["end"] - pending["start"]
+        candidates = [batch for batch in self._list_batches(pending["time"] - CLOCK_SKEW)
+                      if batch["id"] not in known and sum(batch["request_counts"].values()) == size]
+        for batch in candidates:
+            if "tag" in pending and self._has_tag(batch, pending["tag"]):
+                self._add_batch(batch["id"], pending["start"], pending["end"])
+                return
+        self._save_state()
+
+    def _has_tag(self, batch, tag):
+        """Whether a batch's requests carry ``tag``, waiting for it to end as only then are they listed."""
+        while batch["processing_status"] != "ended":
+            time.sleep(self.poll_interval)
+            batch = self._status(batch["id"])
+        response = self.chat.transport.get(batch["results_url"], headers=self.chat._headers(), stream=True)
+        response.raise_for_status()
+        try:
+            for line in response.iter_lines():
+                if line:
+                    return json.loads(line)["custom_id"].startswith(tag + "-")
+        finally:
+            response.close()
+        return False
+
+    def _status(self, batch_id):
+        response = self.chat.transport.get(f"{self.batches_url}/{batch_id}", headers=self.chat._headers())
+        response.raise_for_status()
+        return response.json()
+
+    def _list_batches(self, since):
+        """Yield the batches created after ``since`` (a Unix time), newest first."""
+        params = {"limit": 100}
+        while True:
+            response = self.chat.transport.get(self.batches_url, headers=self.chat._headers(), params=params)
+            response.raise_for_status()
+            page = response.json()
+            for batch in page["data"]:
+                if _timestamp(batch["created_at"]) < since:
+                    return
+                yield batch
+            if not page.get("has_more"):
+                return
+            params["after_id"] = page["last_id"]
+
+    def poll(self):
+        """Write the results of every ended batch; return True once all are written."""
+        done = set(self._written_indexes())
+        for batch in self.state["batches"]:
+            if batch["written"]:
+                continue
+            status = self._status(batch["id"])
+            if status["processing_status"] != "ended":
+                continue
+            self._write_results(batch, status["results_url"], done)
+            batch["written"] = True
+            self._save_state()
+        return all(batch["written"] for batch in self.state["batches"])
+
+    def _written_indexes(self):
+        if not os.path.exists(self.output):
+            return
+        with open(self.output, 'r') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)["index"]
+                except (ValueError, KeyError):
+                    continue
+
+    def _write_results(self, batch, results_url, done):
+        response = self.chat.transport.get(results_url, headers=self.chat._headers(), stream=True)
+        response.raise_for_status()
+        with open(self.output, 'a') as out:
+            if out.tell():
+                with open(self.output, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read() != b"\n":
+                        out.write("\n")  # Start after a line torn by an interruption.
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                item = json.loads(line)
+                index = int(item["custom_id"].rsplit("-", 1)[1])
+                if index in done:
+                    continue
+                record = dict(self.prompts[index], index=index, custom_id=item["custom_id"])
+                result = item["result"]
+                if result["type"] == "succeeded":
+                    record["response"] = result["message"]["content"][0]["text"]
+                else:
+                    record["error"] = result.get("error", result["type"])
+                out.write(json.dumps(record) + "\n")
+                done.add(index)
+        response.close()
+
+    def run(self):
+        self.submit()
+        while not self.poll():
+            time.sleep(self.poll_interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="rodeo bulk", description="Run prompts through the Message Batches API")
+    parser.add_argument("input", help="File of prompts, one per line or JSONL")
+    parser.add_argument("--output", required=True, help="JSONL results file (appended to)")
+    parser.add_argument("--state", help="Resumable state file (default: OUTPUT.state)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Prompts per submitted batch")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="Seconds between status checks")
+    parser.add_argument("--provider", help="Provider to use (default: from the config file; must be of the anthropic type)")
+    parser.add_argument("--model", help="Model to request")
+    parser.add_argument("--config", help="Config file (default: $RODEO_CONFIG or ~/.rodeo/config.json)")
+    parser.add_argument("--max-tokens", type=int, help="Maximum tokens in each response")
+    parser.add_argument("--retries", type=int, default=5, help="Retries for failed or rate-limited API calls")
+    args = parser.parse_args(argv)
+
+    with open(args.input, 'r') as f:
+        prompts = read_prompts(f)
+    config = load_config(args.config)
+    model = args.model or (None if args.provider else config.get("model"))
+    chat = Chat(None, provider=make_provider(args.provider, config), model=model,
+                max_tokens=args.max_tokens or config.get("max_tokens"), retry=RetryPolicy(max_retries=args.retries))
+    job = BulkJob(prompts, args.output, args.state or args.output + ".state", chat=chat,
+                  chunk_size=args.chunk_size, poll_interval=args.poll_interval)
+    job.run()
+    print(f"Wrote results for {len(prompts)} prompts to {args.output}.", file=sys.stderr)
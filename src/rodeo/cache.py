@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import hashlib
+from rodeo.locking import FileLock, atomic_write
+
+# Only these payload fields determine the response; transport options such
+# as "stream" do not.
+KEY_FIELDS = ("model", "system", "messages", "max_tokens")
+
+
+def request_key(payload, url=None):
+    """
+    Return a canonical hash of the parts of a request that affect the reply.
+
+    :param payload: The request payload
+    :param url: The API endpoint, as the same model name may be served by
+        different APIs
+    """
+    canonical = {k: payload[k] for k in KEY_FIELDS if k in payload}
+    if url is not None:
+        canonical["url"] = url
+    # Messages of the history are Message mappings, encoded here as dicts.
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=dict)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of API responses keyed by endpoint and request payload.
+
+    Each entry is one file; its mtime records when it was written (for the
+    TTL) and its atime when it was last used (for LRU eviction once the
+    cache grows past ``max_bytes``).  Hit/miss counters and the cache's
+    total size are kept in ``stats.json``, updated under a lock, so they
+    accumulate across invocations and the cache is only walked for
+    eviction once it is over budget.
+
+    :param cache_dir: Directory holding the cache entries
+    :param max_bytes: Evict least recently used entries above this size
+    :param ttl: Seconds an entry stays valid (None for no expiry)
+    """
+
+    @staticmethod
+    def key(url, payload):
+        """Key of a request to the API at ``url``."""
+        return request_key(payload, url)
+
+    def __init__(self, cache_dir="~/.rodeo/cache", max_bytes=64 * 1024 * 1024, ttl=None):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.stats_path = os.path.join(self.cache_dir, "stats.json")
+        self.lock = FileLock(self.stats_path)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def _expired(self, written, now):
+        return self.ttl is not None and now - written > self.ttl
+
+    def get(self, key):
+        now = time.time()
+        if key in self._memory:
+            written, data = self._memory[key]
+            if not self._expired(written, now):
+                self.hits += 1
+                return data
+            del self._memory[key]
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if self._expired(stat.st_mtime, now):
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, 'r') as f:
+                data = json.load(f)
+            os.utime(path, (now, stat.st_mtime))
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._memory[key] = (stat.st_mtime, data)
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+            size = f.tell()
+        os.replace(tmp_path, path)
+        self._memory[key] = (time.time(), data)
+        with self.lock:
+            stats = self._load_stats()
+            if stats.get("bytes") is None:
+                # Not tracked yet: the walk below counts it.
+                self.evict()
+                return
+            stats["bytes"] += size - replaced
+            self._save(stats)
+        if stats["bytes"] > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Remove expired entries, then least recently used ones until under max_bytes."""
+        with self.lock:
+            entries = []
+            total = 0
+            now = time.time()
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if not name.endswith(".json") or root == self.cache_dir:
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    if self._expired(stat.st_mtime, now):
+                        os.remove(path)
+                        continue
+                    entries.append((stat.st_atime, stat.st_size, path))
+                    total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                self._memory.pop(os.path.basename(path)[:-5], None)
+                total -= size
+            stats = self._load_stats()
+            stats["bytes"] = total
+            self._save(stats)
+
+    def clear(self):
+        with self.lock:
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if root != self.cache_dir:
+                        os.remove(os.path.join(root, name))
+            self._memory.clear()
+            stats = self._load_stats()
+            stats["bytes"] = 0
+            self._save(stats)
+
+    def stats(self):
+        """Return lifetime hit/miss counters, including this process's unsaved ones."""
+        stats = self._load_stats()
+        return {"hits": stats["hits"] + self.hits, "misses": stats["misses"] + self.misses}
+
+    def save_stats(self):
+        with self.lock:
+            stats = self._load_stats()
+            stats["hits"] += self.hits
+            stats["misses"] += self.misses
+            self._save(stats)
+        self.hits = self.misses = 0
+
+    def _load_stats(self):
+        try:
+            with open(self.stats_path, 'r') as f:
+                stats = json.load(f)
+        except (FileNotFoundError, ValueError):
+            stats = {}
+        return {"hits": stats.get("hits", 0), "misses": stats.get("misses", 0), "bytes": stats.get("bytes")}
+
+    def _save(self, stats):
+        atomic_write(self.stats_path, json.dumps(stats).encode())
@@ -1,59 +1,494 @@
 import os
-import json
-import requests
+import time
+from rodeo.context import message_text
+from rodeo.messages import Message
+from rodeo.providers import AnthropicProvider
+from rodeo.retry import RetryPolicy
+from rodeo.segments import History
+from rodeo.session_manager import open_store
+
+# rodeo.transport pulls in requests and urllib3, which cost far more than the
+# rest of start-up combined, so it is only imported once a request is made.
+Transport = None
+
+def _load_transport():
+    global Transport
+    if Transport is None:
+        from rodeo.transport import Transport
+    return Transport
+
+# How _save_session reconciles turns other processes appended to the session
+# file since this Chat loaded it: "append" keeps them and adds this turn
+# after them, "replace" overwrites the file with this Chat's history.
+MERGE_POLICIES = ("append", "replace")
+
+# Prompt caching: the API caches the request prefix up to each block marked
+# with cache_control, and a request may mark at most four blocks.  Prefixes
+# shorter than about 1024 tokens are not cached, so smaller payloads are
+# not worth a breakpoint of their own.
+CACHE_CONTROL = {"type": "ephemeral"}
+MAX_CACHE_BREAKPOINTS = 4
+MIN_CACHE_CHARS = 4096
+DEFAULT_MAX_TOKENS = 1000
+
+def _strip_cache_control(message):
+    content = message["content"]
+    if isinstance(content, str) or not any("cache_control" in block for block in content):
+        return message
+    blocks = [{k: v for k, v in block.items() if k != "cache_control"} for block in content]
+    return dict(message, content=blocks)
+
+def _mark_cache_control(message):
+    content = message["content"]
+    if isinstance(content, str):
+        blocks = [{"type": "text", "text": content}]
+    else:
+        blocks = [dict(block) for block in content]
+    blocks[-1]["cache_control"] = CACHE_CONTROL
+    return dict(message, content=blocks)
 
 class Chat:
-    def __init__(self, session_file):
-        self.session_file = os.path.expanduser(session_file)
-        self.messages = self._load_session()
-        self.api_key = os.getenv('ANTHROPIC_API_KEY')
-        self.api_url = "https://api.anthropic.com/v1/messages"
+    prompt_cache = False
+    last_usage = None
+    # Connection reuse and connect/TLS/first-byte/total timings of the last
+    # request, taken from its own response as the Transport may be shared.
+    last_timings = None
+    # With autosave off, turns stay in memory until save() is called.
+    autosave = True
+
+    def __init__(self, session_file, transport=None, timeout=None, context=None, cache=None, merge="append",
+                 prompt_cache=False, telemetry=None, retry=None, connect_timeout=None, provider=None, model=None,
+                 max_tokens=None, coalesce=None, rate_limit=None, priority="interactive"):
+        # Without a session file the conversation only lives in memory.
+        self.session_file = os.path.expanduser(session_file) if session_file else None
+        self.log = open_store(self.session_file) if session_file else None
+        self._meta = {}
+        self._stamp = None
+        self._messages = None
+        self._persisted = 0
+        self._index = None
+        self._transport = transport
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retry = retry or RetryPolicy()
+        self.context = context
+        self.cache = cache
+        if merge not in MERGE_POLICIES:
+            raise ValueError(f"Unknown merge policy: {merge}")
+        self.merge = merge
+        self.prompt_cache = prompt_cache
+        self.telemetry = telemetry
+        self.coalesce = coalesce
+        self.rate_limit = rate_limit
+        self.priority = priority
+        self.max_tokens = max_tokens or DEFAULT_MAX_TOKENS
+        self.use_provider(provider or AnthropicProvider(), model)
+
+    def use_provider(self, provider, model=None):
+        """
+        Send further requests to ``provider``.
+
+        :param provider: A Provider from rodeo.providers
+        :param model: Model to request (default: the provider's default model)
+        """
+        self.provider = provider
+        self.model = model or provider.default_model
+        self.api_key = provider.api_key()
+        self.api_url = provider.url
+
+    @property
+    def transport(self):
+        # Created on first use and then reused, so every request made through
+        # this Chat shares one pool of keep-alive connections.
+        if self._transport is None:
+            self._transport = _load_transport()()
+        return self._transport
+
+    @property
+    def messages(self):
+        # The history is only read once something needs it, so commands such
+        # as --clear and --compact never parse the session file.
+        if self._messages is None:
+            self._messages = self._load_session()
+            self._persisted = len(self._messages)
+            self._stamp = self.log.stamp() if self.log is not None else None
+        return self._messages
+
+    @messages.setter
+    def messages(self, value):
+        self._messages = value
+        self._persisted = None
+        self._forget_counts()
+
+    def _forget_counts(self):
+        # Cached token counts hold the messages of a history that is gone.
+        if self.context:
+            self.context.reset()
 
     def _load_session(self):
-        if os.path.exists(self.session_file):
-            with open(self.session_file, 'r') as f:
-                try:
-                    loaded_data = json.load(f)
-                    if self._validate_session_data(loaded_data):
-                        return loaded_data
-                    else:
-                        print("Warning: Session file is not in the expected format. Starting with an empty session.")
-                except json.JSONDecodeError:
-                    print("Warning: Session file is not valid JSON. Starting with an empty session.")
+        if self.log is None:
+            return []
+        loaded_data = self.log.load()
+        # Cold segments were validated when they were written, so only the hot part is checked.
+        if self._validate_session_data(loaded_data.hot if isinstance(loaded_data, History) else loaded_data):
+            return loaded_data
+        print("Warning: Session file is not in the expected format. Starting with an empty session.")
         return []
 
     def _validate_session_data(self, data):
         if not isinstance(data, list):
             return False
-        return True
+        return all(isinstance(m, (dict, Message)) and "role" in m for m in data)
 
     def _save_session(self):
-        with open(self.session_file, 'w') as f:
-            json.dump(self.messages, f)
+        if self._messages is None or self.log is None:
+            return
+        with self.log.lock:
+            changed = self.log.stamp() != self._stamp
+            if self._persisted is None or self._persisted > len(self._messages) or (changed and self.merge == "replace"):
+                self.log.rewrite(self._messages, self.log.meta())
+                changed = False
+            else:
+                self.log.append(self._messages[self._persisted:])
+            self._persisted = len(self._messages)
+            self._stamp = self.log.stamp()
+        if changed:
+            # Other processes added turns; reload the merged history when next needed.
+            self._messages = None
+            self._forget_counts()
+
+    def save(self):
+        """Write the turns not yet in the session file."""
+        self._save_session()
+
+    def _autosave(self):
+        if self.autosave:
+            self._save_session()
+
+    def refresh(self):
+        """Forget the in-memory history if another process has changed the session file."""
+        if self.log is not None and self._messages is not None and self.log.stamp() != self._stamp:
+            self._messages = None
+            self._forget_counts()
 
     def clear_session(self):
-        self.messages = []
+        self._messages = []
+        self._persisted = 0
+        self._meta = {}
+        if self.log is not None:
+            self.log.rewrite([])
+            self._stamp = self.log.stamp()
+        self._forget_counts()
+
+    def compact_session(self):
         self._save_session()
+        if self.log is None:
+            return len(self.messages)
+        return self.log.compact()
 
-    def get_response(self, user_input):
-        self.messages.append({"role": "user", "content": user_input})
-        
-        response = requests.post(
-            self.api_url,
-            headers={
-                "Content-Type": "application/json",
-                "x-api-key": self.api_key,
-                "anthropic-version": "2023-06-01"
-            },
-            json={
-                "model": "claude-3-sonnet-20240229",
-                "messages": self.messages,
-                "max_tokens": 1000
-            }
-        )
-        
+    def _get_meta(self):
+        return self.log.meta() if self.log is not None else dict(self._meta)
+
+    def _update_meta(self, **values):
+        if self.log is not None:
+            self.log.update_meta(**values)
+        else:
+            self._meta.update(values)
+
+    def _headers(self):
+        return self.provider.headers(self.api_key)
+
+    def _payload(self, stream=False):
+        messages = self.messages
+        system = None
+        if self.context:
+            messages, system = self._fit_context(messages)
+        if self.prompt_cache and messages:
+            messages, system = self._cache_breakpoints(messages, system)
+        if isinstance(messages, History):
+            # The whole history is sent, so its cold segments are read now.
+            messages = list(messages)
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": self.max_tokens
+        }
+        if system:
+            payload["system"] = system
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def _cache_breakpoints(self, messages, system):
+        """
+        Mark the stable prefix of a request for prompt caching.
+
+        The last two user turns are marked: the newest caches the whole
+        conversation for the next turn, the previous one reads what the last
+        turn cached.  The summary system prompt, and blocks the caller
+        marked in the newest turn (such as a large piped payload), are kept
+        as breakpoints while the limit allows.  Marks stored on older turns
+        are dropped, as they no longer end a reusable prefix.
+        """
+        budget = MAX_CACHE_BREAKPOINTS
+        if system:
+            system = [{"type": "text", "text": system, "cache_control": CACHE_CONTROL}]
+            budget -= 1
+        users = [i for i, m in enumerate(messages) if m["role"] == "user"][-2:]
+        budget -= len(users)
+        marked = [_strip_cache_control(m) for m in messages[:-1]]
+        last = messages[-1]
+        if not isinstance(last["content"], str):
+            blocks = []
+            for block in last["content"]:
+                if "cache_control" in block:
+                    if budget <= 0:
+                        block = {k: v for k, v in block.items() if k != "cache_control"}
+                    budget -= 1
+                blocks.append(block)
+            last = dict(last, content=blocks)
+        marked.append(last)
+        for i in users:
+            marked[i] = _mark_cache_control(marked[i])
+        return marked, system
+
+    def _post(self, payload, stream=False):
+        """Send a request with the retries, deadline and hedging of ``self.retry``."""
+        return self.retry.call(lambda remaining: self._send(payload, stream, remaining), hedge=not stream)
+
+    def _send(self, payload, stream=False, remaining=None):
+        kwargs = {}
+        read_timeout = self.timeout
+        if remaining is not None:
+            read_timeout = min(read_timeout, remaining) if read_timeout else remaining
+        if read_timeout is not None or self.connect_timeout is not None:
+            kwargs["timeout"] = (self.connect_timeout or self.transport.timeout[0], read_timeout or self.transport.timeout[1])
+        if self.rate_limit is not None:
+            from rodeo.ratelimit import estimate_tokens
+            self.rate_limit.acquire(self._rate_key(), estimate_tokens(payload), self.priority)
+        try:
+            response = self.provider.send(self, self.provider.prepare(payload), stream=stream, **kwargs)
+        except Exception as e:
+            self._record(None, stream=stream, error=type(e).__name__)
+            raise
+        self.last_timings = getattr(response, 'timings', None)
+        if self.rate_limit is not None:
+            self.rate_limit.observe(self._rate_key(), response)
+        if self.telemetry is not None and response.status_code >= 400:
+            self._record(response.status_code, getattr(response, 'timings', None), stream=stream)
         response.raise_for_status()
-        assistant_message = response.json()['content'][0]['text']
-        self.messages.append({"role": "assistant", "content": assistant_message})
-        self._save_session()
+        return response
+
+    def _rate_key(self):
+        return self.rate_limit.key(self.api_url, self.api_key)
+
+    def _spend(self, usage):
+        """Take a completed call's output tokens from the rate limiter's buckets."""
+        if self.rate_limit is not None and usage:
+            self.rate_limit.spend(self._rate_key(), usage.get("output_tokens", 0))
+
+    def _record(self, status, timings=None, body=None, stream=False, error=None):
+        """Write the metrics of one API call, if telemetry is enabled."""
+        if self.telemetry is None:
+            return
+        from rodeo.telemetry import make_record
+        self.telemetry.record(make_record(self.model, status, timings, body, stream, error))
+
+    def _request(self, payload):
+        """Return the response body for a payload, from the cache when possible."""
+        key = self.cache.key(self.api_url, payload) if self.cache is not None else None
+        data = self.cache.get(key) if key else None
+        if data is not None:
+            self.last_usage = None
+            return data
+        if self.coalesce is not None:
+            # Only the leader's usage and metrics are recorded; the others made no call.
+            self.last_usage = None
+            data = self.coalesce.do(self.coalesce.key(self.api_url, payload), lambda: self._fetch(payload))
+        else:
+            data = self._fetch(payload)
+        if key:
+            self.cache.put(key, data)
+        return data
+
+    def _fetch(self, payload):
+        response = self._post(payload)
+        data = self.provider.parse(response.json())
+        self.last_usage = data.get("usage")
+        self._record(response.status_code, getattr(response, 'timings', None), data)
+        self._spend(self.last_usage)
+        return data
+
+    def _fit_context(self, messages):
+        """Trim the history to the context budget, returning (messages, system prompt)."""
+        if self.context.strategy == "retrieve":
+            return self._recall(messages)
+        meta = self._get_meta() if self.context.strategy == "summarize" else {}
+        summary = meta.get("summary")
+        reserved = self.context.count_tokens(summary) if summary else 0
+        start = self.context.window_start(messages, reserved)
+        if start == 0 or self.context.strategy != "summarize":
+            return messages[start:], None
+
+        summarized = meta.get("summarized", 0)
+        if summarized < start:
+            summary = self._summarize(summary, messages[summarized:start])
+            self._update_meta(summary=summary, summarized=start)
+        return messages[start:], "Summary of the earlier conversation:\n" + summary
+
+    def _search_index(self):
+        if self._index is None:
+            from rodeo.search import SearchIndex, search_path
+            self._index = SearchIndex(search_path(self.session_file) if self.session_file else None)
+        return self._index
+
+    def _recall(self, messages):
+        """
+        Keep the recent window, and send the earlier turns most relevant to the prompt as the system prompt.
+
+        Every message but the prompt is indexed as it joins the history, so
+        each request only indexes the turns added since the last one.
+        """
+        index = self._search_index()
+        index.sync(messages[:-1])
+        reserved = int(self.context.budget * self.context.recall_share)
+        start = self.context.window_start(messages, reserved)
+        if start == 0:
+            return messages, None
+
+        picked = set()
+        for position, _ in index.search(message_text(messages[-1]), limit=20, before=start):
+            # Recall whole turns: a prompt with its reply, a reply with its prompt.
+            turn = {position}
+            if messages[position]["role"] == "user" and position + 1 < start:
+                turn.add(position + 1)
+            elif messages[position]["role"] == "assistant" and position > 0:
+                turn.add(position - 1)
+            turn -= picked
+            cost = sum(self.context.estimate_tokens(messages[i]) for i in turn)
+            if cost > reserved:
+                continue
+            reserved -= cost
+            picked |= turn
+        if not picked:
+            return messages[start:], None
+        recalled = "\n\n".join(f"{messages[i]['role']}: {message_text(messages[i])}" for i in sorted(picked))
+        return messages[start:], "Earlier turns of this conversation that may be relevant:\n\n" + recalled
+
+    def _summarize(self, summary, messages):
+        transcript = "\n\n".join(f"{m['role']}: {message_text(m)}" for m in messages)
+        prompt = "Update the running summary of this conversation with the new turns below. "
+        prompt += "Keep every fact, name and decision that later turns may rely on. "
+        prompt += "Reply with the summary only.\n\n"
+        if summary:
+            prompt += f"Current summary:\n{summary}\n\n"
+        prompt += f"New turns:\n{transcript}"
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": self.max_tokens
+        }
+        return self._request(payload)['content'][0]['text']
+
+    def build_request(self, user_input):
+        """
+        Return the Messages API payload get_response would send, without sending it.
+
+        :param user_input: The prompt for the next turn
+        :return: The request payload
+        """
+        self.messages.append(Message("user", user_input))
+        try:
+            payload = self._payload()
+            payload["messages"] = list(payload["messages"])
+            return payload
+        finally:
+            self.messages.pop()
+
+    def get_response(self, user_input):
+        """
+        Send a prompt and return the reply, recording both in the session.
+
+        :param user_input: The prompt, as a string or a list of content blocks
+        :return: The reply text
+        """
+        count = len(self.messages)
+        self.messages.append(Message("user", user_input))
+        try:
+            assistant_message = self._request(self._payload())['content'][0]['text']
+        except BaseException:
+            # Leave the history as it was, so a failed turn can simply be repeated.
+            del self.messages[count:]
+            raise
+        self.messages.append(Message("assistant", assistant_message))
+        self._autosave()
         return assistant_message
+
+    def stream_response(self, user_input):
+        """
+        Send a prompt and yield the reply as it is generated.
+
+        The session is saved once the stream has completed; if it fails or
+        is abandoned first, the prompt is removed from the history again.
+
+        :param user_input: The prompt to send
+        :return: A generator of text fragments
+        """
+        count = len(self.messages)
+        try:
+            yield from self._stream(user_input)
+        except BaseException:
+            if self._messages is not None and len(self._messages) == count + 1:
+                del self._messages[count:]
+            raise
+
+    def _stream(self, user_input):
+        self.messages.append(Message("user", user_input))
+
+        payload = self._payload(stream=True)
+        if self.cache is not None:
+            key = self.cache.key(self.api_url, payload)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.last_usage = None
+                text = cached['content'][0]['text']
+                yield text
+                self.messages.append(Message("assistant", text))
+                self._autosave()
+                return
+
+        started = time.perf_counter()
+        response = self._post(payload, stream=True)
+        parts = []
+        usage = {}
+        stop_reason = None
+        try:
+            for event, data in self.provider.events(response):
+                if event == 'message_start':
+                    usage.update(data.get('message', {}).get('usage', {}))
+                elif event == 'message_delta':
+                    usage.update(data.get('usage', {}))
+                    stop_reason = data.get('delta', {}).get('stop_reason', stop_reason)
+                elif event == 'content_block_delta':
+                    delta = data['delta']
+                    if delta.get('type') == 'text_delta':
+                        parts.append(delta['text'])
+                        yield delta['text']
+                elif event == 'error':
+                    raise RuntimeError(data['error']['message'])
+                elif event == 'message_stop':
+                    break
+        finally:
+            response.close()
+        self.last_usage = usage or None
+        self._spend(usage)
+        if self.telemetry is not None:
+            # The stream is only complete now, well after the headers arrived.
+            timings = dict(getattr(response, 'timings', None) or {}, total=time.perf_counter() - started)
+            self._record(response.status_code, timings, {"usage": usage, "stop_reason": stop_reason}, stream=True)
+
+        assistant_message = "".join(parts)
+        if self.cache is not None:
+            self.cache.put(key, {"content": [{"type": "text", "text": assistant_message}]})
+        self.messages.append(Message("assistant", assistant_message))
+        self._autosave()
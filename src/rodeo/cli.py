@@ -1,6 +1,14 @@
+import io
+import os
 import sys
+import time
 import argparse
-from rodeo.chat import Chat
+import importlib
+from rodeo.chat import Chat, DEFAULT_MAX_TOKENS, MERGE_POLICIES, CACHE_CONTROL, MIN_CACHE_CHARS
+from rodeo.context import ContextWindow, STRATEGIES
+from rodeo.providers import DEFAULT_CONFIG, PROVIDERS, load_config, make_provider, route
+from rodeo.retry import RetryPolicy
+from rodeo.session_manager import resolve_session
 
 def process_command(command: str, chat: Chat, input_text: str = '') -> str:
     """
@@ -11,39 +19,455 @@ def process_command(command: str, chat: Chat, input_text: str = '') -> str:
     :param input_text: Optional input text (e.g., from piped input)
     :return: The response from the chat
     """
+    return chat.get_response(build_content(command, input_text, chat.prompt_cache))
+
+def build_prompt(command: str, input_text: str = '') -> str:
+    """
+    Substitute piped input for the $(cat) placeholder in a command.
+
+    :param command: The command or prompt to process
+    :param input_text: Optional input text (e.g., from piped input)
+    :return: The prompt to send
+    """
     if '$(cat)' in command and input_text:
-        full_command = command.replace('$(cat)', input_text)
-    else:
-        full_command = command
+        return command.replace('$(cat)', input_text)
+    return command
 
-    return chat.get_response(full_command)
+def build_content(command: str, input_text: str = '', cache_input: bool = False):
+    """
+    Build the content of a prompt, marking a large piped input for prompt caching.
 
-def main():
+    :param command: The command or prompt to process
+    :param input_text: Optional input text (e.g., from piped input)
+    :param cache_input: Put a large input in its own cache_control block
+    :return: The prompt as a string, or as a list of content blocks
+    """
+    if not (cache_input and '$(cat)' in command and len(input_text) >= MIN_CACHE_CHARS):
+        return build_prompt(command, input_text)
+    before, _, after = command.partition('$(cat)')
+    blocks = [{"type": "text", "text": before}] if before else []
+    blocks.append({"type": "text", "text": input_text, "cache_control": CACHE_CONTROL})
+    after = after.replace('$(cat)', input_text)
+    if after:
+        blocks.append({"type": "text", "text": after})
+    return blocks
+
+def stream_command(command: str, chat: Chat, input_text: str = '', out=None):
+    """
+    Process a command and write the response to ``out`` as it arrives.
+
+    :param command: The command or prompt to process
+    :param chat: An instance of the Chat class
+    :param input_text: Optional input text (e.g., from piped input)
+    :param out: The stream to write to (default: sys.stdout)
+    """
+    out = out or sys.stdout
+    for text in chat.stream_response(build_content(command, input_text, chat.prompt_cache)):
+        out.write(text)
+        out.flush()
+    out.write("\n")
+    out.flush()
+
+def chunked_command(command: str, chat: Chat, stdin, args, out=None, err=None):
+    """
+    Answer a command over piped input too large for one request.
+
+    The input is read incrementally and split into chunks of at most
+    ``args.chunk_tokens`` tokens, which are answered ``args.jobs`` at a time
+    and then combined.
+
+    :param command: The prompt; $(cat) marks where each chunk goes
+    :param chat: An instance of the Chat class
+    :param stdin: The stream to read the input from
+    :param args: Parsed command line arguments
+    """
+    from rodeo.ingest import ChunkedRun
+    out = out or sys.stdout
+    err = err or sys.stderr
+    runner = ChunkedRun(chat, chunk_tokens=args.chunk_tokens, jobs=args.jobs)
+    print(runner.run(command, stdin), file=out)
+    if runner.chunks > 1:
+        print(f"Answered over {runner.chunks} chunks.", file=err)
+
+def format_timings(timings) -> str:
+    """
+    Format the connection timings of a request for display.
+
+    :param timings: The timings dict from Chat.last_timings
+    :return: A single line summary
+    """
+    parts = [f"reused={'yes' if timings['reused'] else 'no'}"]
+    for key in ("dns", "connect", "tls", "first_byte", "total"):
+        parts.append(f"{key}={timings.get(key, 0.0) * 1000:.1f}ms")
+    return "timings: " + " ".join(parts)
+
+def format_usage(usage) -> str:
+    """
+    Format the token usage of a response for display.
+
+    :param usage: The usage dict from Chat.last_usage
+    :return: A single line summary
+    """
+    parts = [
+        f"input={usage.get('input_tokens', 0)}",
+        f"output={usage.get('output_tokens', 0)}",
+        f"cache_read={usage.get('cache_read_input_tokens') or 0}",
+        f"cache_write={usage.get('cache_creation_input_tokens') or 0}",
+    ]
+    return "usage: " + " ".join(parts)
+
+def make_cache(args, env=None):
+    """
+    Build the response cache requested on the command line, if any.
+
+    The cache is opt-in: it is enabled by --cache, --cache-dir or the
+    RODEO_CACHE_DIR environment variable, and --no-cache always wins.
+
+    :param args: Parsed command line arguments
+    :param env: Environment to read (default: os.environ)
+    :return: A ResponseCache or None
+    """
+    if args.no_cache:
+        return None
+    cache_dir = args.cache_dir or (os.environ if env is None else env).get('RODEO_CACHE_DIR')
+    if not cache_dir and not args.cache:
+        return None
+    from rodeo.cache import ResponseCache
+    return ResponseCache(cache_dir or "~/.rodeo/cache", ttl=args.cache_ttl)
+
+def make_telemetry(args, env=None):
+    """
+    Build the metrics recorder requested on the command line, if any.
+
+    Metrics are opt-in: they are enabled by --metrics or the RODEO_METRICS
+    environment variable.
+
+    :param args: Parsed command line arguments
+    :param env: Environment to read (default: os.environ)
+    :return: A Telemetry or None
+    """
+    path = args.metrics or (os.environ if env is None else env).get('RODEO_METRICS')
+    if not path:
+        return None
+    from rodeo.telemetry import Telemetry
+    return Telemetry(path)
+
+def make_coalesce(args, env=None):
+    """
+    Build the single-flight layer requested on the command line, if any.
+
+    Coalescing is opt-in: it is enabled by --coalesce or the RODEO_COALESCE
+    environment variable, naming the directory shared by the processes.
+
+    :param args: Parsed command line arguments
+    :param env: Environment to read (default: os.environ)
+    :return: A SingleFlight or None
+    """
+    directory = args.coalesce or (os.environ if env is None else env).get('RODEO_COALESCE')
+    if not directory:
+        return None
+    from rodeo.singleflight import SingleFlight
+    return SingleFlight(directory, timeout=args.coalesce_timeout or args.timeout or 600.0)
+
+def make_rate_limit(args, config):
+    """
+    Build the shared rate limiter requested on the command line or in the config, if any.
+
+    Rate limiting is opt-in: it is enabled by --rate-limit, --rpm, --tpm or
+    a "rate_limit" table in the config file.
+
+    :param args: Parsed command line arguments
+    :param config: Config as returned by load_config
+    :return: A RateLimiter or None
+    """
+    if not (args.rate_limit or args.rpm or args.tpm or "rate_limit" in config):
+        return None
+    from rodeo.ratelimit import from_config
+    return from_config(config, args.rpm, args.tpm, enabled=True)
+
+def hedge_threshold(value):
+    """Parse --hedge: a number of seconds, or "p95" for the 95th percentile of recent latencies."""
+    return value if value == "p95" else float(value)
+
+def make_retry(args, telemetry=None, model=None):
+    """
+    Build the retry policy requested on the command line.
+
+    With ``--hedge p95`` the latency tracker is seeded from the last day of
+    recorded metrics, as a single invocation makes too few calls to learn
+    its own percentile.
+
+    :param args: Parsed command line arguments
+    :param telemetry: The Telemetry in use, if any
+    :param model: Only seed from calls to this model
+    :return: A RetryPolicy
+    """
+    policy = RetryPolicy(max_retries=args.retries, deadline=args.deadline, hedge_after=args.hedge)
+    if args.hedge == "p95" and telemetry is not None:
+        for record in telemetry.read(since=time.time() - 86400):
+            if record.get("status") == 200 and not record.get("stream") and "total" in record \
+                    and record.get("model") in (None, model):
+                policy.latencies.observe(record["total"])
+    return policy
+
+def apply_route(chat: Chat, config, prompt):
+    """
+    Switch the chat to the provider and model of the config route matching ``prompt``, if any.
+
+    :param chat: An instance of the Chat class
+    :param config: Config as returned by load_config
+    :param prompt: The prompt about to be sent
+    """
+    rule = route(config, prompt)
+    if rule is None:
+        return
+    provider = make_provider(rule["provider"], config, chat.provider.env) if "provider" in rule else chat.provider
+    chat.use_provider(provider, rule.get("model"))
+
+# Subcommands, mapped to the module providing their main(argv).  They are
+# imported only when used.
+COMMANDS = {
+    "batch": "rodeo.batch",
+    "bulk": "rodeo.bulk",
+    "eval": "rodeo.evaluate",
+    "map": "rodeo.fanout",
+    "repl": "rodeo.repl",
+    "sessions": "rodeo.sessions",
+    "stats": "rodeo.telemetry",
+}
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Rodeo CLI Chat")
-    parser.add_argument("--session", default="~/.rodeo.session", help="Path to session file")
+    parser.add_argument("--session", default="~/.rodeo.session",
+                        help="Path to session file, or sqlite:DB#NAME for a session in a SQLite database")
     parser.add_argument("--clear", action="store_true", help="Clear the session")
+    parser.add_argument("--compact", action="store_true", help="Compact the session file")
+    parser.add_argument("--stream", action="store_true", help="Print the response as it is generated")
+    parser.add_argument("-i", "--interactive", action="store_true",
+                        help="Converse in one process, a prompt per line (same as rodeo repl)")
+    parser.add_argument("--provider", help=f"Model API to use: {', '.join(PROVIDERS)} or a provider from the config file")
+    parser.add_argument("--model", help="Model to request (default: from the config file, else the provider's default)")
+    parser.add_argument("--max-tokens", type=int, help=f"Maximum tokens in each reply (default: {DEFAULT_MAX_TOKENS})")
+    parser.add_argument("--config", help="Config file (default: $RODEO_CONFIG or ~/.rodeo/config.json)")
+    parser.add_argument("--timeout", type=float, help="Seconds to wait for the API to respond")
+    parser.add_argument("--connect-timeout", type=float, help="Seconds allowed to connect to the API (default: 10)")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="Retries for rate-limited, overloaded, failed or timed out requests (default: 2)")
+    parser.add_argument("--deadline", type=float, help="Seconds the whole request may take, retries included")
+    parser.add_argument("--hedge", type=hedge_threshold, metavar="SECONDS|p95",
+                        help="Send a duplicate request if the first has not answered after this long")
+    parser.add_argument("--timings", action="store_true", help="Print connection timings to stderr")
+    parser.add_argument("--context-budget", type=int, help="Maximum estimated tokens of history sent per request")
+    parser.add_argument("--context-strategy", choices=STRATEGIES, default="window",
+                        help="How to handle history beyond the budget: drop it or fold it into a summary")
+    parser.add_argument("--cache", action="store_true", help="Reuse cached responses for identical requests")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    parser.add_argument("--cache-dir", help="Response cache directory (enables the cache)")
+    parser.add_argument("--cache-ttl", type=float, help="Seconds a cached response stays valid")
+    parser.add_argument("--cache-stats", action="store_true", help="Show response cache hit/miss statistics")
+    parser.add_argument("--prompt-cache", action="store_true",
+                        help="Mark the conversation prefix and large piped input for prompt caching")
+    parser.add_argument("--usage", action="store_true", help="Print input, output and prompt cache token counts to stderr")
+    parser.add_argument("--metrics", nargs="?", const="~/.rodeo/metrics.jsonl", metavar="FILE",
+                        help="Append per-call latency and token metrics to FILE (default: ~/.rodeo/metrics.jsonl)")
+    parser.add_argument("--coalesce", nargs="?", const="~/.rodeo/inflight", metavar="DIR",
+                        help="Share one API call between identical requests in flight at once, across processes")
+    parser.add_argument("--coalesce-timeout", type=float,
+                        help="Seconds to wait for another process's identical request (default: --timeout, else 600)")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="Pace requests to the API's rate limits, shared with other invocations (see Rate Limiting)")
+    parser.add_argument("--rpm", type=float, help="Requests per minute allowed (enables --rate-limit)")
+    parser.add_argument("--tpm", type=float, help="Input and output tokens per minute allowed (enables --rate-limit)")
+    parser.add_argument("--priority", choices=("interactive", "batch"), default="interactive",
+                        help="Rate limiting class: batch calls leave headroom for interactive ones (default: interactive)")
+    parser.add_argument("--merge", choices=MERGE_POLICIES, default="append",
+                        help="How to combine turns that concurrent invocations added to the session")
+    parser.add_argument("--chunked", action="store_true",
+                        help="Read piped input incrementally and answer over token-bounded chunks (map-reduce)")
+    parser.add_argument("--chunk-tokens", type=int, default=50000, help="Estimated tokens per chunk with --chunked")
+    parser.add_argument("--jobs", type=int, default=4, help="Chunks processed in parallel with --chunked")
+    parser.add_argument("--daemon", action="store_true", help="Run a resident daemon that serves other invocations")
+    parser.add_argument("--stop-daemon", action="store_true", help="Stop the running daemon")
+    parser.add_argument("--no-daemon", action="store_true", help="Run in this process even if a daemon is running")
+    parser.add_argument("--socket", help="Daemon socket path (default: $RODEO_SOCKET or ~/.rodeo.sock)")
     parser.add_argument("prompt", nargs="*", help="Prompt for the chat")
-    args = parser.parse_args()
+    return parser
+
+# Options and environment variables naming files, which a daemon resolves
+# against its client's working directory.
+PATH_OPTIONS = ("config", "cache_dir", "metrics", "coalesce")
+PATH_VARIABLES = ("RODEO_CONFIG", "RODEO_CACHE_DIR", "RODEO_METRICS", "RODEO_COALESCE")
+
+def daemon_socket(args) -> str:
+    return os.path.expanduser(args.socket or os.getenv('RODEO_SOCKET') or "~/.rodeo.sock")
 
-    chat = Chat(args.session)
+def make_chat(args, config, session, cache=None, chat_factory=None, env=None):
+    """
+    Build the chat the command line options describe.
+
+    :param args: Parsed command line arguments
+    :param config: Config as returned by load_config
+    :param session: The session spec to open
+    :param cache: The ResponseCache to use, if any (see make_cache)
+    :param chat_factory: Called like Chat to obtain the chat (default: Chat)
+    :param env: Environment to read (default: os.environ)
+    :return: The chat
+    """
+    context = ContextWindow(args.context_budget, args.context_strategy) if args.context_budget else None
+    telemetry = make_telemetry(args, env)
+    provider = make_provider(args.provider, config, env)
+    # The config's model belongs to its default provider.
+    model = args.model or (None if args.provider else config.get("model"))
+    return (chat_factory or Chat)(session, timeout=args.timeout, context=context, cache=cache,
+                                  merge=args.merge, prompt_cache=args.prompt_cache, telemetry=telemetry,
+                                  retry=make_retry(args, telemetry, model or provider.default_model),
+                                  connect_timeout=args.connect_timeout, provider=provider, model=model,
+                                  max_tokens=args.max_tokens or config.get("max_tokens") or DEFAULT_MAX_TOKENS,
+                                  coalesce=make_coalesce(args, env), rate_limit=make_rate_limit(args, config),
+                                  priority=args.priority)
+
+def client_paths(args, env, cwd):
+    """
+    Resolve the relative paths of an invocation made in another directory.
+
+    :param args: Parsed command line arguments
+    :param env: The invocation's environment
+    :param cwd: The invocation's working directory
+    :return: Copies of ``args`` and ``env`` with their paths made absolute against ``cwd``
+    """
+    def absolute(path):
+        return os.path.join(cwd, os.path.expanduser(path)) if path else path
+
+    args = argparse.Namespace(**vars(args))
+    for name in PATH_OPTIONS:
+        setattr(args, name, absolute(getattr(args, name)))
+    env = {name: absolute(value) if name in PATH_VARIABLES else value for name, value in env.items()}
+    return args, env
+
+def client_env(args, env, cwd):
+    """
+    Select the part of an invocation's environment that it reads.
+
+    That is the RODEO_* variables and the API key variables of the built-in
+    providers and of those the config file defines; a client sends only
+    these to the daemon.
+
+    :param args: Parsed command line arguments
+    :param env: The invocation's environment
+    :param cwd: The invocation's working directory
+    :return: The selected variables
+    """
+    paths, path_env = client_paths(args, env, cwd)
+    try:
+        config = load_config(paths.config or path_env.get('RODEO_CONFIG') or DEFAULT_CONFIG)
+    except ValueError:
+        # The daemon reports the invalid config when it reads it.
+        config = {}
+    names = {provider.api_key_env for provider in PROVIDERS.values()}
+    names.update(options.get("api_key_env") for options in config.get("providers", {}).values())
+    return {name: value for name, value in env.items() if name.startswith("RODEO_") or name in names}
+
+def run(args, stdin=None, out=None, err=None, chat_factory=None, cwd=None, env=None) -> int:
+    """
+    Run one chat invocation.
+
+    :param args: Parsed command line arguments
+    :param stdin: Stream to read piped input from (default: sys.stdin)
+    :param out: Stream for the response (default: sys.stdout)
+    :param err: Stream for diagnostics (default: sys.stderr)
+    :param chat_factory: Called like Chat to obtain the chat (default: Chat)
+    :param cwd: Directory relative paths are resolved against
+    :param env: Environment to read instead of os.environ, as a daemon
+        does for its client's
+    :return: The exit status
+    """
+    stdin = stdin or sys.stdin
+    out = out or sys.stdout
+    err = err or sys.stderr
+    if cwd:
+        args, env = client_paths(args, os.environ if env is None else env, cwd)
+    config = load_config(args.config or (os.environ if env is None else env).get('RODEO_CONFIG') or DEFAULT_CONFIG)
+    cache = make_cache(args, env)
+    chat = make_chat(args, config, resolve_session(args.session, cwd) if cwd else args.session, cache, chat_factory, env)
+
+    if args.cache_stats:
+        stats = cache.stats() if cache else {"hits": 0, "misses": 0}
+        print(f"Cache: {stats['hits']} hits, {stats['misses']} misses.", file=out)
+        return 0
 
     if args.clear:
         chat.clear_session()
-        print("Session cleared.")
-        return
+        print("Session cleared.", file=out)
+        return 0
+
+    if args.compact:
+        count = chat.compact_session()
+        print(f"Session compacted ({count} messages).", file=out)
+        return 0
 
-    if args.prompt:
-        command = " ".join(args.prompt)
-        input_text = ''
-    elif not sys.stdin.isatty():
-        input_text = sys.stdin.read().strip()
-        command = "$(cat)"
+    if args.chunked and not stdin.isatty():
+        chunked_command(" ".join(args.prompt) or "$(cat)", chat, stdin, args, out, err)
     else:
-        print("Usage: rodeo [--session FILE] 'Your prompt' or echo 'Your prompt' | rodeo")
-        sys.exit(1)
+        if args.prompt:
+            command = " ".join(args.prompt)
+            input_text = ''
+        elif not stdin.isatty():
+            input_text = stdin.read().strip()
+            command = "$(cat)"
+        else:
+            print("Usage: rodeo [--session FILE] 'Your prompt' or echo 'Your prompt' | rodeo", file=out)
+            return 1
+
+        if config.get("routes") and not (args.provider or args.model):
+            apply_route(chat, config, build_prompt(command, input_text))
+
+        if args.stream:
+            stream_command(command, chat, input_text, out)
+        else:
+            response = process_command(command, chat, input_text)
+            print(response, file=out)
+
+    if cache:
+        cache.save_stats()
+
+    if args.timings and chat.last_timings:
+        print(format_timings(chat.last_timings), file=err)
+    if args.usage and chat.last_usage:
+        print(format_usage(chat.last_usage), file=err)
+    return 0
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        sys.exit(importlib.import_module(COMMANDS[sys.argv[1]]).main(sys.argv[2:]))
+
+    args = build_parser().parse_args()
+
+    if args.daemon or args.stop_daemon:
+        from rodeo import daemon
+        sys.exit(daemon.serve(daemon_socket(args)) if args.daemon else daemon.stop(daemon_socket(args)))
+
+    if args.interactive:
+        from rodeo.repl import repl
+        sys.exit(repl(args))
+
+    stdin = None
+    socket_path = daemon_socket(args)
+    # --chunked input is streamed, so it is never read up front for the daemon.
+    if not (args.no_daemon or args.chunked) and os.path.exists(socket_path):
+        from rodeo.daemon import forward
+        stdin_text = None
+        if not (args.prompt or args.clear or args.compact or args.cache_stats or sys.stdin.isatty()):
+            stdin_text = sys.stdin.read()
+        status = forward(sys.argv[1:], stdin_text, socket_path)
+        if status is not None:
+            sys.exit(status)
+        # No daemon answered; run here with the input already read.
+        if stdin_text is not None:
+            stdin = io.StringIO(stdin_text)
 
-    response = process_command(command, chat, input_text)
-    print(response)
+    status = run(args, stdin=stdin)
+    if status:
+        sys.exit(status)
 
 if __name__ == "__main__":
     main()
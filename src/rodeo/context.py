@@ -0,0 +1,78 @@
+STRATEGIES = ("window", "summarize", "retrieve")
+# Messages whose token counts are kept; the oldest entries go first, as
+# windows are taken from the end of the history.
+MAX_CACHED_COUNTS = 4096
+
+
+def message_text(message):
+    """Return the text of a message whose content is a string or a list of blocks."""
+    content = message["content"]
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content)
+
+
+class ContextWindow:
+    """
+    Decide which part of the history fits in a token budget.
+
+    Token counts are estimated from the message length and cached for the
+    most recent MAX_CACHED_COUNTS messages, so each turn only estimates the
+    messages it has not seen.
+
+    :param budget: Maximum estimated input tokens sent per request
+    :param strategy: "window" drops turns that do not fit, "summarize" folds
+        them into a rolling summary, "retrieve" sends the ones most relevant
+        to the prompt along with the recent window
+    :param chars_per_token: Characters per token used for the estimate
+    :param recall_share: Share of the budget kept for retrieved turns
+    """
+
+    def __init__(self, budget, strategy="window", chars_per_token=4, recall_share=0.25):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown context strategy: {strategy}")
+        self.budget = budget
+        self.strategy = strategy
+        self.chars_per_token = chars_per_token
+        self.recall_share = recall_share
+        self._token_counts = {}
+
+    def count_tokens(self, text):
+        return len(text) // self.chars_per_token
+
+    def estimate_tokens(self, message):
+        cached = self._token_counts.get(id(message))
+        if cached is not None and cached[0] is message:
+            return cached[1]
+        # A few tokens of per-message overhead for the role and framing.
+        count = self.count_tokens(message_text(message)) + 4
+        if len(self._token_counts) >= MAX_CACHED_COUNTS:
+            del self._token_counts[next(iter(self._token_counts))]
+        self._token_counts[id(message)] = (message, count)
+        return count
+
+    def reset(self):
+        """Forget the cached token counts, as when the history is replaced."""
+        self._token_counts.clear()
+
+    def window_start(self, messages, reserved=0):
+        """
+        Return the index of the first message to send.
+
+        The most recent message is always included, and the window always
+        starts on a user turn as the Messages API requires.
+
+        :param messages: The full history, ending with the new user message
+        :param reserved: Tokens already committed elsewhere (e.g. a summary)
+        """
+        remaining = self.budget - reserved
+        start = len(messages)
+        while start > 0:
+            cost = self.estimate_tokens(messages[start - 1])
+            if remaining - cost < 0 and start < len(messages):
+                break
+            remaining -= cost
+            start -= 1
+        while start < len(messages) - 1 and messages[start]["role"] != "user":
+            start += 1
+        return start
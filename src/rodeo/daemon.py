@@ -0,0 +1,247 @@
+import io
+import os
+import sys
+import json
+import socket
+import struct
+import threading
+import socketserver
+from rodeo.chat import Chat
+from rodeo.cli import build_parser, client_env, run
+from rodeo.session_manager import resolve_session
+
+# Client and daemon exchange newline-delimited JSON frames over the socket.
+# The client sends one request:
+#     {"argv": [...], "stdin": "..." or null, "cwd": "...", "env": {...}}
+# with the part of its environment the invocation reads (see cli.client_env),
+# used instead of the daemon's, and the daemon answers with any number of {"out": text} / {"err": text}
+# frames, as output is produced, followed by a final {"exit": status}.
+
+
+def _send(wfile, frame):
+    wfile.write(json.dumps(frame).encode() + b"\n")
+    wfile.flush()
+
+
+class FrameWriter:
+    """A text stream that forwards everything written to it to the client."""
+
+    def __init__(self, wfile, kind):
+        self.wfile = wfile
+        self.kind = kind
+
+    def write(self, text):
+        if text:
+            _send(self.wfile, {self.kind: text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class Terminal(io.StringIO):
+    """Stands in for the client's stdin when it was a terminal."""
+
+    def isatty(self):
+        return True
+
+
+class ChatPool:
+    """
+    Chats kept in memory by the daemon, one per session file.
+
+    Every Chat shares one pooled Transport so connections stay warm across
+    invocations.  Each session has a lock, so concurrent clients using the
+    same session take turns while different sessions proceed in parallel.
+    """
+
+    def __init__(self, transport=None):
+        if transport is None:
+            from rodeo.transport import Transport
+            transport = Transport(pool_size=32)
+        self.transport = transport
+        self._chats = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def lease(self):
+        return Lease(self)
+
+
+class Lease:
+    """
+    A chat factory for a single request.
+
+    Called like Chat, it returns the pooled Chat for the session with the
+    session locked; release() unlocks everything the request used.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.held = []
+
+    def __call__(self, session_file, **options):
+        pool = self.pool
+        path = resolve_session(session_file)
+        with pool._lock:
+            lock = pool._locks.setdefault(path, threading.Lock())
+        lock.acquire()
+        self.held.append(lock)
+        with pool._lock:
+            chat = pool._chats.get(path)
+            if chat is None:
+                chat = pool._chats[path] = Chat(path, transport=pool.transport)
+        chat.refresh()
+        provider = options.pop("provider", None)
+        if provider is not None:
+            chat.use_provider(provider, options.pop("model", None))
+        for name, value in options.items():
+            setattr(chat, name, value)
+        return chat
+
+    def release(self):
+        while self.held:
+            self.held.pop().release()
+
+
+def _peer_uid(sock):
+    """The user id of the process at the other end of a Unix socket, where the platform reports it."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", creds)[1]
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # The socket is only accessible to its owner, but check the peer
+        # too: a request runs commands with the client's API keys.
+        uid = _peer_uid(self.request)
+        if uid is not None and uid != os.getuid():
+            return
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        if request.get("command") == "shutdown":
+            _send(self.wfile, {"exit": 0})
+            threading.Thread(target=self.server.shutdown).start()
+            return
+
+        out = FrameWriter(self.wfile, "out")
+        err = FrameWriter(self.wfile, "err")
+        lease = self.server.pool.lease()
+        stdin = Terminal() if request.get("stdin") is None else io.StringIO(request["stdin"])
+        try:
+            args = build_parser().parse_args(request["argv"])
+            status = run(args, stdin=stdin, out=out, err=err, chat_factory=lease, cwd=request.get("cwd"),
+                         env=request.get("env"))
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            err.write(f"Error: {e}\n")
+            status = 1
+        finally:
+            lease.release()
+        try:
+            _send(self.wfile, {"exit": status})
+        except OSError:
+            pass
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path, pool=None):
+    """
+    Serve invocations on ``socket_path`` until stopped.
+
+    :param socket_path: Path of the Unix domain socket to listen on
+    :param pool: ChatPool to serve from (default: a new one)
+    :return: The exit status
+    """
+    if os.path.exists(socket_path):
+        if _connect(socket_path) is not None:
+            print(f"A daemon is already listening on {socket_path}.", file=sys.stderr)
+            return 1
+        os.remove(socket_path)
+    # Bind with a restrictive umask so the socket is never, even briefly,
+    # open to other users.
+    umask = os.umask(0o077)
+    try:
+        server = DaemonServer(socket_path, DaemonHandler)
+    finally:
+        os.umask(umask)
+    os.chmod(socket_path, 0o600)
+    server.pool = pool or ChatPool()
+    print(f"Rodeo daemon listening on {socket_path}.", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+    return 0
+
+
+def _connect(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        return None
+    return sock
+
+
+def forward(argv, stdin_text, socket_path, out=None, err=None, env=None, cwd=None):
+    """
+    Run an invocation on the daemon, writing its output as it arrives.
+
+    :param argv: Command line arguments, without the program name
+    :param stdin_text: Piped input, or None if stdin was a terminal
+    :param socket_path: Path of the daemon's socket
+    :param env: Environment of the invocation (default: os.environ); only
+        the variables it reads are sent
+    :param cwd: Directory relative paths are resolved against (default: the current one)
+    :return: The exit status, or None if no daemon is listening
+    """
+    out = out or sys.stdout
+    err = err or sys.stderr
+    sock = _connect(socket_path)
+    if sock is None:
+        return None
+    cwd = cwd or os.getcwd()
+    env = client_env(build_parser().parse_args(argv), os.environ if env is None else env, cwd)
+    try:
+        with sock, sock.makefile('rwb') as f:
+            _send(f, {"argv": argv, "stdin": stdin_text, "cwd": cwd, "env": env})
+            for line in f:
+                frame = json.loads(line)
+                if "out" in frame:
+                    out.write(frame["out"])
+                    out.flush()
+                elif "err" in frame:
+                    err.write(frame["err"])
+                    err.flush()
+                elif "exit" in frame:
+                    return frame["exit"]
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+    print("Error: lost connection to the rodeo daemon.", file=err)
+    return 1
+
+
+def stop(socket_path):
+    sock = _connect(socket_path)
+    if sock is None:
+        print("No daemon is running.")
+        return 1
+    with sock, sock.makefile('rwb') as f:
+        _send(f, {"command": "shutdown"})
+        f.readline()
+    print("Daemon stopped.")
+    return 0
@@ -0,0 +1,278 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from rodeo.cache import ResponseCache
+from rodeo.chat import Chat
+from rodeo.cli import build_prompt
+from rodeo.providers import load_config, make_provider
+from rodeo.ratelimit import from_config
+from rodeo.retry import RetryPolicy
+from rodeo.telemetry import Telemetry, percentile
+from rodeo.transport import Transport
+
+DEFAULT_JUDGE_CACHE = "~/.rodeo/eval-cache"
+
+JUDGE_PROMPT = """Given the following:
+
+Prompt: {prompt}
+Actual Response: {response}
+Expected Outcome: {expected}
+
+On a scale of 0 to 1, how well does the actual response match the expected outcome?
+Provide only a numeric score without any explanation."""
+
+_SCORE = re.compile(r"\d*\.?\d+")
+
+
+class EvalCase:
+    """
+    One prompt and a description of a good answer to it.
+
+    :param prompt: The prompt; $(cat) is replaced by ``input``
+    :param expected_outcome: What the judge should look for in the response
+    :param threshold: Minimum score (0 to 1) for the case to pass
+    :param input: Text piped along with the prompt
+    :param name: Label for the report (default: the case's position)
+    """
+
+    def __init__(self, prompt, expected_outcome, threshold=0.7, input="", name=None):
+        self.prompt = prompt
+        self.expected_outcome = expected_outcome
+        self.threshold = threshold
+        self.input = input
+        self.name = name
+
+    @classmethod
+    def from_dict(cls, record):
+        missing = [key for key in ("prompt", "expected_outcome") if key not in record]
+        if missing:
+            raise ValueError(f"Case without {' or '.join(missing)}: {record}")
+        return cls(record["prompt"], record["expected_outcome"], float(record.get("threshold", 0.7)),
+                   record.get("input", ""), record.get("name"))
+
+
+def load_cases(path):
+    """
+    Read evaluation cases from a YAML, JSON or JSONL file.
+
+    YAML and JSON files hold a list of cases, or a mapping with a "cases"
+    list; any other file is read as JSONL, one case per line.  Each case
+    has "prompt" and "expected_outcome" and optionally "threshold",
+    "input" and "name".
+
+    :param path: The cases file
+    :return: A list of EvalCase
+    """
+    with open(path, 'r') as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError(f"Reading {path} requires PyYAML (pip install pyyaml)")
+            records = yaml.safe_load(f)
+        elif path.endswith(".json"):
+            records = json.load(f)
+        else:
+            records = [json.loads(line) for line in f if line.strip()]
+    if isinstance(records, dict):
+        records = records.get("cases")
+    if not isinstance(records, list):
+        raise ValueError(f"{path} does not contain a list of cases")
+    cases = [EvalCase.from_dict(record) for record in records]
+    for i, case in enumerate(cases, 1):
+        case.name = case.name or f"{os.path.basename(path)}:{i}"
+    return cases
+
+
+def parse_score(text):
+    """Return the first number in a judgement, clamped to 0..1, or None if there is none."""
+    match = _SCORE.search(text)
+    if match is None:
+        return None
+    return min(max(float(match.group()), 0.0), 1.0)
+
+
+def judge_key(model, judge_prompt):
+    """Cache key of a judgement: the judge model and its prompt, which holds the case's prompt and the response."""
+    encoded = json.dumps([model, judge_prompt], ensure_ascii=False)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class Evaluator:
+    """
+    Scores responses to evaluation cases with a judge model.
+
+    Cases run concurrently, each in fresh in-memory conversations: one for
+    the response and one for the judgement, so no case sees another's
+    history and nothing is written to a session file.  Judgements are
+    cached by ``judge_key``, so re-running a suite only pays for the
+    responses that changed.
+
+    :param make_chat: Factory returning a fresh Chat for generating responses
+    :param make_judge: Factory returning a fresh Chat for judging them
+    :param cache: A ResponseCache for judgements, or None
+    :param jobs: Cases evaluated in parallel
+    """
+
+    def __init__(self, make_chat, make_judge, cache=None, jobs=8):
+        self.make_chat = make_chat
+        self.make_judge = make_judge
+        self.cache = cache
+        self.jobs = jobs
+        self._cache_lock = threading.Lock()
+
+    def run(self, cases, on_result=None):
+        """
+        Evaluate every case.
+
+        :param on_result: Called with each result as it completes
+        :return: The results, in case order
+        """
+        def evaluate(case):
+            result = self.evaluate(case)
+            if on_result:
+                on_result(result)
+            return result
+
+        with ThreadPoolExecutor(self.jobs) as pool:
+            return list(pool.map(evaluate, cases))
+
+    def evaluate(self, case):
+        start = time.monotonic()
+        result = {"name": case.name, "prompt": case.prompt, "threshold": case.threshold, "score": 0.0,
+                  "judge_cached": False}
+        try:
+            result["response"] = self.make_chat().get_response(build_prompt(case.prompt, case.input))
+            result["score"], result["judge_cached"] = self.judge(case, result["response"])
+        except Exception as e:
+            result["error"] = str(e)
+        result["passed"] = "error" not in result and result["score"] >= case.threshold
+        result["seconds"] = time.monotonic() - start
+        return result
+
+    def judge(self, case, response):
+        """
+        Score a response to a case.
+
+        :return: (score, whether it came from the cache)
+        :raises ValueError: When the judge's answer holds no score
+        """
+        chat = self.make_judge()
+        judge_prompt = JUDGE_PROMPT.format(prompt=build_prompt(case.prompt, case.input), response=response,
+                                           expected=case.expected_outcome)
+        key = judge_key(chat.model, judge_prompt)
+        if self.cache is not None:
+            with self._cache_lock:
+                cached = self.cache.get(key)
+            if cached is not None:
+                return cached["score"], True
+
+        judgement = chat.get_response(judge_prompt)
+        score = parse_score(judgement)
+        if score is None:
+            raise ValueError(f"Judgement without a score: {judgement!r}")
+        if self.cache is not None:
+            with self._cache_lock:
+                self.cache.put(key, {"score": score, "judgement": judgement})
+        return score, False
+
+
+def summarize(results, seconds=None):
+    """
+    Aggregate evaluation results.
+
+    :param seconds: Wall time of the whole run, if known
+    :return: A dict of counts, pass rate, mean score, judge cache hits and case latency quantiles
+    """
+    durations = sorted(r["seconds"] for r in results)
+    scored = [r["score"] for r in results if "error" not in r]
+    return {
+        "cases": len(results),
+        "passed": sum(r["passed"] for r in results),
+        "failed": sum(not r["passed"] and "error" not in r for r in results),
+        "errors": sum("error" in r for r in results),
+        "pass_rate": sum(r["passed"] for r in results) / len(results) if results else 0.0,
+        "mean_score": sum(scored) / len(scored) if scored else None,
+        "judge_cache_hits": sum(r["judge_cached"] for r in results),
+        "seconds": seconds,
+        "case_seconds": {"p50": percentile(durations, 0.5), "p95": percentile(durations, 0.95)},
+    }
+
+
+def main(argv=None, out=None):
+    parser = argparse.ArgumentParser(prog="rodeo eval", description="Score responses to evaluation cases with a judge model")
+    parser.add_argument("cases", nargs="+", help="Case files: YAML, JSON or JSONL")
+    parser.add_argument("--jobs", type=int, default=8, help="Cases evaluated in parallel (default: 8)")
+    parser.add_argument("--provider", help="Provider answering the cases (default: from the config file)")
+    parser.add_argument("--model", help="Model answering the cases")
+    parser.add_argument("--judge-provider", help="Provider judging the responses (default: --provider)")
+    parser.add_argument("--judge-model", help="Model judging the responses (default: --model)")
+    parser.add_argument("--config", help="Config file (default: $RODEO_CONFIG or ~/.rodeo/config.json)")
+    parser.add_argument("--max-tokens", type=int, help="Maximum tokens in each response")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds to wait for each response")
+    parser.add_argument("--retries", type=int, default=5, help="Retries for failed or rate-limited requests")
+    parser.add_argument("--judge-cache", default=DEFAULT_JUDGE_CACHE,
+                        help=f"Directory caching judgements (default: {DEFAULT_JUDGE_CACHE})")
+    parser.add_argument("--no-judge-cache", action="store_true", help="Judge every response again")
+    parser.add_argument("--output", help="Write one JSON line per case to this file")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--metrics", metavar="FILE", default=os.getenv('RODEO_METRICS'),
+                        help="Append per-call latency and token metrics to FILE (default: $RODEO_METRICS)")
+    args = parser.parse_args(argv)
+    out = out or sys.stdout
+
+    cases = [case for path in args.cases for case in load_cases(path)]
+    config = load_config(args.config)
+    provider = make_provider(args.provider, config)
+    judge_provider = make_provider(args.judge_provider, config) if args.judge_provider else provider
+    model = args.model or (None if args.provider else config.get("model"))
+    transport = Transport(pool_size=args.jobs, read_timeout=args.timeout)
+    telemetry = Telemetry(args.metrics) if args.metrics else None
+    rate_limit = from_config(config)
+
+    def chat_factory(provider, model):
+        return lambda: Chat(None, transport=transport, timeout=args.timeout, telemetry=telemetry,
+                            retry=RetryPolicy(max_retries=args.retries), provider=provider, model=model,
+                            max_tokens=args.max_tokens or config.get("max_tokens"),
+                            rate_limit=rate_limit, priority="batch")
+
+    evaluator = Evaluator(
+        chat_factory(provider, model),
+        chat_factory(judge_provider, args.judge_model or (None if args.judge_provider else model)),
+        cache=None if args.no_judge_cache else ResponseCache(args.judge_cache),
+        jobs=args.jobs,
+    )
+
+    output = open(args.output, 'w') if args.output else None
+
+    def report(result):
+        if output:
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+        if not args.json:
+            status = "error" if "error" in result else "pass" if result["passed"] else "FAIL"
+            print(f"{status}\t{result['score']:.2f}\t{result['name']}\t{result.get('error', '')}".rstrip(), file=out)
+
+    start = time.monotonic()
+    try:
+        results = evaluator.run(cases, on_result=report)
+    finally:
+        transport.close()
+        if output:
+            output.close()
+    summary = summarize(results, time.monotonic() - start)
+
+    if args.json:
+        json.dump({"summary": summary, "results": results}, out, indent=2)
+        out.write("\n")
+    else:
+        mean = "-" if summary["mean_score"] is None else f"{summary['mean_score']:.2f}"
+        print(f"{summary['passed']}/{summary['cases']} passed, {summary['failed']} failed, {summary['errors']} errors; "
+              f"mean score {mean}; {summary['judge_cache_hits']} cached judgements; {summary['seconds']:.1f}s", file=out)
+    return 0 if summary["passed"] == summary["cases"] else 1
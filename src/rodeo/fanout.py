@@ -0,0 +1,185 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from rodeo.chat import Chat
+from rodeo.cli import process_command
+from rodeo.providers import load_config, make_provider
+from rodeo.ratelimit import from_config
+from rodeo.retry import RetryPolicy
+from rodeo.telemetry import Telemetry
+from rodeo.transport import Transport
+
+
+def collect_files(paths=(), patterns=(), stream=None):
+    """
+    List the files to map over, in order and without duplicates.
+
+    :param paths: File names given on the command line
+    :param patterns: Glob patterns; ``**`` matches across directories
+    :param stream: A text stream of file names, one per line (e.g. piped from find)
+    :return: A list of file names
+    """
+    files = list(paths)
+    for pattern in patterns:
+        files += sorted(glob.glob(pattern, recursive=True))
+    if stream is not None:
+        files += [line.rstrip("\n") for line in stream if line.strip()]
+    return [path for path in dict.fromkeys(files) if not os.path.isdir(path)]
+
+
+def read_done(output, prompt):
+    """Return the files that already have a response to ``prompt`` in a results file."""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line torn by an interruption.
+            if record.get("prompt") == prompt and "response" in record:
+                done.add(record["file"])
+    return done
+
+
+class FanOut:
+    """
+    Apply one prompt to many files, a fresh conversation per file.
+
+    Files are read and answered by a pool of ``jobs`` threads sharing one
+    pooled Transport, so the number of requests in flight, and of open
+    connections, stays bounded however many files there are.
+
+    :param prompt: The prompt; $(cat) is replaced by each file's contents.
+        Empty files are not sent, and their results are marked "skipped".
+    :param make_chat: Factory returning a fresh Chat for each file
+    :param jobs: Files answered in parallel
+    """
+
+    def __init__(self, prompt, make_chat, jobs=8):
+        self.prompt = prompt
+        self.make_chat = make_chat
+        self.jobs = jobs
+
+    def answer(self, path):
+        start = time.monotonic()
+        result = {"file": path, "prompt": self.prompt}
+        try:
+            with open(path, 'rb') as f:
+                text = f.read().decode(errors="replace")
+            if text.strip():
+                result["response"] = process_command(self.prompt, self.make_chat(), text)
+            else:
+                # Without contents the prompt would be sent with $(cat) in it.
+                result["skipped"] = "empty file"
+        except Exception as e:
+            result["error"] = str(e)
+        result["seconds"] = time.monotonic() - start
+        return result
+
+    def run(self, files, ordered=False):
+        """
+        Answer every file.
+
+        :param ordered: Yield results in the order of ``files`` rather than as they complete
+        :return: A generator of result dicts
+        """
+        with ThreadPoolExecutor(self.jobs) as pool:
+            futures = {pool.submit(self.answer, path): i for i, path in enumerate(files)}
+            try:
+                if not ordered:
+                    for future in as_completed(futures):
+                        yield future.result()
+                    return
+                pending = {}
+                next_index = 0
+                for future in as_completed(futures):
+                    pending[futures[future]] = future.result()
+                    while next_index in pending:
+                        yield pending.pop(next_index)
+                        next_index += 1
+            finally:
+                # Interrupted or abandoned: drop the files not started yet.
+                for future in futures:
+                    future.cancel()
+
+
+def main(argv=None, stdin=None, out=None, err=None):
+    parser = argparse.ArgumentParser(prog="rodeo map", description="Apply a prompt to many files in parallel")
+    parser.add_argument("prompt", help="Prompt; $(cat) is replaced by each file's contents (appended if absent)")
+    parser.add_argument("files", nargs="*", help="Files to process (default: file names read from stdin)")
+    parser.add_argument("--files", dest="patterns", action="append", default=[], metavar="GLOB",
+                        help="Also process the files matching GLOB (repeatable; ** spans directories)")
+    parser.add_argument("--jobs", type=int, default=8, help="Files processed in parallel (default: 8)")
+    parser.add_argument("--ordered", action="store_true", help="Print results in input order rather than as they complete")
+    parser.add_argument("--output", help="Also append JSONL results to this file; files it already answers are skipped")
+    parser.add_argument("--json", action="store_true", help="Print JSONL results instead of text")
+    parser.add_argument("--provider", help="Provider to use (default: from the config file)")
+    parser.add_argument("--model", help="Model to request")
+    parser.add_argument("--config", help="Config file (default: $RODEO_CONFIG or ~/.rodeo/config.json)")
+    parser.add_argument("--max-tokens", type=int, help="Maximum tokens in each response")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds to wait for each response")
+    parser.add_argument("--retries", type=int, default=5, help="Retries for failed or rate-limited requests")
+    parser.add_argument("--metrics", metavar="FILE", default=os.getenv('RODEO_METRICS'),
+                        help="Append per-call latency and token metrics to FILE (default: $RODEO_METRICS)")
+    args = parser.parse_args(argv)
+    stdin = stdin or sys.stdin
+    out = out or sys.stdout
+    err = err or sys.stderr
+
+    prompt = args.prompt if '$(cat)' in args.prompt else args.prompt + "\n\n$(cat)"
+    piped = None if args.files or args.patterns or stdin.isatty() else stdin
+    files = collect_files(args.files, args.patterns, piped)
+    done = read_done(args.output, prompt) if args.output else set()
+    todo = [path for path in files if path not in done]
+    if done:
+        print(f"Skipping {len(files) - len(todo)} files already answered in {args.output}.", file=err)
+
+    config = load_config(args.config)
+    provider = make_provider(args.provider, config)
+    model = args.model or (None if args.provider else config.get("model"))
+    transport = Transport(pool_size=args.jobs, read_timeout=args.timeout)
+    telemetry = Telemetry(args.metrics) if args.metrics else None
+    rate_limit = from_config(config)
+    fan_out = FanOut(prompt, lambda: Chat(None, transport=transport, timeout=args.timeout, telemetry=telemetry,
+                                          retry=RetryPolicy(max_retries=args.retries), provider=provider, model=model,
+                                          max_tokens=args.max_tokens or config.get("max_tokens"),
+                                          rate_limit=rate_limit, priority="batch"), jobs=args.jobs)
+
+    output = open(args.output, 'a') if args.output else None
+    if output and output.tell():
+        with open(args.output, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read() != b"\n":
+                output.write("\n")  # Start after a line torn by an interruption.
+    errors = skipped = 0
+    start = time.monotonic()
+    try:
+        for result in fan_out.run(todo, ordered=args.ordered):
+            errors += "error" in result
+            skipped += "skipped" in result
+            if output:
+                # Written as each file completes, so an interrupted run resumes where it stopped.
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+            if args.json:
+                out.write(json.dumps(result) + "\n")
+            elif "error" in result:
+                print(f"==> {result['file']} <== error: {result['error']}\n", file=out)
+            elif "skipped" in result:
+                print(f"==> {result['file']} <== skipped: {result['skipped']}\n", file=out)
+            else:
+                print(f"==> {result['file']} <==\n{result['response']}\n", file=out)
+            out.flush()
+    finally:
+        transport.close()
+        if output:
+            output.close()
+    summary = f"{errors} errors, {skipped} empty files skipped" if skipped else f"{errors} errors"
+    print(f"Processed {len(todo)} files ({summary}) in {time.monotonic() - start:.1f}s.", file=err)
+    return 1 if errors else 0
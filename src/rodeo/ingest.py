@@ -0,0 +1,123 @@
+from itertools import chain
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from rodeo.chat import Chat
+
+CHARS_PER_TOKEN = 4
+
+MAP_PROMPT = (
+    "The text below is part {number} of a larger input that is too long to send at once. "
+    "Answer the request for this part only.\n\n{prompt}"
+)
+
+REDUCE_PROMPT = (
+    "A long input was split into consecutive parts and the request below was answered for each part "
+    "separately. Combine the partial answers into a single answer to the request, as if the whole "
+    "input had been read at once.\n\nRequest: {command}\n\n{answers}"
+)
+
+
+def iter_chunks(stream, max_tokens, chars_per_token=CHARS_PER_TOKEN):
+    """
+    Read a text stream incrementally and yield chunks of at most ``max_tokens``.
+
+    Chunks end on line boundaries; a single line longer than the budget is
+    split.  At most one chunk is held in memory at a time.
+
+    :param stream: A text stream such as sys.stdin
+    :param max_tokens: Estimated token budget of each chunk
+    :param chars_per_token: Characters per token used for the estimate
+    """
+    budget = max(1, max_tokens * chars_per_token)
+    lines = []
+    size = 0
+    # readline(budget) returns overlong lines in budget-sized pieces, so not
+    # even a file without newlines is read whole.
+    for line in iter(lambda: stream.readline(budget), ''):
+        if size + len(line) > budget and lines:
+            yield "".join(lines)
+            lines, size = [], 0
+        lines.append(line)
+        size += len(line)
+    if lines:
+        yield "".join(lines)
+
+
+def _chunk_prompt(command, chunk):
+    chunk = chunk.strip()
+    if '$(cat)' in command:
+        return command.replace('$(cat)', chunk)
+    return f"{command}\n\n{chunk}"
+
+
+def _reduce_prompt(command, answers):
+    parts = "\n\n".join(f"Part {i + 1}:\n{answer}" for i, answer in enumerate(answers))
+    return REDUCE_PROMPT.format(command=command, answers=parts)
+
+
+class ChunkedRun:
+    """
+    Answer a request over input too large for one call, map-reduce style.
+
+    Each chunk is sent in its own conversation (map), up to ``jobs`` at a
+    time, and the partial answers are combined (reduce).  Partial answers
+    are folded together whenever they outgrow the chunk budget, so memory
+    stays bounded however long the input is.  The final combination goes
+    through ``chat`` and is recorded in its session.
+
+    :param chat: The session's Chat; map calls share its transport, timeout and cache
+    :param chunk_tokens: Estimated token budget of each chunk
+    :param jobs: Maximum map requests in flight
+    """
+
+    def __init__(self, chat, chunk_tokens=50000, jobs=4):
+        self.chat = chat
+        self.chunk_tokens = chunk_tokens
+        self.jobs = max(1, jobs)
+        self.chunks = 0
+
+    def _make_chat(self):
+        chat = Chat(None, transport=self.chat.transport, timeout=self.chat.timeout, cache=self.chat.cache,
+                    telemetry=self.chat.telemetry, provider=self.chat.provider, model=self.chat.model,
+                    max_tokens=self.chat.max_tokens, rate_limit=self.chat.rate_limit, priority=self.chat.priority)
+        chat.api_url = self.chat.api_url
+        return chat
+
+    def _ask(self, prompt):
+        return self._make_chat().get_response(prompt)
+
+    def run(self, command, stream):
+        """
+        Answer ``command`` over the text read from ``stream``.
+
+        :param command: The prompt; $(cat) marks where each chunk goes, otherwise chunks are appended
+        :param stream: The text stream to read
+        :return: The combined answer
+        """
+        chunks = iter_chunks(stream, self.chunk_tokens)
+        first = next(chunks, None)
+        second = next(chunks, None) if first is not None else None
+        if second is None:
+            # Fits in one request: no need for map-reduce.
+            self.chunks = 1 if first is not None else 0
+            return self.chat.get_response(_chunk_prompt(command, first or ''))
+
+        partials = []
+        pending = deque()
+        with ThreadPoolExecutor(self.jobs) as pool:
+            for chunk in chain((first, second), chunks):
+                self.chunks += 1
+                prompt = MAP_PROMPT.format(number=self.chunks, prompt=_chunk_prompt(command, chunk))
+                pending.append(pool.submit(self._ask, prompt))
+                # Keep the pool busy without reading ahead of it.
+                while len(pending) >= 2 * self.jobs:
+                    self._collect(command, partials, pending.popleft().result())
+            while pending:
+                self._collect(command, partials, pending.popleft().result())
+        return self.chat.get_response(_reduce_prompt(command, partials))
+
+    def _collect(self, command, partials, answer):
+        partials.append(answer)
+        size = sum(len(p) for p in partials)
+        if len(partials) > 1 and size > self.chunk_tokens * CHARS_PER_TOKEN:
+            partials[:] = [self._ask(_reduce_prompt(command, partials))]
@@ -0,0 +1,72 @@
+import os
+import fcntl
+import threading
+
+
+class FileLock:
+    """
+    Advisory lock shared by every process using the same path.
+
+    The lock is taken with flock on a separate ``<path>.lock`` file, so it
+    survives the locked file being atomically replaced.  It is re-entrant
+    within a process and also serializes threads.
+
+    :param path: Path of the file being protected
+    """
+
+    def __init__(self, path):
+        self.lock_path = path + ".lock"
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def atomic_write(path, data, durable=True):
+    """
+    Replace ``path`` with ``data`` (bytes) so readers see the old or new contents, never a mix.
+
+    The data is written to a temporary file in the same directory, flushed
+    to disk and renamed over the target.  Scratch state that is rewritten
+    on every request can pass ``durable=False`` to skip the flush: the
+    rename still keeps the file whole for other processes, only a crash of
+    the whole machine may lose the latest contents.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,166 @@
+import json
+from collections.abc import Mapping
+
+# orjson (optional) encodes and decodes several times faster than the json
+# module, but importing it costs about a fifth of rodeo's start-up, so it is
+# only loaded once a call has enough JSON to make up for that.
+ORJSON_MIN_BYTES = 256 * 1024
+_orjson = None
+
+
+def use_orjson(size):
+    """
+    Switch to orjson, if it is installed, once ``size`` bytes of JSON are at hand.
+
+    :return: Whether orjson is in use
+    """
+    global _orjson
+    if _orjson is None and size >= ORJSON_MIN_BYTES:
+        try:
+            import orjson
+        except ImportError:
+            orjson = False
+        _orjson = orjson
+    return bool(_orjson)
+
+
+def _default(obj):
+    if isinstance(obj, Message):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Encode ``obj`` as compact UTF-8 JSON bytes."""
+    if _orjson:
+        return _orjson.dumps(obj, default=_default)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default).encode()
+
+
+def loads(data):
+    """Decode JSON from bytes or str."""
+    if _orjson:
+        return _orjson.loads(data)
+    return json.loads(data)
+
+
+def loads_lines(lines):
+    """
+    Decode a list of JSON lines with a single call.
+
+    :return: One value per line
+    :raises ValueError: If any line is not valid JSON on its own
+    """
+    use_orjson(sum(map(len, lines)))
+    records = loads(b"[" + b",".join(lines) + b"]")
+    if len(records) != len(lines):
+        # A torn line merged with its neighbour into valid JSON.
+        raise ValueError("Lines do not hold one JSON value each")
+    return records
+
+
+class Message(Mapping):
+    """
+    A chat message that remembers its JSON encoding.
+
+    Messages are immutable read-only mappings with "role" and "content"
+    keys, so they compare equal to the equivalent dicts and work wherever
+    the history used to hold dicts.  The JSON encoding is computed at most
+    once (or taken from the session file the message was read from) and
+    reused for every request body and session write, so a turn only
+    encodes the messages it adds.
+
+    :param role: "user" or "assistant"
+    :param content: A string or a list of content blocks
+    """
+
+    __slots__ = ("role", "content", "_json")
+
+    def __init__(self, role, content, _json=None):
+        self.role = role
+        self.content = content
+        self._json = _json
+
+    @classmethod
+    def coerce(cls, message):
+        """Return ``message`` as a Message; dicts with keys other than role and content are kept as they are."""
+        if isinstance(message, Message) or len(message) != 2 or "role" not in message or "content" not in message:
+            return message
+        return cls(message["role"], message["content"])
+
+    @classmethod
+    def from_json(cls, line, record=None):
+        """
+        Decode one JSON object, keeping ``line`` as the message's encoding.
+
+        :param line: The JSON, as bytes or str
+        :param record: ``line`` already decoded, if it was
+        :return: A Message, or the decoded object if it is not a plain message
+        """
+        if record is None:
+            record = loads(line)
+        if type(record) is not dict or len(record) != 2 or "role" not in record or "content" not in record:
+            return record
+        return cls(record["role"], record["content"], (line.encode() if isinstance(line, str) else line).strip())
+
+    def json(self):
+        """The message's JSON encoding, as bytes."""
+        if self._json is None:
+            if isinstance(self.content, str):
+                use_orjson(len(self.content))
+            self._json = dumps(self.to_dict())
+        return self._json
+
+    def to_dict(self):
+        return {"role": self.role, "content": self.content}
+
+    def __getitem__(self, key):
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(("role", "content"))
+
+    def __len__(self):
+        return 2
+
+    # Faster than the generic Mapping versions, which go through __getitem__.
+    def __contains__(self, key):
+        return key == "role" or key == "content"
+
+    def __eq__(self, other):
+        if isinstance(other, Message):
+            return self.role == other.role and self.content == other.content
+        if isinstance(other, Mapping):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Message(role={self.role!r}, content={self.content!r})"
+
+
+def encode_message(message):
+    """JSON bytes of a Message or a plain dict."""
+    return message.json() if isinstance(message, Message) else dumps(message)
+
+
+def encode_request(body):
+    """
+    Encode a request body, reusing the cached encodings of its messages.
+
+    :param body: A request body whose "messages" may hold Message objects
+    :return: The JSON bytes to send
+    """
+    parts = []
+    for key, value in body.items():
+        if key == "messages":
+            encoded = b"[" + b",".join(encode_message(m) for m in value) + b"]"
+        else:
+            encoded = dumps(value)
+        parts.append(dumps(key) + b":" + encoded)
+    return b"{" + b",".join(parts) + b"}"
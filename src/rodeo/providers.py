@@ -0,0 +1,287 @@
+import os
+import json
+import time
+from rodeo.context import message_text
+from rodeo.sse import iter_events
+
+DEFAULT_CONFIG = "~/.rodeo/config.json"
+
+
+class Provider:
+    """
+    Adapts Chat's requests to one model API.
+
+    Chat builds every request in the Anthropic Messages format and expects
+    responses in it too; a provider translates both ways.  ``prepare``
+    turns a payload into the provider's request body, ``parse`` turns a
+    response body back into a Messages response, and ``events`` turns a
+    streamed response into Messages stream events.
+
+    :param url: Endpoint (default: the provider's public API)
+    :param api_key_env: Environment variable holding the API key
+    :param default_model: Model used when none is chosen
+    :param env: Environment the API key is read from (default: this
+        process's), such as a daemon client's
+    """
+
+    name = None
+    url = None
+    api_key_env = None
+    default_model = None
+
+    def __init__(self, url=None, api_key_env=None, default_model=None, env=None):
+        self.env = env
+        if url:
+            self.url = url
+        if api_key_env:
+            self.api_key_env = api_key_env
+        if default_model:
+            self.default_model = default_model
+
+    def api_key(self):
+        env = os.environ if self.env is None else self.env
+        return env.get(self.api_key_env) if self.api_key_env else None
+
+    def headers(self, api_key):
+        return {"Content-Type": "application/json"}
+
+    def prepare(self, payload):
+        return payload
+
+    def parse(self, body):
+        return body
+
+    def send(self, chat, body, stream=False, **kwargs):
+        """Send a prepared request body on behalf of ``chat`` and return the response."""
+        return chat.transport.post(chat.api_url, headers=chat._headers(), json=body, stream=stream, **kwargs)
+
+    def events(self, response):
+        """Yield (event, data) pairs of a streamed response, data decoded from JSON."""
+        for event, data in iter_events(response.iter_lines()):
+            yield event, json.loads(data)
+
+
+class AnthropicProvider(Provider):
+    name = "anthropic"
+    url = "https://api.anthropic.com/v1/messages"
+    api_key_env = "ANTHROPIC_API_KEY"
+    default_model = "claude-3-sonnet-20240229"
+
+    def headers(self, api_key):
+        return {
+            "Content-Type": "application/json",
+            "x-api-key": api_key,
+            "anthropic-version": "2023-06-01"
+        }
+
+
+# OpenAI finish reasons and their Messages API equivalents.
+STOP_REASONS = {"stop": "end_turn", "length": "max_tokens", "tool_calls": "tool_use", "content_filter": "refusal"}
+
+
+def _openai_usage(usage):
+    converted = {"input_tokens": usage.get("prompt_tokens", 0), "output_tokens": usage.get("completion_tokens", 0)}
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    if cached:
+        converted["cache_read_input_tokens"] = cached
+    return converted
+
+
+class OpenAIProvider(Provider):
+    """Any server speaking the OpenAI chat completions API, such as a local model server."""
+
+    name = "openai"
+    url = "https://api.openai.com/v1/chat/completions"
+    api_key_env = "OPENAI_API_KEY"
+    default_model = "gpt-4o-mini"
+
+    def headers(self, api_key):
+        headers = {"Content-Type": "application/json"}
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        return headers
+
+    def prepare(self, payload):
+        messages = []
+        system = payload.get("system")
+        if system:
+            if not isinstance(system, str):
+                system = "".join(block.get("text", "") for block in system)
+            messages.append({"role": "system", "content": system})
+        # Content blocks (and their cache_control marks) collapse to plain text.
+        messages += [{"role": m["role"], "content": message_text(m)} for m in payload["messages"]]
+        body = {"model": payload["model"], "messages": messages, "max_tokens": payload["max_tokens"]}
+        if payload.get("stream"):
+            body["stream"] = True
+            body["stream_options"] = {"include_usage": True}
+        return body
+
+    def parse(self, body):
+        choice = body["choices"][0]
+        return {
+            "content": [{"type": "text", "text": choice["message"].get("content") or ""}],
+            "stop_reason": STOP_REASONS.get(choice.get("finish_reason"), choice.get("finish_reason")),
+            "usage": _openai_usage(body.get("usage") or {}),
+        }
+
+    def events(self, response):
+        for _, data in iter_events(response.iter_lines()):
+            if data == "[DONE]":
+                yield "message_stop", {"type": "message_stop"}
+                return
+            chunk = json.loads(data)
+            for choice in chunk.get("choices") or []:
+                text = (choice.get("delta") or {}).get("content")
+                if text:
+                    yield "content_block_delta", {"type": "content_block_delta", "delta": {"type": "text_delta", "text": text}}
+                if choice.get("finish_reason"):
+                    stop_reason = STOP_REASONS.get(choice["finish_reason"], choice["finish_reason"])
+                    yield "message_delta", {"type": "message_delta", "delta": {"stop_reason": stop_reason}}
+            if chunk.get("usage"):
+                yield "message_delta", {"type": "message_delta", "usage": _openai_usage(chunk["usage"])}
+
+
+def stub_reply(payload):
+    """The stub's answer: the last user message, upper-cased."""
+    return message_text(payload["messages"][-1]).upper()
+
+
+class StubResponse:
+    """Just enough of requests.Response for Chat to read a stub reply."""
+
+    status_code = 200
+    ok = True
+    headers = {}
+
+    def __init__(self, body, lines=None, latency=0.0):
+        self._body = body
+        self._lines = lines
+        self.timings = {"reused": True, "dns": 0.0, "connect": 0.0, "tls": 0.0, "first_byte": latency, "total": latency}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._body
+
+    def iter_lines(self):
+        return iter(self._lines or [])
+
+    def close(self):
+        pass
+
+
+class StubProvider(Provider):
+    """
+    A deterministic model that answers in-process, without any network.
+
+    Useful for load tests, benchmarks and offline development.  Replies are
+    produced by ``reply`` (the upper-cased prompt by default) after
+    ``latency`` seconds, and streamed at ``tokens_per_second`` if given.
+
+    :param latency: Seconds before the reply (or its first token) is ready
+    :param tokens_per_second: Streaming pace, 4 characters per token (None: no delay)
+    :param reply: Function mapping a request payload to the reply text
+    """
+
+    name = "stub"
+    url = "stub://local"
+    default_model = "stub"
+
+    def __init__(self, latency=0.0, tokens_per_second=None, reply=stub_reply, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.reply = reply
+
+    def send(self, chat, body, stream=False, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        text = self.reply(body)
+        message = {
+            "id": "msg_stub",
+            "type": "message",
+            "role": "assistant",
+            "model": body["model"],
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "usage": {"input_tokens": sum(len(message_text(m)) for m in body["messages"]) // 4,
+                      "output_tokens": len(text) // 4 + 1},
+        }
+        if not stream:
+            return StubResponse(message, latency=self.latency)
+        return StubResponse(None, self._stream_lines(message, text), latency=self.latency)
+
+    def _stream_lines(self, message, text):
+        def event(name, data):
+            return [f"event: {name}", f"data: {json.dumps(data)}", ""]
+
+        yield from event("message_start", {"type": "message_start", "message": dict(message, content=[])})
+        for i in range(0, len(text), 4):
+            if self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+            yield from event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                     "delta": {"type": "text_delta", "text": text[i:i + 4]}})
+        yield from event("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn"},
+                                           "usage": {"output_tokens": message["usage"]["output_tokens"]}})
+        yield from event("message_stop", {"type": "message_stop"})
+
+
+PROVIDERS = {
+    "anthropic": AnthropicProvider,
+    "openai": OpenAIProvider,
+    "stub": StubProvider,
+}
+
+
+def load_config(path=None):
+    """
+    Read the JSON config file, if there is one.
+
+    :param path: Config file (default: $RODEO_CONFIG or ~/.rodeo/config.json)
+    :return: The config dict, empty when the file does not exist
+    """
+    path = os.path.expanduser(path or os.getenv('RODEO_CONFIG') or DEFAULT_CONFIG)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        try:
+            return json.load(f)
+        except ValueError as e:
+            raise ValueError(f"Invalid config file {path}: {e}")
+
+
+def make_provider(name=None, config=None, env=None):
+    """
+    Create a provider by name.
+
+    The name is either a built-in provider type or an entry of the config's
+    "providers" table, whose "type" selects the built-in and whose other
+    keys (url, api_key_env, default_model, latency...) are passed to it.
+
+    :param name: Provider name (default: the config's "provider", else "anthropic")
+    :param config: Config as returned by load_config
+    :param env: Environment the API key is read from (default: this process's)
+    :return: A Provider
+    """
+    config = config or {}
+    name = name or config.get("provider") or "anthropic"
+    options = dict(config.get("providers", {}).get(name, {}))
+    kind = options.pop("type", name)
+    if kind not in PROVIDERS:
+        raise ValueError(f"Unknown provider: {name}")
+    return PROVIDERS[kind](env=env, **options)
+
+
+def route(config, prompt):
+    """
+    Return the first of the config's "routes" that matches a prompt, if any.
+
+    A route such as {"max_chars": 200, "provider": "fast", "model": "..."}
+    sends prompts of at most 200 characters to that provider and model.
+    """
+    size = len(prompt) if isinstance(prompt, str) else sum(len(block.get("text", "")) for block in prompt)
+    for rule in config.get("routes", []):
+        if size <= rule.get("max_chars", float("inf")):
+            return rule
+    return None
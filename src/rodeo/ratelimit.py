@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import threading
+from rodeo.context import message_text
+from rodeo.locking import FileLock, atomic_write
+from rodeo.retry import retry_after
+
+DEFAULT_STATE = "~/.rodeo/ratelimit.json"
+
+# Calls are "interactive" (a person is waiting) or "batch".  Batch calls
+# leave RESERVE of each bucket to interactive ones, and hold back while an
+# interactive call is waiting, so bulk work never starves a prompt.
+PRIORITIES = ("interactive", "batch")
+RESERVE = 0.2
+
+# Limits are per minute, and the buckets refill evenly over that window.
+WINDOW = 60.0
+DIMENSIONS = ("requests", "tokens")
+# Rate-limit headers of the Anthropic and OpenAI APIs: (limit, remaining).
+HEADERS = {
+    "requests": [("anthropic-ratelimit-requests-limit", "anthropic-ratelimit-requests-remaining"),
+                 ("x-ratelimit-limit-requests", "x-ratelimit-remaining-requests")],
+    "tokens": [("anthropic-ratelimit-tokens-limit", "anthropic-ratelimit-tokens-remaining"),
+               ("x-ratelimit-limit-tokens", "x-ratelimit-remaining-tokens")],
+}
+# A waiting call renews its registration each time it checks the bucket;
+# registrations of calls that stopped waiting (or died) lapse after this.
+WAITER_TTL = 5.0
+MAX_SLEEP = 0.5
+
+
+def estimate_tokens(payload):
+    """Estimate the input tokens of a request payload, at 4 characters per token."""
+    system = payload.get("system") or ""
+    if not isinstance(system, str):
+        system = "".join(block.get("text", "") for block in system)
+    return (len(system) + sum(len(message_text(m)) for m in payload["messages"])) // 4
+
+
+def _number(headers, name):
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Client-side token buckets of requests and tokens per minute, shared between processes.
+
+    Every call takes one request and its estimated input tokens from the
+    buckets of its API key before it is sent, waiting for them to refill if
+    need be; its output tokens are taken once it completes.  The buckets
+    live in a small JSON state file, read and written under an advisory
+    lock, so every process using the same file (including a daemon's
+    threads) draws from the same buckets.
+
+    The limits adapt to the API: its rate-limit headers set the limits and
+    bring the buckets down to what the server says remains, and a 429
+    pauses every caller for its retry-after.  Configured limits are used
+    until the headers are seen, and are never exceeded.
+
+    :param path: State file shared by the cooperating processes
+    :param requests_per_minute: Requests allowed per minute (default: learned from the API)
+    :param tokens_per_minute: Input and output tokens allowed per minute (default: learned from the API)
+    """
+
+    def __init__(self, path=DEFAULT_STATE, requests_per_minute=None, tokens_per_minute=None):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.lock = FileLock(self.path)
+        self.limits = {"requests": requests_per_minute, "tokens": tokens_per_minute}
+        self.waits = 0
+        self.waited = 0.0
+
+    @staticmethod
+    def key(url, api_key):
+        """Name the buckets of one API key at one endpoint, without storing the key."""
+        import hashlib
+        return hashlib.sha256(f"{url}\n{api_key or ''}".encode()).hexdigest()[:16]
+
+    def _limit(self, bucket, dimension):
+        limits = [limit for limit in (self.limits[dimension], bucket["limits"].get(dimension)) if limit]
+        return min(limits) if limits else None
+
+    def _update(self, key, change):
+        """Apply ``change(bucket, now)`` to the refilled bucket of ``key`` in the state file, returning its result."""
+        with self.lock:
+            try:
+                with open(self.path, 'r') as f:
+                    state = json.load(f)
+            except (FileNotFoundError, ValueError):
+                state = {}
+            now = time.time()
+            bucket = state.get(key) or {"limits": {}, "levels": {}, "updated": now, "paused_until": 0.0, "waiting": {}}
+            elapsed = max(now - bucket["updated"], 0.0)
+            for dimension in DIMENSIONS:
+                limit = self._limit(bucket, dimension)
+                if limit is not None:
+                    level = bucket["levels"].get(dimension, limit)
+                    bucket["levels"][dimension] = min(limit, level + limit * elapsed / WINDOW)
+            bucket["updated"] = now
+            result = change(bucket, now)
+            state[key] = bucket
+            # Replaced whole, so an interruption never loses learned limits or a
+            # pause, but not flushed to disk: this runs on every request.
+            atomic_write(self.path, json.dumps(state).encode(), durable=False)
+        return result
+
+    def acquire(self, key, tokens, priority="interactive"):
+        """
+        Wait until the buckets of ``key`` allow a call, and take it from them.
+
+        :param key: The API key's buckets (see ``key``)
+        :param tokens: Estimated input tokens of the call
+        :param priority: "interactive" or "batch"
+        """
+        rank = PRIORITIES.index(priority)
+        cost = {"requests": 1, "tokens": tokens}
+        me = f"{os.getpid()}:{threading.get_ident()}"
+        start = None
+        while True:
+            wait = self._update(key, lambda bucket, now: self._take(bucket, now, me, rank, cost))
+            if wait <= 0:
+                break
+            start = start or time.monotonic()
+            time.sleep(min(wait, MAX_SLEEP))
+        if start is not None:
+            self.waits += 1
+            self.waited += time.monotonic() - start
+
+    def _take(self, bucket, now, me, rank, cost):
+        """Take ``cost`` from the bucket and return 0, or return the seconds to wait before trying again."""
+        waiting = {name: entry for name, entry in bucket["waiting"].items() if entry[1] > now and name != me}
+        bucket["waiting"] = waiting
+        wait = bucket["paused_until"] - now
+        if any(other < rank for other, _ in waiting.values()):
+            wait = max(wait, 0.05)
+        for dimension in DIMENSIONS:
+            limit = self._limit(bucket, dimension)
+            if limit is None:
+                continue
+            reserve = RESERVE * limit if rank else 0.0
+            # A call larger than the bucket goes once it is full.
+            missing = reserve + min(cost[dimension], limit - reserve) - bucket["levels"][dimension]
+            if missing > 0:
+                wait = max(wait, missing * WINDOW / limit)
+        if wait > 0:
+            waiting[me] = [rank, now + WAITER_TTL]
+            return wait
+        for dimension in DIMENSIONS:
+            if dimension in bucket["levels"]:
+                bucket["levels"][dimension] -= cost[dimension]
+        return 0
+
+    def spend(self, key, tokens):
+        """Take tokens used beyond the estimate, such as the output tokens, once a call completes."""
+        if tokens:
+            self._update(key, lambda bucket, now: self._spend(bucket, tokens))
+
+    @staticmethod
+    def _spend(bucket, tokens):
+        if "tokens" in bucket["levels"]:
+            bucket["levels"]["tokens"] -= tokens
+
+    def observe(self, key, response):
+        """Adapt the buckets of ``key`` to a response's rate-limit headers and status."""
+        headers = getattr(response, 'headers', None) or {}
+        seen = {}
+        for dimension, names in HEADERS.items():
+            for limit_name, remaining_name in names:
+                limit, remaining = _number(headers, limit_name), _number(headers, remaining_name)
+                if limit is not None or remaining is not None:
+                    seen[dimension] = (limit, remaining)
+                    break
+        limited = response.status_code == 429
+        if not (seen or limited):
+            return
+        pause = retry_after(response) if limited else None
+
+        def change(bucket, now):
+            for dimension, (limit, remaining) in seen.items():
+                if limit:
+                    bucket["limits"][dimension] = limit
+                if remaining is not None:
+                    # The server also counts other clients of the same key.
+                    bucket["levels"][dimension] = min(bucket["levels"].get(dimension, remaining), remaining)
+            if limited:
+                bucket["paused_until"] = max(bucket["paused_until"], now + (pause if pause is not None else 1.0))
+
+        self._update(key, change)
+
+    def snapshot(self, key):
+        """The current limits, levels and pause of ``key``'s buckets."""
+        return self._update(key, lambda bucket, now: {
+            "limits": {dimension: self._limit(bucket, dimension) for dimension in DIMENSIONS},
+            "levels": dict(bucket["levels"]),
+            "paused": max(bucket["paused_until"] - now, 0.0),
+        })
+
+
+def from_config(config, requests_per_minute=None, tokens_per_minute=None, enabled=False):
+    """
+    Build the rate limiter the config's "rate_limit" table describes, if any.
+
+    The table may set "requests_per_minute", "tokens_per_minute" and
+    "state" (the shared state file); an empty table enables a limiter that
+    learns the limits from the API's headers.
+
+    :param config: Config as returned by load_config
+    :param requests_per_minute: Overrides the config's requests per minute
+    :param tokens_per_minute: Overrides the config's tokens per minute
+    :param enabled: Build a limiter even if the config has no "rate_limit"
+    :return: A RateLimiter or None
+    """
+    options = config.get("rate_limit")
+    if options is None and not (enabled or requests_per_minute or tokens_per_minute):
+        return None
+    options = options or {}
+    return RateLimiter(options.get("state", DEFAULT_STATE),
+                       requests_per_minute or options.get("requests_per_minute"),
+                       tokens_per_minute or options.get("tokens_per_minute"))
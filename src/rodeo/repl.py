@@ -0,0 +1,328 @@
+import os
+import sys
+import time
+import threading
+from functools import partial
+from rodeo.chat import Chat
+from rodeo.cli import (apply_route, build_content, build_parser, format_timings, format_usage, make_cache,
+                       make_chat)
+from rodeo.context import message_text
+from rodeo.providers import load_config
+from rodeo.session_manager import resolve_session
+from rodeo.telemetry import percentile
+
+DEFAULT_HISTORY = "~/.rodeo/repl_history"
+
+HELP = """Commands:
+  /clear           Clear the session
+  /session [NAME]  Show the session, or switch to another session file (or sqlite:DB#NAME)
+  /stats           Show turns, tokens, latency, retries and cache hits so far
+  /history [N]     Show the last N messages of the conversation (default: 10)
+  /help            Show this help
+  /exit            Leave (as does Ctrl-D)
+Ctrl-C interrupts a reply; the interrupted turn is dropped from the session.
+With a terminal, the up and down arrows recall earlier prompts."""
+
+
+class BackgroundSaver:
+    """
+    Writes a session on a background thread, so prompts never wait on the disk.
+
+    ``schedule`` returns at once.  Saves scheduled while one is running are
+    folded into a single next save, as each save writes every turn not yet
+    in the file.
+
+    :param save: Writes the session; called on the saver's thread
+    """
+
+    def __init__(self, save):
+        self.save = save
+        # The exception of the last save, if it failed; the next save retries the same turns.
+        self.error = None
+        self._requested = 0
+        self._done = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="rodeo-saver", daemon=True)
+        self._thread.start()
+
+    def schedule(self):
+        with self._cond:
+            self._requested += 1
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Wait until the saves scheduled so far are done.
+
+        :return: False if ``timeout`` seconds passed first
+        """
+        with self._cond:
+            target = self._requested
+            return self._cond.wait_for(lambda: self._done >= target, timeout)
+
+    def close(self):
+        """Finish the scheduled saves and stop the thread."""
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._requested > self._done or self._closed)
+                if self._requested == self._done:
+                    return
+                target = self._requested
+            try:
+                self.save()
+                error = None
+            except Exception as e:
+                error = e
+            with self._cond:
+                self.error = error
+                self._done = target
+                self._cond.notify_all()
+
+
+class Repl:
+    """
+    A conversation held in one process, one prompt per line.
+
+    One Chat serves every turn, so the session is parsed once and the
+    connection to the API stays open between turns.  Replies are streamed,
+    and each turn is written to the session by a BackgroundSaver while the
+    next prompt is being typed.
+
+    :param args: Parsed command line arguments
+    :param config: Config as returned by load_config
+    :param chat: The Chat to converse with
+    :param out: Stream for replies
+    :param err: Stream for diagnostics
+    """
+
+    def __init__(self, args, config, chat, out, err):
+        self.args = args
+        self.config = config
+        self.out = out
+        self.err = err
+        # Held by each turn and each save, which both touch the history.
+        self.lock = threading.Lock()
+        self.saver = BackgroundSaver(self._save)
+        self.turns = 0
+        self.usage = {}
+        self.latencies = []
+        self.first_tokens = []
+        self.retries = 0
+        self.hedges = 0
+        self._use(chat)
+
+    def _use(self, chat):
+        chat.autosave = False
+        self.chat = chat
+        self.base = (chat.provider, chat.model)
+
+    def _save(self):
+        with self.lock:
+            self.chat.save()
+
+    def preconnect(self):
+        """Warm up the connection to the API on a background thread."""
+        transport = self.chat.transport
+        threading.Thread(target=transport.preconnect, args=(self.chat.api_url,), daemon=True).start()
+
+    def turn(self, prompt):
+        """Stream the reply to one prompt."""
+        chat = self.chat
+        if self.config.get("routes") and not (self.args.provider or self.args.model):
+            chat.use_provider(*self.base)
+            apply_route(chat, self.config, prompt)
+        start = time.perf_counter()
+        first_token = None
+        with self.lock:
+            retries, hedges = chat.retry.retries, chat.retry.hedges
+            replies = chat.stream_response(build_content(prompt, '', chat.prompt_cache))
+            try:
+                for text in replies:
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    self.out.write(text)
+                    self.out.flush()
+            finally:
+                # Rolls the turn back if it was interrupted.
+                replies.close()
+                self.retries += chat.retry.retries - retries
+                self.hedges += chat.retry.hedges - hedges
+        self.out.write("\n")
+        self.out.flush()
+        self.saver.schedule()
+        self.turns += 1
+        self.latencies.append(time.perf_counter() - start)
+        if first_token is not None:
+            self.first_tokens.append(first_token)
+        for key, value in (chat.last_usage or {}).items():
+            if isinstance(value, int):
+                self.usage[key] = self.usage.get(key, 0) + value
+
+    def command(self, line):
+        """
+        Run a slash command.
+
+        :return: False when the command ends the REPL
+        """
+        name, _, arg = line[1:].strip().partition(" ")
+        arg = arg.strip()
+        if name in ("exit", "quit"):
+            return False
+        if name == "clear":
+            self.saver.flush()
+            with self.lock:
+                self.chat.clear_session()
+            print("Session cleared.", file=self.out)
+        elif name == "session":
+            if arg:
+                self.switch(arg)
+            print(f"Session: {self.chat.session_file or '(in memory)'} ({len(self.chat.messages)} messages)", file=self.out)
+        elif name == "stats":
+            print(self.stats(), file=self.out)
+        elif name == "history":
+            count = int(arg) if arg.isdigit() else 10
+            for message in self.chat.messages[-count:] if count else []:
+                print(f"{message['role']}: {message_text(message)}", file=self.out)
+        elif name == "help":
+            print(HELP, file=self.out)
+        else:
+            print(f"Unknown command: /{name} (try /help)", file=self.err)
+        return True
+
+    def switch(self, session):
+        """Continue in another session, keeping the connection, cache and counters."""
+        self.saver.flush()
+        old = self.chat
+        chat = make_chat(self.args, self.config, resolve_session(session), old.cache,
+                         partial(Chat, transport=old.transport))
+        chat.retry, chat.telemetry, chat.rate_limit = old.retry, old.telemetry, old.rate_limit
+        with self.lock:
+            self._use(chat)
+
+    def stats(self):
+        lines = [f"turns: {self.turns}  messages: {len(self.chat.messages)}  model: {self.chat.model}"]
+        if self.usage:
+            lines.append(format_usage(self.usage))
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            line = f"latency: last={self.latencies[-1] * 1000:.0f}ms p50={percentile(latencies, 0.5) * 1000:.0f}ms"
+            if self.first_tokens:
+                line += f" first_token_p50={percentile(sorted(self.first_tokens), 0.5) * 1000:.0f}ms"
+            lines.append(line)
+        if self.chat.last_timings:
+            lines.append(format_timings(self.chat.last_timings))
+        lines.append(f"retries: {self.retries}  hedges: {self.hedges}")
+        if self.chat.cache is not None:
+            stats = self.chat.cache.stats()
+            lines.append(f"cache: {stats['hits']} hits, {stats['misses']} misses")
+        if self.chat.rate_limit is not None:
+            limiter = self.chat.rate_limit
+            lines.append(f"rate limit: waited {limiter.waits} times, {limiter.waited:.1f}s")
+        return "\n".join(lines)
+
+    def close(self):
+        self.saver.close()
+        if self.saver.error is not None:
+            print(f"Warning: could not save the session: {self.saver.error}", file=self.err)
+        if self.chat.cache is not None:
+            self.chat.cache.save_stats()
+
+
+def _load_history(path):
+    """Enable readline line editing and history, if available; return the module or None."""
+    try:
+        import readline
+    except ImportError:
+        return None
+    try:
+        readline.read_history_file(path)
+    except OSError:
+        pass
+    return readline
+
+
+def repl(args, stdin=None, out=None, err=None, chat_factory=None) -> int:
+    """
+    Converse interactively until /exit or end of input.
+
+    :param args: Parsed command line arguments
+    :param stdin: Stream to read prompts from (default: sys.stdin)
+    :param out: Stream for replies (default: sys.stdout)
+    :param err: Stream for diagnostics (default: sys.stderr)
+    :param chat_factory: Called like Chat to obtain the chat (default: Chat)
+    :return: The exit status
+    """
+    stdin = stdin or sys.stdin
+    out = out or sys.stdout
+    err = err or sys.stderr
+    config = load_config(args.config)
+    session = Repl(args, config, make_chat(args, config, args.session, make_cache(args), chat_factory), out, err)
+    # Parse the session and connect now rather than on the first prompt.
+    count = len(session.chat.messages)
+    if session.chat.api_url.startswith(("http://", "https://")):
+        session.preconnect()
+
+    interactive = stdin.isatty()
+    history = os.path.expanduser(os.getenv('RODEO_HISTORY') or DEFAULT_HISTORY)
+    readline = _load_history(history) if interactive and stdin is sys.stdin else None
+    if interactive:
+        print(f"rodeo {session.chat.model}, {count} messages in session. /help for commands.", file=err)
+    try:
+        while True:
+            if session.saver.error is not None:
+                print(f"Warning: could not save the session: {session.saver.error}", file=err)
+                session.saver.error = None
+            try:
+                if readline is not None:
+                    line = input("> ")
+                else:
+                    if interactive:
+                        out.write("> ")
+                        out.flush()
+                    line = stdin.readline()
+                    if not line:
+                        raise EOFError
+            except EOFError:
+                if interactive:
+                    out.write("\n")
+                break
+            except KeyboardInterrupt:
+                out.write("\n")
+                continue
+
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("/"):
+                if not session.command(line):
+                    break
+                continue
+            try:
+                session.turn(line)
+            except KeyboardInterrupt:
+                print("\nInterrupted.", file=err)
+            except Exception as e:
+                print(f"\nError: {e}", file=err)
+    finally:
+        session.close()
+        if readline is not None:
+            try:
+                os.makedirs(os.path.dirname(history), exist_ok=True)
+                readline.write_history_file(history)
+            except OSError:
+                pass
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    parser.prog = "rodeo repl"
+    return repl(parser.parse_args(argv))
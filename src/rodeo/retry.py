@@ -0,0 +1,183 @@
+import time
+import queue
+import random
+import threading
+from collections import deque
+
+# 408: request timeout, 429: rate limited, 5xx: server errors, 529: API
+# overloaded.  Other 4xx responses would fail the same way again.
+RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504, 529)
+
+
+def retry_after(response):
+    """Return the server's requested delay in seconds, if it sent one."""
+    if response is None:
+        return None
+    value = response.headers.get('retry-after')
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None, base=1.0, cap=60.0):
+    """
+    Seconds to wait before retry number ``attempt`` (starting at 0).
+
+    Honors the server's retry-after when given, otherwise uses exponential
+    backoff with full jitter.
+    """
+    if retry_after is not None:
+        return min(retry_after, cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_retryable(error):
+    """
+    Whether a failed request is worth repeating.
+
+    HTTP errors are retried for RETRYABLE_STATUS only.  Any other OSError
+    (which includes the connection errors and timeouts raised by requests)
+    is retried, as the request may not have reached the server at all.
+    """
+    response = getattr(error, 'response', None)
+    if response is not None:
+        return response.status_code in RETRYABLE_STATUS
+    return isinstance(error, OSError)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call's overall deadline passes before it succeeds."""
+
+
+class LatencyTracker:
+    """
+    Recent request latencies, for deriving a hedging threshold.
+
+    :param size: Number of most recent latencies kept
+    :param min_samples: Latencies needed before a percentile is reported
+    """
+
+    def __init__(self, size=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RetryPolicy:
+    """
+    Retries, deadlines and hedging for one logical API call.
+
+    Failed attempts that ``is_retryable`` accepts are repeated after
+    ``backoff_delay``.  With a ``deadline`` every attempt's read timeout is
+    capped by the time left and no retry is started that could not finish
+    in time.  With ``hedge_after``, an attempt that has not answered after
+    that many seconds (or, given "p95", after the 95th percentile of recent
+    latencies) is raced against a duplicate request and the first reply
+    wins; this trades some extra requests for a shorter latency tail.
+
+    :param max_retries: Retries after the first attempt
+    :param base: Backoff base delay in seconds
+    :param cap: Maximum backoff delay in seconds
+    :param deadline: Seconds the whole call may take, retries included
+    :param hedge_after: Seconds, or "p95", before sending a hedged duplicate
+    """
+
+    def __init__(self, max_retries=2, base=1.0, cap=60.0, deadline=None, hedge_after=None):
+        self.max_retries = max_retries
+        self.base = base
+        self.cap = cap
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self.latencies = LatencyTracker()
+        self.retries = 0
+        self.hedges = 0
+
+    def hedge_threshold(self):
+        if self.hedge_after == "p95":
+            return self.latencies.percentile(0.95)
+        return self.hedge_after
+
+    def call(self, send, hedge=True):
+        """
+        Call ``send(timeout)`` until it succeeds or retrying is pointless.
+
+        :param send: Makes one attempt; ``timeout`` is the seconds left
+            before the deadline, or None without one
+        :param hedge: Whether duplicate attempts may be raced (for requests
+            whose responses are read in full)
+        :return: What the successful attempt returned
+        """
+        start = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            remaining = None
+            if self.deadline is not None:
+                remaining = self.deadline - (time.monotonic() - start)
+                if remaining <= 0:
+                    raise DeadlineExceeded(f"No response within {self.deadline:g}s")
+            try:
+                return self._attempt(send, remaining, hedge)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, retry_after(getattr(e, 'response', None)), self.base, self.cap)
+                if remaining is not None and delay >= self.deadline - (time.monotonic() - start):
+                    raise
+                self.retries += 1
+                time.sleep(delay)
+
+    def _attempt(self, send, remaining, hedge):
+        threshold = self.hedge_threshold() if hedge else None
+        if threshold is None or (remaining is not None and threshold >= remaining):
+            return self._timed(send, remaining)
+
+        # Hedged attempts run on daemon threads, so a loser that is still
+        # stalled never keeps the process from exiting.
+        outcomes = queue.Queue()
+        self._start(send, remaining, outcomes)
+        try:
+            outcome = outcomes.get(timeout=threshold)
+        except queue.Empty:
+            self.hedges += 1
+            self._start(send, None if remaining is None else remaining - threshold, outcomes)
+            outcome = outcomes.get()
+            if isinstance(outcome, Exception):
+                # The first to finish failed; the other may still succeed.
+                outcome = outcomes.get()
+            else:
+                threading.Thread(target=_discard, args=(outcomes,), daemon=True).start()
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def _start(self, send, remaining, outcomes):
+        def run():
+            try:
+                outcomes.put(self._timed(send, remaining))
+            except Exception as e:
+                outcomes.put(e)
+        threading.Thread(target=run, daemon=True, name="rodeo-hedge").start()
+
+    def _timed(self, send, remaining):
+        start = time.monotonic()
+        result = send(remaining)
+        self.latencies.observe(time.monotonic() - start)
+        return result
+
+
+def _discard(outcomes):
+    """Release the response of the hedged attempt that lost the race."""
+    close = getattr(outcomes.get(), 'close', None)
+    if close:
+        close()
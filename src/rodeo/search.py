@@ -0,0 +1,253 @@
+import os
+import re
+import math
+import zlib
+import heapq
+import struct
+import marshal
+from array import array
+from collections import Counter
+from rodeo.context import message_text
+from rodeo.locking import FileLock, atomic_write
+from rodeo.messages import dumps, encode_message, loads_lines
+from rodeo.session_manager import parse_sqlite_session
+
+_WORD = re.compile(r"\w+")
+
+# Words too common to tell turns apart.  Terms in half the history or more
+# are skipped at query time as well, as their BM25 weight is not positive.
+STOPWORDS = frozenset("""
+a an and are as at be but by do does did for from had has have how i if in is it its me my of on or so that the
+their them then there these they this to was we were what when where which who why will with you your
+""".split())
+
+# The index file is a snapshot followed by JSON lines.  The header holds a
+# magic, a version and the snapshot's length; the snapshot is a marshalled
+# dict whose postings stay packed until a query needs them; each line adds
+# one message as [checksum, {term: count}].  Once SNAPSHOT_EVERY lines have
+# accumulated, they are folded into a new snapshot.
+INDEX_MAGIC = b"RSX1"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<4sIQ")
+SNAPSHOT_EVERY = 1024
+
+# Query terms are scored rarest first, as rare terms weigh the most, until
+# this many postings have been read; this bounds the cost of long prompts.
+MAX_POSTINGS = 20000
+_ITEM_SIZE = array('I').itemsize
+
+
+def tokenize(text):
+    """Lower-cased words of ``text``, without stopwords."""
+    return [word for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+def search_path(session):
+    """Where the search index of a session spec is kept: next to its file or database."""
+    parsed = parse_sqlite_session(session)
+    if parsed:
+        db_path, name = parsed
+        return f"{db_path}.{name}.search"
+    return os.path.expanduser(session) + ".search"
+
+
+def _checksum(message):
+    return zlib.crc32(encode_message(message))
+
+
+class SearchIndex:
+    """
+    A BM25 index over the messages of a session.
+
+    Each message is one document, numbered by its position in the history.
+    ``sync`` indexes the messages added since the last call, so keeping
+    the index current costs one tokenization per new message.  With a
+    ``path``, new messages are appended to that file and the index is read
+    back from it instead of re-tokenizing the history.  The checksum of the
+    last indexed message is kept with it; if the history no longer matches,
+    as after --clear, the index is rebuilt.
+
+    :param path: Index file (default: kept in memory only)
+    :param k1: BM25 term frequency saturation
+    :param b: BM25 document length normalization
+    """
+
+    def __init__(self, path=None, k1=1.2, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.lock = FileLock(path) if path else None
+        self._reset()
+        self._size = None
+
+    def _reset(self):
+        self.lengths = array('I')
+        self.total_length = 0
+        self.checksum = None
+        # term -> positions interleaved with term counts, in position order;
+        # bytes until the term is first queried or added to.
+        self.postings = {}
+        self._tail = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def _posting(self, term):
+        entry = self.postings.get(term)
+        if isinstance(entry, bytes):
+            unpacked = array('I')
+            unpacked.frombytes(entry)
+            self.postings[term] = entry = unpacked
+        return entry
+
+    def _add(self, terms, checksum):
+        position = len(self.lengths)
+        for term, count in terms.items():
+            entry = self._posting(term)
+            if entry is None:
+                self.postings[term] = array('I', (position, count))
+            else:
+                entry.extend((position, count))
+        length = sum(terms.values())
+        self.lengths.append(length)
+        self.total_length += length
+        self.checksum = checksum
+
+    def _load(self):
+        self._reset()
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        self._size = len(data)
+        if len(data) < INDEX_HEADER.size:
+            return
+        magic, version, snapshot_size = INDEX_HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            return
+        start = INDEX_HEADER.size
+        try:
+            snapshot = marshal.loads(data[start:start + snapshot_size])
+            self.lengths.frombytes(snapshot["lengths"])
+            self.total_length = snapshot["total_length"]
+            self.checksum = snapshot["checksum"]
+            self.postings = snapshot["postings"]
+        except (ValueError, EOFError, TypeError, KeyError):
+            # A damaged snapshot: the history is indexed again, into a new one.
+            self._reset()
+            self._tail = SNAPSHOT_EVERY
+            return
+        lines = data[start + snapshot_size:].splitlines()
+        torn = bool(lines) and not data.endswith(b"\n")
+        if torn:
+            lines.pop()
+        try:
+            records = loads_lines(lines) if lines else []
+        except ValueError:
+            records, torn = [], True
+        for checksum, terms in records:
+            self._add(terms, checksum)
+        # Messages of unreadable lines are indexed again, into a new snapshot
+        # rather than after the damage.
+        self._tail = SNAPSHOT_EVERY if torn else len(records)
+
+    def _write_snapshot(self):
+        postings = {term: entry if isinstance(entry, bytes) else entry.tobytes() for term, entry in self.postings.items()}
+        snapshot = marshal.dumps({"lengths": self.lengths.tobytes(), "total_length": self.total_length,
+                                  "checksum": self.checksum, "postings": postings})
+        data = INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(snapshot)) + snapshot
+        atomic_write(self.path, data)
+        self._size = len(data)
+        self._tail = 0
+
+    def sync(self, messages):
+        """
+        Bring the index up to date with ``messages``.
+
+        :param messages: The history to index, oldest first
+        """
+        if self.lock is None:
+            self._sync(messages)
+            return
+        with self.lock:
+            try:
+                size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                size = 0
+            if size != self._size:
+                # First use, or another process has written to the index.
+                self._load()
+            self._sync(messages)
+
+    def _sync(self, messages):
+        count = len(self.lengths)
+        rebuild = count > len(messages) or (count and self.checksum != _checksum(messages[count - 1]))
+        if rebuild:
+            self._reset()
+            count = 0
+        new = messages[count:]
+        if not (new or rebuild):
+            return
+        # Large catch-ups go straight into a snapshot rather than as lines.
+        as_lines = self.path and count and len(new) < SNAPSHOT_EVERY
+        lines = []
+        for i, message in enumerate(new):
+            # Only the last message's checksum is checked, so lines are the only
+            # other place one is needed.
+            checksum = _checksum(message) if as_lines or i == len(new) - 1 else None
+            terms = Counter(tokenize(message_text(message)))
+            self._add(terms, checksum)
+            if as_lines:
+                lines.append(dumps([checksum, terms]) + b"\n")
+        if not self.path:
+            return
+        self._tail += len(new)
+        if not as_lines or self._tail >= SNAPSHOT_EVERY:
+            self._write_snapshot()
+        else:
+            with open(self.path, 'ab') as f:
+                f.write(b"".join(lines))
+            self._size += sum(map(len, lines))
+
+    def search(self, query, limit=10, before=None):
+        """
+        Rank indexed messages by BM25 relevance to ``query``.
+
+        :param query: Text to look for
+        :param limit: Maximum number of results
+        :param before: Only consider messages at positions below this one
+        :return: A list of (position, score), best first
+        """
+        count = len(self.lengths)
+        if not count:
+            return []
+        if before is None:
+            before = count
+        average = self.total_length / count or 1.0
+        lengths = self.lengths
+        # BM25's length normalization k1 * (1 - b + b * length / average), split once.
+        base, scale = self.k1 * (1 - self.b), self.k1 * self.b / average
+        terms = []
+        for term in set(tokenize(query)):
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            df = len(entry) // (2 * _ITEM_SIZE) if isinstance(entry, bytes) else len(entry) // 2
+            idf = math.log((count - df + 0.5) / (df + 0.5))
+            if idf > 0:
+                terms.append((df, idf, term))
+        terms.sort()
+        scores = {}
+        read = 0
+        for df, idf, term in terms:
+            if read and read + df > MAX_POSTINGS:
+                break
+            read += df
+            weight = idf * (self.k1 + 1)
+            values = iter(self._posting(term))
+            for position, tf in zip(values, values):
+                if position >= before:
+                    break
+                scores[position] = scores.get(position, 0.0) + weight * tf / (tf + base + scale * lengths[position])
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,229 @@
+import os
+import mmap
+import zlib
+import struct
+import bisect
+from collections.abc import MutableSequence
+from rodeo.messages import Message, encode_message, loads_lines
+
+# A cold file is a header (magic, version, random id) followed by segments,
+# each a header (message count, compressed size) and the zlib-compressed JSON
+# lines of its messages.  Segments are only ever appended; the session file
+# records how many bytes of them are committed, so a segment written by a
+# tiering step that did not complete is ignored and later overwritten.
+COLD_MAGIC = b"RCS1"
+COLD_VERSION = 1
+COLD_HEADER = struct.Struct("<4sI8s")
+SEGMENT_HEADER = struct.Struct("<II")
+COMPRESS_LEVEL = 6
+
+
+def write_segments(path, groups, end=0):
+    """
+    Compress groups of messages into segments at the end of a cold file.
+
+    :param path: The cold file
+    :param groups: Lists of messages, one segment each
+    :param end: Committed size of the file; anything after it is overwritten,
+        and 0 starts a new file with a new id
+    :return: The new committed size
+    """
+    with open(path, 'r+b' if end else 'wb') as f:
+        f.truncate(end)
+        f.seek(end)
+        if not end:
+            f.write(COLD_HEADER.pack(COLD_MAGIC, COLD_VERSION, os.urandom(8)))
+        for messages in groups:
+            data = zlib.compress(b"".join(encode_message(m) + b"\n" for m in messages), COMPRESS_LEVEL)
+            f.write(SEGMENT_HEADER.pack(len(messages), len(data)) + data)
+        f.flush()
+        # On disk before the session file refers to it.
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def cold_file_id(path):
+    """The id of a cold file, or None if there is none."""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(COLD_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) < COLD_HEADER.size:
+        return None
+    magic, version, file_id = COLD_HEADER.unpack(header)
+    return file_id if magic == COLD_MAGIC and version == COLD_VERSION else None
+
+
+class ColdSegments:
+    """
+    The committed segments of a cold file, memory-mapped and decompressed on demand.
+
+    Opening only reads the segment headers; each segment is decompressed
+    the first time one of its messages is needed, and kept.  The mapping
+    stays valid if the file is later replaced.
+
+    :param path: The cold file
+    :param count: Number of committed messages
+    :param end: Committed size of the file
+    :raises ValueError: If the file does not hold the committed segments
+    """
+
+    def __init__(self, path, count, end):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < end:
+                raise ValueError(f"{path} is shorter than its committed segments")
+            self._map = mmap.mmap(f.fileno(), end, access=mmap.ACCESS_READ)
+        magic, version, self.id = COLD_HEADER.unpack_from(self._map)
+        if magic != COLD_MAGIC or version != COLD_VERSION:
+            raise ValueError(f"{path} is not a cold segment file")
+        self.count = count
+        self.end = end
+        self.starts = []
+        self._spans = []
+        self._segments = {}
+        position, offset = 0, COLD_HEADER.size
+        while offset < end:
+            size, length = SEGMENT_HEADER.unpack_from(self._map, offset)
+            offset += SEGMENT_HEADER.size
+            self.starts.append(position)
+            self._spans.append((offset, length))
+            position += size
+            offset += length
+        if position != count:
+            raise ValueError(f"{path} holds {position} messages, not {count}")
+
+    def segment(self, i):
+        """The messages of segment ``i``."""
+        messages = self._segments.get(i)
+        if messages is None:
+            offset, length = self._spans[i]
+            lines = zlib.decompress(self._map[offset:offset + length]).splitlines()
+            messages = [Message.from_json(line, record) for line, record in zip(lines, loads_lines(lines))]
+            self._segments[i] = messages
+        return messages
+
+    def read(self, start, stop):
+        """The messages at positions ``start`` to ``stop``, decompressing only the segments holding them."""
+        messages = []
+        i = bisect.bisect_right(self.starts, start) - 1
+        while start < stop:
+            segment = self.segment(i)
+            first = self.starts[i]
+            messages += segment[start - first:stop - first]
+            start = first + len(segment)
+            i += 1
+        return messages
+
+    def __iter__(self):
+        for i in range(len(self.starts)):
+            yield from self.segment(i)
+
+
+class History(MutableSequence):
+    """
+    A session's messages: cold segments read on demand, then the hot turns as a list.
+
+    It behaves as a list of the whole history, so Chat and SessionManager
+    use it as they would the list.  Reading a cold message decompresses its
+    segment only; appending and removing the newest turns only touch
+    ``hot``.  A change to a cold message first reads every cold segment
+    into ``hot``.
+
+    :param cold: The ColdSegments holding the oldest messages, or None
+    :param hot: The newer messages
+    """
+
+    def __init__(self, cold, hot):
+        self.cold = cold
+        self.hot = hot
+
+    @property
+    def cold_count(self):
+        return self.cold.count if self.cold is not None else 0
+
+    def __len__(self):
+        return self.cold_count + len(self.hot)
+
+    def __getitem__(self, index):
+        cold = self.cold_count
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return list(self)[index]
+            if start >= cold:
+                return self.hot[start - cold:max(stop, start) - cold]
+            if start == 0 and stop >= cold:
+                # A prefix shares the cold segments instead of reading them.
+                return History(self.cold, self.hot[:stop - cold])
+            return self.cold.read(start, min(stop, cold)) + self.hot[:max(stop - cold, 0)]
+        if index < 0:
+            index += len(self)
+        if index >= cold:
+            return self.hot[index - cold]
+        if index < 0:
+            raise IndexError("history index out of range")
+        return self.cold.read(index, index + 1)[0]
+
+    def __iter__(self):
+        if self.cold is not None:
+            yield from self.cold
+        yield from self.hot
+
+    def _hot_index(self, index):
+        """Translate an index into one of ``hot``, first thawing the cold messages if it refers to one."""
+        cold = self.cold_count
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if start >= cold and step == 1:
+                return slice(start - cold, max(stop, start) - cold)
+            if start >= cold and stop >= cold:
+                return slice(start - cold, stop - cold, step)
+        else:
+            if index < 0:
+                index += len(self)
+            if index >= cold:
+                return index - cold
+            if index < 0:
+                raise IndexError("history index out of range")
+        self.thaw()
+        return index
+
+    def __setitem__(self, index, value):
+        index = self._hot_index(index)
+        self.hot[index] = value
+
+    def __delitem__(self, index):
+        index = self._hot_index(index)
+        del self.hot[index]
+
+    def insert(self, index, value):
+        if index < 0:
+            index = max(index + len(self), 0)
+        if index >= self.cold_count:
+            self.hot.insert(index - self.cold_count, value)
+        else:
+            self.thaw()
+            self.hot.insert(index, value)
+
+    def append(self, value):
+        self.hot.append(value)
+
+    def extend(self, values):
+        self.hot.extend(values)
+
+    def thaw(self):
+        """Read the cold messages into ``hot``."""
+        if self.cold is not None:
+            self.hot = list(self)
+            self.cold = None
+
+    def __eq__(self, other):
+        if isinstance(other, (list, History)):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"History({self.cold_count} cold, {len(self.hot)} hot)"
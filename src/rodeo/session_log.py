@@ -0,0 +1,400 @@
+import os
+import json
+import struct
+from rodeo.locking import FileLock, atomic_write
+from rodeo.messages import Message, encode_message, loads, loads_lines
+from rodeo.segments import ColdSegments, History, cold_file_id, write_segments
+
+HEADER = {"rodeo_session": 1}
+HEADER_LINE = json.dumps(HEADER).encode() + b"\n"
+HEADER_PREFIX = b'{"rodeo_session"'
+META_PREFIX = b'{"meta"'
+
+# The index lives next to the log as ``<session>.idx``: a fixed header
+# (magic, version, offset of the latest meta record, number of log bytes
+# covered) followed by one little-endian uint64 offset per message line.
+INDEX_MAGIC = b"RDX1"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<4sIQQ")
+OFFSET = struct.Struct("<Q")
+
+
+def _header_line(cold=0, cold_bytes=0):
+    if not cold:
+        return HEADER_LINE
+    return json.dumps(dict(HEADER, cold=cold, cold_bytes=cold_bytes)).encode() + b"\n"
+
+
+def _valid_lines(lines):
+    """Return whether each of ``lines`` holds valid JSON."""
+    try:
+        loads_lines(lines)
+        return [True] * len(lines)
+    except ValueError:
+        pass
+    valid = []
+    for line in lines:
+        try:
+            loads(line)
+            valid.append(True)
+        except ValueError:
+            valid.append(False)
+    return valid
+
+
+def _valid_meta(line):
+    """Return whether ``line`` holds a readable meta record."""
+    try:
+        return isinstance(loads(line)["meta"], dict)
+    except (ValueError, KeyError, TypeError):
+        return False
+
+
+def _cold_fields(line):
+    """Return the (messages, bytes) committed to the cold file, as recorded in a header line."""
+    if not line.startswith(HEADER_PREFIX):
+        return 0, 0
+    try:
+        header = json.loads(line)
+    except ValueError:
+        return 0, 0
+    return header.get("cold", 0), header.get("cold_bytes", 0)
+
+
+class SessionLog:
+    """
+    Append-only JSON-Lines session file.
+
+    The first line is a small header, every following line is either a
+    message (``{"role": ..., "content": ...}``) or a meta record
+    (``{"meta": {...}}``, latest wins).  Appending a turn writes only the
+    new lines; the offset index makes ``tail`` and ``__len__`` independent
+    of the history length.
+
+    Once the log holds ``hot_messages + segment_messages`` messages, the
+    oldest are moved, ``segment_messages`` at a time, into compressed
+    segments in ``<session>.cold``, and the header line records how many.
+    ``load`` then only parses the recent messages; the cold ones are
+    decompressed, a segment at a time, when something reads them.
+
+    Every operation holds an advisory lock on ``<session>.lock``, so
+    concurrent processes never interleave partial writes; callers can hold
+    ``lock`` themselves to make several operations atomic.
+    """
+
+    hot_messages = 256
+    segment_messages = 1024
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self.index_path = self.path + ".idx"
+        self.cold_path = self.path + ".cold"
+        self.lock = FileLock(self.path)
+        self._migrated = False
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def stamp(self):
+        """Return a value that changes whenever the log file is written or replaced."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def __len__(self):
+        with self.lock:
+            _, count = self._sync_index()
+            return count + self._cold_state()[0]
+
+    def load(self):
+        """
+        Return every message in the log.
+
+        :return: A list, or a History whose cold messages are read when used
+        """
+        messages = []
+        with self.lock:
+            self._migrate()
+            if not os.path.exists(self.path):
+                return messages
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            cold, cold_bytes = _cold_fields(data[:data.find(b"\n") + 1])
+            segments = self._open_cold(cold, cold_bytes) if cold else None
+        for record in self._parse_lines(data):
+            if isinstance(record, Message) or "meta" not in record:
+                messages.append(record)
+        return History(segments, messages) if segments is not None else messages
+
+    def _open_cold(self, cold, cold_bytes):
+        try:
+            return ColdSegments(self.cold_path, cold, cold_bytes)
+        except (OSError, ValueError):
+            print(f"Warning: {self.cold_path} is missing or damaged; the {cold} oldest messages are unavailable.")
+            return None
+
+    def _cold_state(self):
+        """Return the (messages, bytes) committed to the cold file."""
+        try:
+            with open(self.path, 'rb') as f:
+                return _cold_fields(f.readline())
+        except FileNotFoundError:
+            return 0, 0
+
+    def tail(self, n):
+        """Return the last ``n`` messages without reading the rest of the log."""
+        if n <= 0:
+            return []
+        with self.lock:
+            meta_offset, count = self._sync_index()
+            if n > count and self._cold_state()[0]:
+                return self.load()[-n:]
+            if count == 0:
+                return []
+            start = self._read_offsets(max(count - n, 0), 1)[0]
+            with open(self.path, 'rb') as f:
+                f.seek(start)
+                data = f.read()
+        return [r for r in self._parse_lines(data) if "meta" not in r][-n:]
+
+    def meta(self):
+        """Return the latest meta record, or an empty dict."""
+        with self.lock:
+            meta_offset, _ = self._sync_index()
+            if not meta_offset:
+                return {}
+            with open(self.path, 'rb') as f:
+                f.seek(meta_offset)
+                line = f.readline()
+        try:
+            return json.loads(line)["meta"]
+        except (ValueError, KeyError):
+            return {}
+
+    def append(self, messages, meta=None):
+        """Append messages (and optionally a new meta record) to the log."""
+        lines = [self._encode(m) for m in messages]
+        if meta is not None:
+            lines.append(self._encode({"meta": meta}))
+        if not lines:
+            return
+        with self.lock:
+            self._sync_index()
+            with open(self.path, 'ab') as f:
+                if f.tell() == 0:
+                    lines.insert(0, HEADER_LINE)
+                elif not self._ends_with_newline():
+                    # A previous writer died mid-line; terminate the torn
+                    # record so it is skipped instead of corrupting this one.
+                    lines.insert(0, b"\n")
+                # One write per call keeps each turn contiguous in the log.
+                f.write(b"".join(lines))
+            _, count = self._sync_index()
+            if count >= self.hot_messages + self.segment_messages:
+                self._tier()
+
+    def update_meta(self, **values):
+        with self.lock:
+            meta = self.meta()
+            meta.update(values)
+            self.append([], meta=meta)
+
+    def rewrite(self, messages, meta=None):
+        """
+        Atomically replace the log with ``messages`` and ``meta``.
+
+        The cold segments are kept when ``messages`` is a History loaded from
+        them, so only its hot messages are written.
+        """
+        with self.lock:
+            segments = messages.cold if isinstance(messages, History) else None
+            if segments is not None and segments.id == cold_file_id(self.cold_path):
+                # Segments are only appended, so those it read are unchanged.
+                self._write_hot(messages.hot, meta, segments.count, segments.end)
+                count = len(messages.hot)
+            else:
+                self._write_hot(messages, meta)
+                count = len(messages)
+                try:
+                    os.remove(self.cold_path)
+                except FileNotFoundError:
+                    pass
+            if count >= self.hot_messages + self.segment_messages:
+                self._tier()
+
+    def _write_hot(self, messages, meta=None, cold=0, cold_bytes=0):
+        lines = [_header_line(cold, cold_bytes)]
+        lines.extend(self._encode(m) for m in messages)
+        if meta:
+            lines.append(self._encode({"meta": meta}))
+        with self.lock:
+            atomic_write(self.path, b"".join(lines))
+            self._migrated = True
+            self._remove_index()
+            self._sync_index()
+
+    def _tier(self):
+        """
+        Move the oldest messages of the log into the cold file, keeping at least ``hot_messages``.
+
+        The segments are written and flushed first, then the log is replaced
+        with one whose header counts them, so an interrupted move leaves the
+        log as it was.
+        """
+        with self.lock:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            cold, cold_bytes = _cold_fields(data[:data.find(b"\n") + 1])
+            messages = [r for r in self._parse_lines(data) if isinstance(r, Message) or "meta" not in r]
+            size = self.segment_messages
+            moving = (len(messages) - self.hot_messages) // size * size
+            if moving <= 0:
+                return
+            groups = [messages[i:i + size] for i in range(0, moving, size)]
+            cold_bytes = write_segments(self.cold_path, groups, cold_bytes if cold else 0)
+            self._write_hot(messages[moving:], self.meta(), cold + moving, cold_bytes)
+
+    def compact(self):
+        """Rewrite the log without torn lines or superseded meta records."""
+        with self.lock:
+            messages = self.load()
+            self.rewrite(messages, self.meta())
+        return len(messages)
+
+    def _migrate(self):
+        """
+        Convert a legacy single-JSON-document session file in place.
+
+        Must be called with the lock held.  An unreadable legacy file is
+        kept as ``<session>.corrupt`` rather than discarded.
+        """
+        if self._migrated:
+            return
+        self._migrated = True
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            head = f.read(1)
+            if head != b"[" and head != b"{":
+                return
+            if head == b"{" and (head + f.readline()).startswith(HEADER_PREFIX):
+                return
+            f.seek(0)
+            try:
+                legacy = json.load(f)
+            except ValueError:
+                legacy = None
+        if isinstance(legacy, dict) and isinstance(legacy.get("history"), list):
+            # Written by the old SessionManager.
+            legacy = legacy["history"]
+        if not isinstance(legacy, list):
+            os.replace(self.path, self.path + ".corrupt")
+            print(f"Warning: Session file is not in the expected format; moved it to {self.path}.corrupt. Starting with an empty session.")
+            legacy = []
+        self.rewrite(legacy)
+
+    def _parse_lines(self, data):
+        lines = [line for line in data.splitlines() if line.strip()]
+        try:
+            decoded = loads_lines(lines)
+        except ValueError:
+            # Decode line by line to find and skip the corrupt ones.
+            decoded = [None] * len(lines)
+        records = []
+        for line, record in zip(lines, decoded):
+            try:
+                # Messages keep their line as their JSON encoding.
+                record = Message.from_json(line, record)
+            except ValueError:
+                print("Warning: Skipping corrupt line in session file.")
+                continue
+            if isinstance(record, dict) and "rodeo_session" in record:
+                continue
+            records.append(record)
+        return records
+
+    def _encode(self, record):
+        return encode_message(record) + b"\n"
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _remove_index(self):
+        try:
+            os.remove(self.index_path)
+        except FileNotFoundError:
+            pass
+
+    def _read_index_header(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                raw = f.read(INDEX_HEADER.size)
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+        except FileNotFoundError:
+            return None
+        if len(raw) != INDEX_HEADER.size:
+            return None
+        magic, version, meta_offset, covered = INDEX_HEADER.unpack(raw)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            return None
+        if (size - INDEX_HEADER.size) % OFFSET.size:
+            return None
+        return meta_offset, covered, (size - INDEX_HEADER.size) // OFFSET.size
+
+    def _read_offsets(self, start, count):
+        with open(self.index_path, 'rb') as f:
+            f.seek(INDEX_HEADER.size + start * OFFSET.size)
+            raw = f.read(count * OFFSET.size)
+        return [OFFSET.unpack_from(raw, i * OFFSET.size)[0] for i in range(len(raw) // OFFSET.size)]
+
+    def _sync_index(self):
+        """
+        Bring the index up to date with the log and return (meta_offset, count).
+
+        Only the bytes appended since the index was last written are scanned,
+        so this is cheap even for very long sessions.
+        """
+        self._migrate()
+        if not os.path.exists(self.path):
+            self._remove_index()
+            return 0, 0
+        log_size = os.path.getsize(self.path)
+        header = self._read_index_header()
+        if header is None or header[1] > log_size:
+            self._remove_index()
+            header = (0, 0, 0)
+        meta_offset, covered, count = header
+        if covered == log_size and os.path.exists(self.index_path):
+            return meta_offset, count
+
+        with open(self.path, 'rb') as f:
+            f.seek(covered)
+            data = f.read()
+        offsets, lines = [], []
+        position = covered
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            stripped = line.strip()
+            if stripped.startswith(META_PREFIX):
+                # A corrupt meta line must not hide the last good one.
+                if _valid_meta(stripped):
+                    meta_offset = position
+            elif stripped and not line.startswith(HEADER_PREFIX):
+                offsets.append(position)
+                lines.append(stripped)
+            position += len(line)
+        # Torn lines are skipped by load(), so they are not counted either.
+        offsets = [offset for offset, line in zip(offsets, _valid_lines(lines)) if line]
+
+        mode = 'r+b' if os.path.exists(self.index_path) else 'wb'
+        with open(self.index_path, mode) as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, meta_offset, position))
+            f.seek(0, os.SEEK_END)
+            f.write(b"".join(OFFSET.pack(o) for o in offsets))
+        return meta_offset, count + len(offsets)
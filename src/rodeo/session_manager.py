@@ -1,28 +1,65 @@
 import os
-import json
+from rodeo.session_log import SessionLog
+
+# Sessions named "sqlite:DB_PATH#NAME" live in a shared SQLite database;
+# anything else is the path of a JSON-Lines session file.
+SQLITE_PREFIX = "sqlite:"
+DEFAULT_DB = "~/.rodeo.db"
+
+
+def parse_sqlite_session(session):
+    """Split "sqlite:DB_PATH#NAME" into (DB_PATH, NAME); return None for a file path."""
+    if not session.startswith(SQLITE_PREFIX):
+        return None
+    db_path, _, name = session[len(SQLITE_PREFIX):].partition("#")
+    return os.path.expanduser(db_path or DEFAULT_DB), name or "default"
+
+
+def resolve_session(session, cwd=None):
+    """Make a session spec independent of the current directory."""
+    parsed = parse_sqlite_session(session)
+    if parsed:
+        db_path, name = parsed
+        return f"{SQLITE_PREFIX}{os.path.join(cwd or os.getcwd(), db_path)}#{name}"
+    return os.path.join(cwd or os.getcwd(), os.path.expanduser(session))
+
+
+def open_store(session):
+    """
+    Return the storage backend for a session spec.
+
+    Both backends offer the same interface: load, tail, len, meta,
+    append, update_meta, rewrite, compact, stamp and a ``lock`` context
+    manager.
+    """
+    parsed = parse_sqlite_session(session)
+    if parsed:
+        from rodeo.sqlite_store import SqliteStore
+        return SqliteStore(*parsed)
+    return SessionLog(os.path.expanduser(session))
+
 
 class SessionManager:
     def __init__(self, session_file):
-        self.session_file = os.path.expanduser(session_file)
+        self.session_file = session_file if parse_sqlite_session(session_file) else os.path.expanduser(session_file)
+        self.store = open_store(self.session_file)
         self.session_data = self.load_session()
 
     def load_session(self):
-        if os.path.exists(self.session_file):
-            with open(self.session_file, 'r') as f:
-                return json.load(f)
-        return {"history": []}
+        return {"history": self.store.load()}
 
     def save_session(self):
-        with open(self.session_file, 'w') as f:
-            json.dump(self.session_data, f)
+        with self.store.lock:
+            self.store.rewrite(self.session_data["history"], self.store.meta())
 
     def add_message(self, role, content):
-        self.session_data["history"].append({"role": role, "content": content})
-        self.save_session()
+        message = {"role": role, "content": content}
+        self.session_data["history"].append(message)
+        self.store.append([message])
 
     def get_history(self):
         return self.session_data["history"]
 
     def clear_history(self):
         self.session_data["history"] = []
-        self.save_session()
+        self.store.rewrite([])
@@ -0,0 +1,104 @@
+import sys
+import time
+import argparse
+from rodeo.context import message_text
+from rodeo.messages import dumps, encode_message
+from rodeo.session_manager import DEFAULT_DB, open_store
+from rodeo.sqlite_store import SqliteStore, connect, list_sessions, prune_sessions
+
+
+def _format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
+
+
+def list_command(conn, args, out):
+    rows = list_sessions(conn)
+    if not rows:
+        print("No sessions.", file=out)
+    for name, count, created, updated in rows:
+        print(f"{name}\t{count} messages\tupdated {_format_time(updated)}", file=out)
+    return 0
+
+
+def show_command(conn, args, out):
+    store = SqliteStore(args.db, args.name, conn=conn)
+    if not store.exists():
+        print(f"No session named {args.name}.", file=sys.stderr)
+        return 1
+    for message in store.load():
+        print(f"{message['role']}: {message_text(message)}", file=out)
+    return 0
+
+
+def prune_command(conn, args, out):
+    if args.older_than is None and args.keep is None:
+        print("Nothing to prune: give --older-than and/or --keep.", file=sys.stderr)
+        return 1
+    older_than = args.older_than * 86400 if args.older_than is not None else None
+    removed = prune_sessions(conn, older_than=older_than, keep=args.keep)
+    print(f"Pruned {len(removed)} sessions.", file=out)
+    return 0
+
+
+def export_command(conn, args, out):
+    store = SqliteStore(args.db, args.name, conn=conn)
+    if not store.exists():
+        print(f"No session named {args.name}.", file=sys.stderr)
+        return 1
+    messages = store.load()
+    if args.format == "json":
+        out.write(dumps(messages).decode() + "\n")
+    else:
+        for message in messages:
+            out.write(encode_message(message).decode() + "\n")
+    return 0
+
+
+def import_command(conn, args, out):
+    if args.name and len(args.files) > 1:
+        print("--name takes a single file: each file is imported as a session of its own.", file=sys.stderr)
+        return 1
+    for path in args.files:
+        messages = open_store(path).load()
+        SqliteStore(args.db, args.name or path, conn=conn).rewrite(messages)
+        print(f"Imported {len(messages)} messages from {path}.", file=out)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="rodeo sessions", description="Manage sessions stored in a SQLite database")
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"Session database (default: {DEFAULT_DB})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="List sessions, most recently used first").set_defaults(handler=list_command)
+
+    show = commands.add_parser("show", help="Print a session's conversation")
+    show.add_argument("name")
+    show.set_defaults(handler=show_command)
+
+    prune = commands.add_parser("prune", help="Delete old sessions")
+    prune.add_argument("--older-than", type=float, metavar="DAYS", help="Delete sessions unused for this many days")
+    prune.add_argument("--keep", type=int, help="Keep only this many most recently used sessions")
+    prune.set_defaults(handler=prune_command)
+
+    export = commands.add_parser("export", help="Write a session's messages to stdout")
+    export.add_argument("name")
+    export.add_argument("--format", choices=("jsonl", "json"), default="jsonl")
+    export.set_defaults(handler=export_command)
+
+    import_ = commands.add_parser("import", help="Copy session files into the database")
+    import_.add_argument("files", nargs="+")
+    import_.add_argument("--name", help="Session name, for a single file (default: the file path)")
+    import_.set_defaults(handler=import_command)
+    return parser
+
+
+def main(argv=None, out=None):
+    args = build_parser().parse_args(argv)
+    conn = connect(args.db)
+    try:
+        status = args.handler(conn, args, out or sys.stdout)
+    finally:
+        conn.close()
+    if status:
+        sys.exit(status)
@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import fcntl
+from rodeo.cache import request_key
+
+# Result files of keys no longer in flight are removed once this old.
+STALE_AFTER = 3600
+
+
+class SingleFlight:
+    """
+    Coalesce identical calls made at the same time, across processes.
+
+    Each key has a file in ``directory`` that is both its lock and its
+    result.  The first caller to lock it exclusively becomes the leader: it
+    runs the call and writes the outcome into the file before unlocking.
+    Callers arriving meanwhile wait for the lock to be released and take
+    the leader's result instead of making the call themselves.  If the
+    leader's call failed they make it after all, each raising its own
+    exception: the leader's could not be passed on with its type intact,
+    and callers retry some errors (see rodeo.retry) but not others.
+
+    The lock is released by the kernel when a process dies, so a leader
+    that crashes leaves an empty file, and a waiter then leads in its
+    place.  A waiter still waiting after ``timeout`` seconds, as behind a
+    hung leader, makes the call itself.
+
+    :param directory: Directory holding the lock and result files
+    :param timeout: Seconds to wait for a leader before making the call anyway
+    """
+
+    def __init__(self, directory="~/.rodeo/inflight", timeout=600.0):
+        self.directory = os.path.expanduser(directory)
+        self.timeout = timeout
+        self.led = 0
+        self.coalesced = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self.sweep()
+
+    @staticmethod
+    def key(url, payload):
+        """Key of a request: its API URL and the payload fields that determine the response."""
+        import hashlib
+        return hashlib.sha256(f"{url}\n{request_key(payload)}".encode()).hexdigest()
+
+    def do(self, key, fn):
+        """
+        Return ``fn()``, or the result of an identical call already in flight.
+
+        :param key: Identifies the call; equal keys must mean interchangeable results
+        :param fn: Makes the call; its result must be JSON serializable
+        :return: The result
+        """
+        path = os.path.join(self.directory, key)
+        arrival = time.time()
+        deadline = time.monotonic() + self.timeout
+        delay = 0.002
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    pass
+                else:
+                    return self._lead(fd, fn)
+                while time.monotonic() < deadline:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        time.sleep(delay)
+                        delay = min(delay * 2, 0.05)
+                else:
+                    # The leader is hung: stop waiting for it.
+                    return fn()
+                outcome = self._read(fd)
+            finally:
+                os.close(fd)
+            if outcome is not None and outcome["time"] >= arrival:
+                if "error" in outcome:
+                    return fn()
+                self.coalesced += 1
+                return outcome["result"]
+            # The leader died, or this is the outcome of an earlier call: lead.
+
+    def _lead(self, fd, fn):
+        self.led += 1
+        os.ftruncate(fd, 0)
+        try:
+            result = fn()
+        except Exception as e:
+            self._write(fd, {"time": time.time(), "error": str(e)})
+            raise
+        # Interrupted, the file is left empty and a waiter takes over.
+        self._write(fd, {"time": time.time(), "result": result})
+        return result
+
+    @staticmethod
+    def _write(fd, outcome):
+        data = json.dumps(outcome).encode()
+        os.pwrite(fd, data, 0)
+        os.ftruncate(fd, len(data))
+
+    @staticmethod
+    def _read(fd):
+        size = os.fstat(fd).st_size
+        try:
+            return json.loads(os.pread(fd, size, 0)) if size else None
+        except ValueError:
+            return None
+
+    def sweep(self):
+        """Remove the result files of calls that ended long ago."""
+        cutoff = time.time() - STALE_AFTER
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from rodeo.messages import Message, encode_message
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    meta TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    created REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated);
+CREATE INDEX IF NOT EXISTS messages_created ON messages(created);
+"""
+
+
+def connect(db_path):
+    db_path = os.path.expanduser(db_path)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class Transaction:
+    """
+    A re-entrant write transaction, used like FileLock.
+
+    The outermost ``with`` issues BEGIN IMMEDIATE, which takes SQLite's
+    write lock, and commits (or rolls back on error) when it exits.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            self.conn.execute("BEGIN IMMEDIATE")
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        self._thread_lock.release()
+
+
+class SqliteStore:
+    """
+    One session stored in a shared SQLite database.
+
+    Offers the same interface as SessionLog, so Chat and SessionManager can
+    use either.  Appending a turn inserts only the new rows.
+
+    :param db_path: Path of the database file
+    :param name: Session id within the database
+    """
+
+    def __init__(self, db_path, name="default", conn=None):
+        self.path = f"sqlite:{db_path}#{name}"
+        self.name = name
+        self.conn = conn or connect(db_path)
+        self.lock = Transaction(self.conn)
+
+    def exists(self):
+        return self.conn.execute("SELECT 1 FROM sessions WHERE id = ?", (self.name,)).fetchone() is not None
+
+    def stamp(self):
+        row = self.conn.execute("SELECT version FROM sessions WHERE id = ?", (self.name,)).fetchone()
+        return row[0] if row else None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (self.name,)).fetchone()[0]
+
+    def load(self):
+        rows = self.conn.execute("SELECT data FROM messages WHERE session_id = ? ORDER BY seq", (self.name,))
+        return [Message.from_json(data) for data, in rows]
+
+    def tail(self, n):
+        if n <= 0:
+            return []
+        rows = self.conn.execute(
+            "SELECT data FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?", (self.name, n)).fetchall()
+        return [Message.from_json(data) for data, in reversed(rows)]
+
+    def meta(self):
+        row = self.conn.execute("SELECT meta FROM sessions WHERE id = ?", (self.name,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def append(self, messages, meta=None):
+        now = time.time()
+        with self.lock:
+            self._touch(now, meta)
+            row = self.conn.execute("SELECT COALESCE(MAX(seq), -1) FROM messages WHERE session_id = ?", (self.name,)).fetchone()
+            self._insert(messages, row[0] + 1, now)
+
+    def update_meta(self, **values):
+        with self.lock:
+            meta = self.meta()
+            meta.update(values)
+            self.append([], meta=meta)
+
+    def rewrite(self, messages, meta=None):
+        now = time.time()
+        with self.lock:
+            self._touch(now, meta or {})
+            self.conn.execute("DELETE FROM messages WHERE session_id = ?", (self.name,))
+            self._insert(messages, 0, now)
+
+    def compact(self):
+        return len(self)
+
+    def _touch(self, now, meta):
+        self.conn.execute(
+            "INSERT INTO sessions (id, created, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET updated = excluded.updated, version = version + 1",
+            (self.name, now, now))
+        if meta is not None:
+            self.conn.execute("UPDATE sessions SET meta = ? WHERE id = ?", (json.dumps(meta), self.name))
+
+    def _insert(self, messages, start, now):
+        self.conn.executemany(
+            "INSERT INTO messages (session_id, seq, role, created, data) VALUES (?, ?, ?, ?, ?)",
+            [(self.name, start + i, m["role"], now, encode_message(m).decode()) for i, m in enumerate(messages)])
+
+
+def list_sessions(conn):
+    """Return (id, message count, created, updated) for every session, most recently used first."""
+    return conn.execute(
+        "SELECT s.id, (SELECT COUNT(*) FROM messages m WHERE m.session_id = s.id), s.created, s.updated "
+        "FROM sessions s ORDER BY s.updated DESC").fetchall()
+
+
+def prune_sessions(conn, older_than=None, keep=None):
+    """
+    Delete sessions not used for ``older_than`` seconds and/or all but the ``keep`` most recent.
+
+    :return: The ids of the deleted sessions
+    """
+    doomed = set()
+    if older_than is not None:
+        cutoff = time.time() - older_than
+        doomed.update(r[0] for r in conn.execute("SELECT id FROM sessions WHERE updated < ?", (cutoff,)))
+    if keep is not None:
+        doomed.update(r[0] for r in conn.execute("SELECT id FROM sessions ORDER BY updated DESC LIMIT -1 OFFSET ?", (keep,)))
+    with Transaction(conn):
+        conn.executemany("DELETE FROM sessions WHERE id = ?", [(i,) for i in doomed])
+    return sorted(doomed)
@@ -0,0 +1,27 @@
+def iter_events(lines):
+    """
+    Parse a server-sent events stream.
+
+    :param lines: An iterable of lines (bytes or str) without line terminators
+    :return: A generator of (event, data) tuples
+    """
+    event, data = None, []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line:
+            if data:
+                yield event or 'message', '\n'.join(data)
+            event, data = None, []
+            continue
+        if line.startswith(':'):
+            continue
+        field, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+        if field == 'event':
+            event = value
+        elif field == 'data':
+            data.append(value)
+    if data:
+        yield event or 'message', '\n'.join(data)
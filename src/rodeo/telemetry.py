@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from rodeo.locking import atomic_write
+
+DEFAULT_METRICS = "~/.rodeo/metrics.jsonl"
+
+TIMING_FIELDS = ("dns", "connect", "tls", "first_byte", "total")
+USAGE_FIELDS = {
+    "input_tokens": "input",
+    "output_tokens": "output",
+    "cache_read_input_tokens": "cache_read",
+    "cache_creation_input_tokens": "cache_write",
+}
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def make_record(model, status, timings=None, body=None, stream=False, error=None):
+    """
+    Build the metrics record of one API call.
+
+    :param model: The model the request was sent to
+    :param status: HTTP status, or None if no response arrived
+    :param timings: Connection timings from Transport.last_timings
+    :param body: The response body (or, for a stream, its usage and stop_reason)
+    :param stream: Whether the response was streamed
+    :param error: Exception class name for calls that failed without a response
+    :return: A JSON-serializable dict
+    """
+    record = {"time": time.time(), "model": model, "status": status, "stream": stream}
+    if timings:
+        record["reused"] = timings.get("reused")
+        for field in TIMING_FIELDS:
+            if field in timings:
+                record[field] = round(timings[field], 6)
+    if body:
+        usage = body.get("usage") or {}
+        for field, name in USAGE_FIELDS.items():
+            record[name] = usage.get(field) or 0
+        record["stop_reason"] = body.get("stop_reason")
+    if error:
+        record["error"] = error
+    return record
+
+
+class Telemetry:
+    """
+    Appends one JSON line per API call to a metrics file.
+
+    Each record is written with a single O_APPEND write, so concurrent
+    invocations can share the file without locking.
+
+    :param path: The metrics file (default: ~/.rodeo/metrics.jsonl)
+    """
+
+    def __init__(self, path=DEFAULT_METRICS):
+        self.path = os.path.expanduser(path)
+
+    def record(self, record):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def read(self, since=None):
+        """Yield the records in the metrics file, skipping torn lines."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if since is None or record.get("time", 0) >= since:
+                    yield record
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+def summarize(records):
+    """
+    Aggregate metrics records per model.
+
+    :return: A dict mapping model to its requests, errors, status counts,
+        latency and first-byte quantiles, token totals and output tokens/sec
+    """
+    models = {}
+    for record in records:
+        stats = models.setdefault(record.get("model"), {
+            "requests": 0, "errors": 0, "statuses": {}, "total": [], "first_byte": [],
+            "tokens": dict.fromkeys(USAGE_FIELDS.values(), 0), "busy": 0.0,
+        })
+        stats["requests"] += 1
+        status = record.get("status")
+        stats["statuses"][str(status)] = stats["statuses"].get(str(status), 0) + 1
+        if status is None or status >= 400:
+            stats["errors"] += 1
+            continue
+        for name in USAGE_FIELDS.values():
+            stats["tokens"][name] += record.get(name, 0)
+        if "total" in record:
+            stats["total"].append(record["total"])
+            stats["busy"] += record["total"]
+        if "first_byte" in record:
+            stats["first_byte"].append(record["first_byte"])
+
+    summary = {}
+    for model, stats in models.items():
+        total = sorted(stats["total"])
+        first_byte = sorted(stats["first_byte"])
+        summary[model] = {
+            "requests": stats["requests"],
+            "errors": stats["errors"],
+            "statuses": stats["statuses"],
+            "latency": {q: percentile(total, q) for q in QUANTILES},
+            "first_byte": {q: percentile(first_byte, q) for q in QUANTILES},
+            "latency_sum": sum(total),
+            "tokens": stats["tokens"],
+            "tokens_per_second": stats["tokens"]["output"] / stats["busy"] if stats["busy"] else 0.0,
+        }
+    return summary
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def prometheus_text(summary):
+    """Render a summary in the Prometheus text exposition format."""
+    lines = [
+        "# HELP rodeo_requests_total API calls by model and HTTP status.",
+        "# TYPE rodeo_requests_total counter",
+    ]
+    for model, stats in summary.items():
+        for status, count in sorted(stats["statuses"].items()):
+            lines.append(f"rodeo_requests_total{_labels(model=model, status=status)} {count}")
+    for name, key, help_text in (
+        ("rodeo_request_duration_seconds", "latency", "Total time of successful API calls."),
+        ("rodeo_time_to_first_byte_seconds", "first_byte", "Time to the first byte of successful API calls."),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+        for model, stats in summary.items():
+            for q, value in stats[key].items():
+                if value is not None:
+                    lines.append(f"{name}{_labels(model=model, quantile=q)} {value}")
+            if key == "latency":
+                lines.append(f"{name}_sum{_labels(model=model)} {stats['latency_sum']}")
+                lines.append(f"{name}_count{_labels(model=model)} {stats['requests'] - stats['errors']}")
+    lines += ["# HELP rodeo_tokens_total Tokens by model and kind.", "# TYPE rodeo_tokens_total counter"]
+    for model, stats in summary.items():
+        for kind, count in stats["tokens"].items():
+            lines.append(f"rodeo_tokens_total{_labels(model=model, kind=kind)} {count}")
+    lines += ["# HELP rodeo_output_tokens_per_second Output tokens per second of request time.",
+              "# TYPE rodeo_output_tokens_per_second gauge"]
+    for model, stats in summary.items():
+        lines.append(f"rodeo_output_tokens_per_second{_labels(model=model)} {stats['tokens_per_second']}")
+    return "\n".join(lines) + "\n"
+
+
+def _ms(value):
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+
+def main(argv=None, out=None):
+    parser = argparse.ArgumentParser(prog="rodeo stats", description="Report latency and throughput from the metrics file")
+    parser.add_argument("--metrics", default=os.getenv('RODEO_METRICS') or DEFAULT_METRICS,
+                        help=f"Metrics file (default: $RODEO_METRICS or {DEFAULT_METRICS})")
+    parser.add_argument("--since", type=float, metavar="HOURS", help="Only include calls from the last HOURS hours")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    parser.add_argument("--prometheus", metavar="FILE", help="Also write the summary as a Prometheus textfile")
+    args = parser.parse_args(argv)
+    out = out or sys.stdout
+
+    since = time.time() - args.since * 3600 if args.since is not None else None
+    summary = summarize(Telemetry(args.metrics).read(since))
+    if args.prometheus:
+        atomic_write(args.prometheus, prometheus_text(summary).encode())
+
+    if args.json:
+        json.dump(summary, out, indent=2)
+        out.write("\n")
+        return
+    if not summary:
+        print(f"No calls recorded in {args.metrics}.", file=out)
+        return
+    print("model\trequests\terrors\tp50\tp95\tp99\tttfb p50\tin tokens\tout tokens\tout tok/s", file=out)
+    for model, stats in sorted(summary.items(), key=lambda item: str(item[0])):
+        latency = stats["latency"]
+        print("\t".join([
+            str(model), str(stats["requests"]), str(stats["errors"]),
+            _ms(latency[0.5]), _ms(latency[0.95]), _ms(latency[0.99]), _ms(stats["first_byte"][0.5]),
+            str(stats["tokens"]["input"]), str(stats["tokens"]["output"]), f"{stats['tokens_per_second']:.1f}",
+        ]), file=out)
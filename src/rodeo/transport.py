@@ -0,0 +1,165 @@
+import time
+import socket
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.connection import allowed_gai_family
+from rodeo.messages import dumps, encode_request
+
+# Connection setup timings for the request currently being sent on this
+# thread.  The timed connections below fill it in; TimingAdapter reads it.
+_timings = threading.local()
+
+
+class _TimedConnectionMixin:
+    def _new_conn(self):
+        # Resolve the host here so the lookup can be timed apart from the TCP
+        # handshake, then connect to each address in turn as urllib3 would.
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+            addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        except socket.gaierror:
+            addresses = [host]  # Let urllib3 report the failure in its usual way.
+        _timings.dns = time.perf_counter() - start
+        try:
+            for i, address in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    sock = super()._new_conn()
+                    break
+                except ConnectTimeoutError:  # Also covers NewConnectionError.
+                    if i == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+        _timings.connect = time.perf_counter() - start - _timings.dns
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        elapsed = time.perf_counter() - start
+        setup = getattr(_timings, 'dns', 0.0) + getattr(_timings, 'connect', 0.0)
+        _timings.tls = max(elapsed - setup, 0.0) if self.is_tls else 0.0
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    is_tls = False
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    is_tls = True
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimingAdapter(HTTPAdapter):
+    """An HTTPAdapter that records connection reuse and setup timings on each response."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        _timings.__dict__.clear()
+        response = super().send(request, **kwargs)
+        response.timings = {
+            "reused": not hasattr(_timings, 'connect'),
+            "dns": getattr(_timings, 'dns', 0.0),
+            "connect": getattr(_timings, 'connect', 0.0),
+            "tls": getattr(_timings, 'tls', 0.0),
+            "first_byte": response.elapsed.total_seconds(),
+        }
+        return response
+
+
+class Transport:
+    """
+    A pooled, keep-alive HTTP client shared by every request a Chat makes.
+
+    :param pool_size: Maximum number of connections kept per host
+    :param keep_alive: Reuse connections between requests
+    :param connect_timeout: Seconds allowed for the TCP and TLS handshake
+    :param read_timeout: Seconds allowed between bytes of the response
+    """
+
+    def __init__(self, pool_size=10, keep_alive=True, connect_timeout=10.0, read_timeout=600.0):
+        self.session = requests.Session()
+        adapter = TimingAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+        self.timeout = (connect_timeout, read_timeout)
+        self.last_timings = None
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        body = kwargs.pop('json', None)
+        if body is not None:
+            # Encoded here rather than by requests, so that the history's
+            # messages are sent from their cached encodings.
+            kwargs['data'] = encode_request(body) if isinstance(body, dict) else dumps(body)
+            kwargs['headers'] = dict(kwargs.get('headers') or {})
+            kwargs['headers'].setdefault('Content-Type', 'application/json')
+        start = time.perf_counter()
+        response = self.session.request(method, url, **kwargs)
+        timings = dict(response.timings)
+        timings["total"] = time.perf_counter() - start
+        # Also kept on the response, for callers sharing this Transport between threads.
+        response.timings = self.last_timings = timings
+        return response
+
+    def preconnect(self, url):
+        """
+        Open a pooled connection to the host of ``url`` ahead of the first request.
+
+        The request then finds the DNS lookup and the TCP and TLS
+        handshakes already done.  Failures are left for that request to
+        report.
+
+        :return: Whether a connection was opened
+        """
+        try:
+            adapter = self.session.get_adapter(url)
+            # The pool is chosen by the same settings a request would use.
+            settings = self.session.merge_environment_settings(url, {}, None, None, None)
+            if hasattr(adapter, 'get_connection_with_tls_context'):
+                pool = adapter.get_connection_with_tls_context(
+                    requests.Request("POST", url).prepare(), settings["verify"], settings["proxies"], settings["cert"])
+            else:
+                pool = adapter.get_connection(url, settings["proxies"])
+            conn = pool._get_conn()
+            try:
+                conn.connect()
+            except Exception:
+                conn.close()
+                raise
+            finally:
+                pool._put_conn(conn)
+        except Exception:
+            return False
+        return True
+
+    def close(self):
+        self.session.close()
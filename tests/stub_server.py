@@ -0,0 +1,273 @@
+"""
+A local stand-in for the Anthropic Messages API.
+
+Tests and benchmarks point a Chat at ``StubAPI().url`` instead of the real
+endpoint.  Replies are deterministic (the upper-cased last user message by
+default), and ``faults`` lets a test script errors for upcoming requests.
+Prompt caching is emulated: prefixes ending at a cache_control block are
+remembered, and later requests sharing them report cache reads in ``usage``.
+"""
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def default_reply(payload):
+    content = payload["messages"][-1]["content"]
+    if not isinstance(content, str):
+        content = "".join(block.get("text", "") for block in content)
+    return content.upper()
+
+
+def cache_breakpoints(payload):
+    """Yield (characters, prefix) for each block of a request marked with cache_control."""
+    system = payload.get("system")
+    sections = [("system", system if isinstance(system, list) else [])]
+    for message in payload["messages"]:
+        content = message["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        sections.append((message["role"], content))
+    prefix = []
+    size = 0
+    for role, blocks in sections:
+        for block in blocks:
+            prefix.append((role, block.get("text", "")))
+            size += len(block.get("text", ""))
+            if "cache_control" in block:
+                yield size, json.dumps(prefix)
+
+
+def message_body(payload, text, usage=None):
+    return {
+        "id": "msg_stub",
+        "type": "message",
+        "role": "assistant",
+        "model": payload.get("model"),
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "usage": dict({"input_tokens": len(json.dumps(payload["messages"])) // 4, "output_tokens": len(text) // 4 + 1}, **(usage or {})),
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY the
+    # body waits on the client's delayed ACK, adding ~40ms per response.
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_POST(self):
+        api = self.server.api
+        payload = self._read_json()
+        if self.path == "/v1/messages/batches":
+            fault = api.next_fault()
+            if fault is not None:
+                status, headers = fault
+                self._send_json(status, {"type": "error", "error": {"type": "stub_error", "message": f"status {status}"}}, headers)
+            else:
+                self._send_json(200, api.create_batch(payload))
+            return
+        if self.path != "/v1/messages":
+            self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+            return
+
+        api.record(payload, dict(self.headers))
+        fault = api.next_fault()
+        if fault == "drop":
+            self.close_connection = True
+            self.connection.close()
+            return
+        if isinstance(fault, (int, float)):
+            time.sleep(fault)
+        elif fault is not None:
+            status, headers = fault
+            self._send_json(status, {"type": "error", "error": {"type": "stub_error", "message": f"status {status}"}}, headers)
+            return
+        if api.latency:
+            time.sleep(api.latency)
+
+        text = api.reply(payload)
+        usage = api.cache_usage(payload)
+        if payload.get("stream"):
+            self._stream(payload, text, usage)
+        else:
+            self._send_json(200, message_body(payload, text, usage), api.response_headers)
+
+    def _stream(self, payload, text, usage=None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        body = message_body(payload, "", usage)
+        events = [("message_start", {"type": "message_start", "message": body})]
+        for i in range(0, len(text), 4):
+            events.append(("content_block_delta", {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "text_delta", "text": text[i:i + 4]},
+            }))
+        events.append(("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": "end_turn"},
+            "usage": {"output_tokens": len(text) // 4 + 1},
+        }))
+        events.append(("message_stop", {"type": "message_stop"}))
+        for event, data in events:
+            self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+            self.wfile.flush()
+        self.close_connection = True
+
+    def do_GET(self):
+        api = self.server.api
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if parts == ["v1", "messages", "batches"]:
+            self._send_json(200, api.list_batches())
+            return
+        if parts[:3] != ["v1", "messages", "batches"] or len(parts) < 4:
+            self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+            return
+        batch = api.poll_batch(parts[3])
+        if batch is None:
+            self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": parts[3]}})
+        elif len(parts) == 5 and parts[4] == "results":
+            lines = api.batch_results(parts[3])
+            data = "".join(json.dumps(line) + "\n" for line in lines).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-jsonl")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json(200, batch)
+
+
+class StubAPI:
+    """
+    :param reply: Function mapping a request payload to the reply text
+    :param latency: Seconds to sleep before answering each message request
+    :param batch_polls: Status polls before a message batch reports "ended"
+    """
+
+    def __init__(self, reply=default_reply, latency=0.0, batch_polls=1):
+        self.reply = reply
+        self.latency = latency
+        self.batch_polls = batch_polls
+        self.faults = []
+        self.requests = []
+        self.headers = []
+        self.response_headers = {}
+        self.batches = {}
+        self.cached_prefixes = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self._server.daemon_threads = True
+        self._server.api = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def url(self):
+        return self.base_url + "/v1/messages"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def record(self, payload, headers):
+        with self._lock:
+            self.requests.append(payload)
+            self.headers.append(headers)
+
+    def next_fault(self):
+        """
+        Pop the fault scripted for the next message or batch creation request.
+
+        A fault is None (answer normally), a number of seconds to stall,
+        "drop" to close the connection without answering, or a
+        (status, headers) tuple to return an error.  Batch creation only
+        takes the last kind.
+        """
+        with self._lock:
+            return self.faults.pop(0) if self.faults else None
+
+    def cache_usage(self, payload):
+        """Return the prompt cache token counts for a request, caching its marked prefixes."""
+        read = written = 0
+        with self._lock:
+            for size, prefix in cache_breakpoints(payload):
+                if prefix in self.cached_prefixes:
+                    read = size // 4
+                else:
+                    self.cached_prefixes.add(prefix)
+                    written = size // 4
+        return {"cache_read_input_tokens": read, "cache_creation_input_tokens": max(0, written - read)}
+
+    def create_batch(self, body):
+        with self._lock:
+            batch_id = f"msgbatch_{len(self.batches) + 1:04d}"
+            self.batches[batch_id] = {"requests": body["requests"], "polls": 0,
+                                      "created_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")}
+        return self._batch_status(batch_id)
+
+    def list_batches(self):
+        with self._lock:
+            data = [self._batch_status(batch_id) for batch_id in reversed(list(self.batches))]
+        return {"data": data, "has_more": False, "first_id": None, "last_id": None}
+
+    def poll_batch(self, batch_id):
+        with self._lock:
+            if batch_id not in self.batches:
+                return None
+            self.batches[batch_id]["polls"] += 1
+        return self._batch_status(batch_id)
+
+    def _batch_status(self, batch_id):
+        batch = self.batches[batch_id]
+        ended = batch["polls"] >= self.batch_polls
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "created_at": batch["created_at"],
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {"processing": 0 if ended else len(batch["requests"]), "succeeded": len(batch["requests"]) if ended else 0},
+            "results_url": f"{self.base_url}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def batch_results(self, batch_id):
+        return [
+            {"custom_id": r["custom_id"], "result": {"type": "succeeded", "message": message_body(r["params"], self.reply(r["params"]))}}
+            for r in self.batches[batch_id]["requests"]
+        ]
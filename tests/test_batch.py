@@ -0,0 +1,90 @@
+import io
+import json
+import asyncio
+import threading
+import requests
+from unittest.mock import MagicMock
+from src.rodeo.async_chat import AsyncChat
+from src.rodeo.batch import main, read_prompts, run_batch
+
+class FakeTransport:
+    """Answers each prompt by echoing it, optionally rate limiting the first calls."""
+
+    def __init__(self, rate_limited=0):
+        self.rate_limited = rate_limited
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.last_timings = None
+
+    def post(self, url, json=None, **kwargs):
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            limited = self.calls <= self.rate_limited
+        try:
+            response = MagicMock()
+            if limited:
+                response.status_code = 429
+                response.headers = {"retry-after": "0"}
+                response.raise_for_status.side_effect = requests.HTTPError(response=response)
+            else:
+                threading.Event().wait(0.01)
+                text = json["messages"][-1]["content"].upper()
+                response.json.return_value = {"content": [{"text": text}]}
+            return response
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+def test_read_prompts():
+    stream = io.StringIO('plain prompt\n\n{"id": 7, "prompt": "json prompt"}\n')
+
+    assert read_prompts(stream) == [{"prompt": "plain prompt"}, {"id": 7, "prompt": "json prompt"}]
+
+def test_run_batch_preserves_order_and_bounds_concurrency():
+    transport = FakeTransport()
+    prompts = [{"prompt": f"p{i}"} for i in range(20)]
+    written = []
+
+    results = asyncio.run(run_batch(prompts, lambda: AsyncChat(transport=transport), concurrency=4, on_result=written.append))
+
+    assert [r["response"] for r in results] == [f"P{i}" for i in range(20)]
+    assert [r["index"] for r in written] == list(range(20))
+    assert 1 < transport.max_in_flight <= 4
+
+def test_run_batch_shuts_down_its_threads():
+    async def main():
+        await run_batch([{"prompt": "p"}] * 4, lambda: AsyncChat(transport=FakeTransport()), concurrency=2)
+        return [t for t in threading.enumerate() if t.name.startswith("ThreadPoolExecutor")]
+
+    assert asyncio.run(main()) == []
+
+def test_async_chat_retries_rate_limited_requests():
+    transport = FakeTransport(rate_limited=2)
+    chat = AsyncChat(transport=transport)
+
+    response = asyncio.run(chat.get_response("hello"))
+
+    assert response == "HELLO"
+    assert transport.calls == 3
+    assert chat.messages == [{"role": "user", "content": "hello"}, {"role": "assistant", "content": "HELLO"}]
+
+def test_run_batch_records_errors():
+    transport = FakeTransport(rate_limited=10)
+
+    results = asyncio.run(run_batch([{"prompt": "p"}], lambda: AsyncChat(transport=transport, max_retries=1)))
+
+    assert "error" in results[0]
+    assert transport.calls == 2
+
+def test_batch_command_uses_the_chosen_provider(tmp_path):
+    prompts = tmp_path / "prompts.txt"
+    prompts.write_text("first\nsecond\n")
+    output = tmp_path / "results.jsonl"
+
+    main([str(prompts), "--provider", "stub", "--model", "m", "--output", str(output)])
+
+    assert [json.loads(line)["response"] for line in output.read_text().splitlines()] == ["FIRST", "SECOND"]
@@ -0,0 +1,58 @@
+import json
+import pytest
+from benchmarks import harness
+from benchmarks.__main__ import main
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(harness, "BENCHMARKS", [])
+    return harness.BENCHMARKS
+
+def test_timer_times_each_pass(registry):
+    calls = []
+
+    @harness.benchmark(params={"size": [1, 2, 3]}, repeat=3)
+    def work(timer, size):
+        for _ in timer:
+            calls.append(size)
+        timer.items = size
+
+    results = harness.run()["benchmarks"]
+
+    assert list(results) == ["test_benchmarks.work[size=1]", "test_benchmarks.work[size=2]", "test_benchmarks.work[size=3]"]
+    assert calls == [1, 1, 1, 2, 2, 2, 3, 3, 3]
+    result = results["test_benchmarks.work[size=2]"]
+    assert result["repeat"] == 3 and result["min"] <= result["median"]
+    assert result["per_second"] == 2 / result["median"]
+
+    quick = harness.run(quick=True)["benchmarks"]
+    assert len(quick) == 2 and all(r["repeat"] == 1 for r in quick.values())
+
+def test_benchmark_must_iterate_its_timer(registry):
+    harness.benchmark()(lambda timer: None)
+
+    with pytest.raises(RuntimeError):
+        harness.run()
+
+def test_compare_flags_regressions():
+    def results(**medians):
+        return {"benchmarks": {name: {"median": value} for name, value in medians.items()}}
+
+    rows = harness.compare(results(a=1.0, b=1.0, c=1.0, gone=1.0), results(a=1.05, b=1.5, c=0.5, new=1.0))
+
+    assert [(name, verdict) for name, _, _, _, verdict in rows] == [("a", ""), ("b", "slower"), ("c", "faster")]
+
+def test_run_and_compare_commands(tmp_path, capsys):
+    base, new = tmp_path / "base.json", tmp_path / "new.json"
+    main(["run", "--quick", "-k", "bench_prompt", "--output", str(base)])
+    results = json.loads(base.read_text())
+    assert results["python"] and "commit" in results
+    assert "bench_prompt.process[size=1000,placeholder=True,prompt_cache=False]" in results["benchmarks"]
+
+    for result in results["benchmarks"].values():
+        result["median"] *= 3
+    new.write_text(json.dumps(results))
+    with pytest.raises(SystemExit):
+        main(["compare", str(base), str(new)])
+    main(["compare", str(new), str(base)])
+    assert "faster" in capsys.readouterr().out
@@ -0,0 +1,135 @@
+import json
+import pytest
+from src.rodeo.bulk import BulkJob, main
+from src.rodeo.chat import Chat
+from src.rodeo.providers import StubProvider
+from tests.stub_server import StubAPI
+
+@pytest.fixture
+def api():
+    with StubAPI(batch_polls=2) as api:
+        yield api
+
+def make_chat(api):
+    chat = Chat(None)
+    chat.api_url = api.url
+    return chat
+
+def read_output(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_bulk_job_round_trip(api, tmp_path):
+    prompts = [{"prompt": f"p{i}"} for i in range(5)]
+    output = str(tmp_path / "out.jsonl")
+
+    BulkJob(prompts, output, output + ".state", chat=make_chat(api), chunk_size=2, poll_interval=0).run()
+
+    results = sorted(read_output(output), key=lambda r: r["index"])
+    assert [r["response"] for r in results] == ["P0", "P1", "P2", "P3", "P4"]
+    assert len(api.batches) == 3
+    assert api.batches["msgbatch_0001"]["requests"][0]["params"]["messages"] == [{"role": "user", "content": "p0"}]
+
+def test_bulk_job_resumes(api, tmp_path):
+    prompts = [{"prompt": f"p{i}"} for i in range(4)]
+    output = str(tmp_path / "out.jsonl")
+    state = output + ".state"
+
+    first = BulkJob(prompts, output, state, chat=make_chat(api), chunk_size=2, poll_interval=0)
+    first.submit()
+    assert first.poll() is False
+
+    resumed = BulkJob(prompts, output, state, chat=make_chat(api), chunk_size=2, poll_interval=0)
+    resumed.run()
+
+    assert len(api.batches) == 2
+    assert sorted(r["index"] for r in read_output(output)) == [0, 1, 2, 3]
+
+def test_bulk_job_rejects_foreign_state(api, tmp_path):
+    output = str(tmp_path / "out.jsonl")
+    BulkJob([{"prompt": "a"}], output, output + ".state", chat=make_chat(api)).submit()
+
+    with pytest.raises(ValueError):
+        BulkJob([{"prompt": "a"}, {"prompt": "b"}], output, output + ".state", chat=make_chat(api))
+
+def test_bulk_job_recovers_a_batch_submitted_before_a_crash(api, tmp_path):
+    prompts = [{"prompt": f"p{i}"} for i in range(4)]
+    output = str(tmp_path / "out.jsonl")
+    chat = make_chat(api)
+    post = chat.transport.post
+
+    def post_then_crash(*args, **kwargs):
+        post(*args, **kwargs)
+        raise KeyboardInterrupt
+
+    chat.transport.post = post_then_crash
+    with pytest.raises(KeyboardInterrupt):
+        BulkJob(prompts, output, output + ".state", chat=chat, chunk_size=2).submit()
+    chat.transport.post = post
+
+    BulkJob(prompts, output, output + ".state", chat=chat, chunk_size=2, poll_interval=0).run()
+
+    assert len(api.batches) == 2
+    assert sorted(r["index"] for r in read_output(output)) == [0, 1, 2, 3]
+
+def test_bulk_job_starts_after_a_torn_line(api, tmp_path):
+    output = tmp_path / "out.jsonl"
+    output.write_text('{"custom_id": "prompt-9", "resp')
+
+    BulkJob([{"prompt": "a"}], str(output), str(output) + ".state", chat=make_chat(api), poll_interval=0).run()
+
+    lines = output.read_text().splitlines()
+    assert lines[0] == '{"custom_id": "prompt-9", "resp'
+    record = json.loads(lines[1])
+    assert (record["prompt"], record["index"], record["response"]) == ("a", 0, "A")
+    assert len(lines) == 2
+
+def test_bulk_job_needs_the_anthropic_provider(tmp_path):
+    with pytest.raises(ValueError, match="Message Batches"):
+        BulkJob([{"prompt": "a"}], str(tmp_path / "out"), str(tmp_path / "state"), chat=Chat(None, provider=StubProvider()))
+
+def test_bulk_job_does_not_adopt_an_unrelated_batch(api, tmp_path):
+    prompts = [{"prompt": f"p{i}"} for i in range(2)]
+    output = str(tmp_path / "out.jsonl")
+    chat = make_chat(api)
+    post = chat.transport.post
+
+    def crash_before_sending(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    chat.transport.post = crash_before_sending
+    with pytest.raises(KeyboardInterrupt):
+        BulkJob(prompts, output, output + ".state", chat=chat).submit()
+    chat.transport.post = post
+    # Someone else's batch of the same size, created after the pending submission.
+    api.create_batch({"requests": [{"custom_id": f"other-{i}", "params": {"messages": [{"role": "user", "content": "x"}]}}
+                                   for i in range(2)]})
+
+    BulkJob(prompts, output, output + ".state", chat=chat, poll_interval=0).run()
+
+    assert len(api.batches) == 2
+    results = sorted(read_output(output), key=lambda r: r["index"])
+    assert [r["response"] for r in results] == ["P0", "P1"]
+
+def test_bulk_job_retries_a_rate_limited_submission(api, tmp_path):
+    output = str(tmp_path / "out.jsonl")
+    api.faults = [(429, {"retry-after": "0"}), (529, {"retry-after": "0"})]
+
+    BulkJob([{"prompt": "a"}], output, output + ".state", chat=make_chat(api), poll_interval=0).run()
+
+    assert len(api.batches) == 1
+    assert [r["response"] for r in read_output(output)] == ["A"]
+
+def test_bulk_command_uses_the_chosen_provider(api, tmp_path):
+    prompts = tmp_path / "prompts.txt"
+    prompts.write_text("first\n")
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({"providers": {"local": {"type": "anthropic", "url": api.url}}}))
+    output = tmp_path / "results.jsonl"
+
+    main([str(prompts), "--output", str(output), "--config", str(config), "--provider", "local",
+          "--model", "m", "--max-tokens", "7", "--poll-interval", "0"])
+
+    params = api.batches["msgbatch_0001"]["requests"][0]["params"]
+    assert (params["model"], params["max_tokens"]) == ("m", 7)
+    assert [r["response"] for r in read_output(str(output))] == ["FIRST"]
@@ -0,0 +1,80 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.rodeo.cache import ResponseCache, request_key
+
+PAYLOAD = {"model": "m", "messages": [{"role": "user", "content": "Hi"}], "max_tokens": 10}
+
+def test_request_key_is_canonical():
+    reordered = {"max_tokens": 10, "messages": [{"content": "Hi", "role": "user"}], "model": "m"}
+
+    assert request_key(PAYLOAD) == request_key(reordered)
+    assert request_key(PAYLOAD) == request_key(dict(PAYLOAD, stream=True))
+    assert request_key(PAYLOAD) != request_key(dict(PAYLOAD, max_tokens=11))
+    assert ResponseCache.key("http://localhost:8080/v1", PAYLOAD) != ResponseCache.key("https://api.openai.com/v1", PAYLOAD)
+
+def test_get_put_and_stats(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    key = request_key(PAYLOAD)
+
+    assert cache.get(key) is None
+    cache.put(key, {"content": [{"text": "Hello"}]})
+    assert ResponseCache(str(tmp_path)).get(key) == {"content": [{"text": "Hello"}]}
+
+    cache.save_stats()
+    assert ResponseCache(str(tmp_path)).stats() == {"hits": 0, "misses": 1}
+
+def test_ttl_expiry(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    cache.put("ab" * 32, {"content": []})
+    path = cache._path("ab" * 32)
+    old = time.time() - 120
+    os.utime(path, (old, old))
+
+    assert ResponseCache(str(tmp_path), ttl=60).get("ab" * 32) is None
+    assert not os.path.exists(path)
+
+def test_lru_eviction(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=300)
+    for i, key in enumerate(["aa" * 32, "bb" * 32, "cc" * 32]):
+        cache.put(key, {"text": "x" * 80})
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    os.utime(cache._path("aa" * 32), (2000, 1000))
+
+    cache.put("dd" * 32, {"text": "x" * 80})
+
+    assert os.path.exists(cache._path("aa" * 32))
+    assert not os.path.exists(cache._path("bb" * 32))
+    assert os.path.exists(cache._path("dd" * 32))
+
+def test_ttl_applies_to_entries_held_in_memory(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    cache.put("ab" * 32, {"content": []})
+    assert cache.get("ab" * 32) == {"content": []}
+
+    later = time.time() + 120
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert cache.get("ab" * 32) is None
+
+def test_eviction_walks_the_cache_only_when_over_budget(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path), max_bytes=300)
+    cache.put("aa" * 32, {"text": "x" * 80})
+    walks = []
+    walk = os.walk
+    monkeypatch.setattr(os, "walk", lambda *args: walks.append(1) or walk(*args))
+
+    cache.put("bb" * 32, {"text": "x" * 80})
+    cache.put("cc" * 32, {"text": "x" * 80})
+    assert walks == []
+    cache.put("dd" * 32, {"text": "x" * 80})
+    assert walks == [1]
+
+def test_stats_from_concurrent_invocations_add_up(tmp_path):
+    def count(_):
+        cache = ResponseCache(str(tmp_path))
+        cache.hits, cache.misses = 1, 2
+        cache.save_stats()
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(count, range(40)))
+    assert ResponseCache(str(tmp_path)).stats() == {"hits": 40, "misses": 80}
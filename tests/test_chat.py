@@ -1,22 +1,27 @@
 import pytest
 from unittest.mock import patch, MagicMock
 from src.rodeo.chat import Chat
+from src.rodeo.cache import ResponseCache
+from src.rodeo.context import ContextWindow
+from tests.stub_server import StubAPI
 
 @pytest.fixture
-def mock_requests():
-    with patch('src.rodeo.chat.requests') as mock:
-        yield mock
+def mock_transport():
+    with patch('src.rodeo.chat.Transport') as mock:
+        yield mock.return_value
 
-def test_chat_initialization():
+def test_chat_initialization(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
     chat = Chat("test_session.json")
     assert chat.session_file == "test_session.json"
     assert chat.messages == []
 
-def test_get_response(mock_requests):
+def test_get_response(mock_transport, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
     chat = Chat("test_session.json")
     mock_response = MagicMock()
     mock_response.json.return_value = {"content": [{"text": "Test response"}]}
-    mock_requests.post.return_value = mock_response
+    mock_transport.post.return_value = mock_response
 
     response = chat.get_response("Test prompt")
 
@@ -25,7 +30,8 @@ def test_get_response(mock_requests):
     assert chat.messages[0] == {"role": "user", "content": "Test prompt"}
     assert chat.messages[1] == {"role": "assistant", "content": "Test response"}
 
-def test_clear_session():
+def test_clear_session(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
     chat = Chat("test_session.json")
     chat.messages = [{"role": "user", "content": "Test"}]
     
@@ -33,3 +39,161 @@ def test_clear_session():
     
     assert chat.messages == []
 
+
+def test_get_response_appends_to_session(mock_transport, tmp_path):
+    session_file = str(tmp_path / "session")
+    mock_transport.post.return_value.json.return_value = {"content": [{"text": "Test response"}]}
+
+    Chat(session_file).get_response("First")
+    chat = Chat(session_file)
+    chat.get_response("Second")
+
+    assert [m["content"] for m in Chat(session_file).messages] == ["First", "Test response", "Second", "Test response"]
+    assert len(chat.log) == 4
+
+def test_stream_response(mock_transport, tmp_path):
+    chat = Chat(str(tmp_path / "session"))
+    mock_transport.post.return_value.iter_lines.return_value = [
+        b'event: message_start',
+        b'data: {"type": "message_start"}',
+        b'',
+        b'event: content_block_delta',
+        b'data: {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "Hel"}}',
+        b'',
+        b'event: content_block_delta',
+        b'data: {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "lo"}}',
+        b'',
+        b'event: message_stop',
+        b'data: {"type": "message_stop"}',
+        b'',
+    ]
+
+    chunks = list(chat.stream_response("Test prompt"))
+
+    assert chunks == ["Hel", "lo"]
+    assert mock_transport.post.call_args.kwargs["json"]["stream"] is True
+    assert Chat(chat.session_file).messages[1] == {"role": "assistant", "content": "Hello"}
+
+def test_context_window_trims_payload(mock_transport, tmp_path):
+    chat = Chat(str(tmp_path / "session"), context=ContextWindow(30))
+    chat.messages = [{"role": "user", "content": "x" * 200}, {"role": "assistant", "content": "y" * 200}]
+    mock_transport.post.return_value.json.return_value = {"content": [{"text": "Test response"}]}
+
+    chat.get_response("Test prompt")
+
+    payload = mock_transport.post.call_args.kwargs["json"]
+    assert payload["messages"] == [{"role": "user", "content": "Test prompt"}]
+    assert "system" not in payload
+    assert len(chat.messages) == 4
+
+def test_context_summarize_stores_rolling_summary(mock_transport, tmp_path):
+    chat = Chat(str(tmp_path / "session"), context=ContextWindow(30, strategy="summarize"))
+    chat.messages = [{"role": "user", "content": "My name is Alice" * 10}, {"role": "assistant", "content": "Hi Alice" * 10}]
+    mock_transport.post.return_value.json.side_effect = [
+        {"content": [{"text": "The user is Alice."}]},
+        {"content": [{"text": "Your name is Alice."}]},
+    ]
+
+    assert chat.get_response("What's my name?") == "Your name is Alice."
+
+    payload = mock_transport.post.call_args.kwargs["json"]
+    assert payload["system"].endswith("The user is Alice.")
+    assert payload["messages"] == [{"role": "user", "content": "What's my name?"}]
+    assert chat.log.meta() == {"summary": "The user is Alice.", "summarized": 2}
+
+def test_cache_skips_request(mock_transport, tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache"))
+    mock_transport.post.return_value.json.return_value = {"content": [{"text": "Test response"}]}
+
+    Chat(str(tmp_path / "a"), cache=cache).get_response("Test prompt")
+    response = Chat(str(tmp_path / "b"), cache=cache).get_response("Test prompt")
+
+    assert response == "Test response"
+    assert mock_transport.post.call_count == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_cache_is_per_endpoint(mock_transport, tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache"))
+    mock_transport.post.return_value.json.return_value = {"content": [{"text": "Test response"}]}
+
+    Chat(None, cache=cache).get_response("Test prompt")
+    local = Chat(None, cache=cache)
+    local.api_url = "http://localhost:8080/v1/messages"
+    local.get_response("Test prompt")
+
+    assert mock_transport.post.call_count == 2
+
+@pytest.mark.parametrize("merge, expected", [
+    ("append", ["A", "RE:A", "B", "RE:B"]),
+    ("replace", ["B", "RE:B"]),
+])
+def test_merge_policy(mock_transport, tmp_path, merge, expected):
+    session_file = str(tmp_path / "session")
+    mock_transport.post.side_effect = lambda url, json, **kwargs: MagicMock(
+        **{"json.return_value": {"content": [{"text": "RE:" + json["messages"][-1]["content"]}]}})
+    first = Chat(session_file)
+    second = Chat(session_file, merge=merge)
+    first.messages, second.messages
+
+    first.get_response("A")
+    second.get_response("B")
+
+    assert [m["content"] for m in Chat(session_file).messages] == expected
+    assert [m["content"] for m in second.messages] == expected
+
+def test_prompt_cache_marks_last_two_user_turns(mock_transport, tmp_path):
+    chat = Chat(str(tmp_path / "session"), prompt_cache=True)
+    chat.messages = [
+        {"role": "user", "content": "One"}, {"role": "assistant", "content": "1"},
+        {"role": "user", "content": "Two"}, {"role": "assistant", "content": "2"},
+    ]
+    mock_transport.post.return_value.json.return_value = {"content": [{"text": "3"}]}
+
+    chat.get_response("Three")
+
+    messages = mock_transport.post.call_args.kwargs["json"]["messages"]
+    assert messages[0] == {"role": "user", "content": "One"}
+    assert messages[2]["content"] == [{"type": "text", "text": "Two", "cache_control": {"type": "ephemeral"}}]
+    assert messages[4]["content"] == [{"type": "text", "text": "Three", "cache_control": {"type": "ephemeral"}}]
+    # The marks are added to the request only, not to the stored history.
+    assert Chat(chat.session_file).messages[4] == {"role": "user", "content": "Three"}
+
+def test_prompt_cache_keeps_payload_mark_only_on_newest_turn(mock_transport, tmp_path):
+    chat = Chat(str(tmp_path / "session"), prompt_cache=True)
+    payload = [{"type": "text", "text": "big input", "cache_control": {"type": "ephemeral"}}, {"type": "text", "text": "Summarize"}]
+    mock_transport.post.return_value.json.return_value = {"content": [{"text": "Done"}]}
+
+    chat.get_response(payload)
+    chat.get_response("Thanks")
+    chat.get_response("Again")
+
+    messages = mock_transport.post.call_args.kwargs["json"]["messages"]
+    assert "cache_control" not in messages[0]["content"][0]
+    assert Chat(chat.session_file).messages[0]["content"] == payload
+    assert sum("cache_control" in block for m in messages if isinstance(m["content"], list) for block in m["content"]) == 2
+
+def test_prompt_cache_usage_from_stub(tmp_path):
+    with StubAPI() as api:
+        chat = Chat(str(tmp_path / "session"), prompt_cache=True)
+        chat.api_url = api.url
+        chat.get_response("x" * 5000)
+        assert chat.last_usage["cache_creation_input_tokens"] > 0
+        assert chat.last_usage["cache_read_input_tokens"] == 0
+
+        list(chat.stream_response("And again"))
+
+    assert chat.last_usage["cache_read_input_tokens"] >= 1250
+    assert chat.last_usage["output_tokens"] > 0
+
+def test_last_timings_are_the_chats_own(mock_transport, tmp_path):
+    response = MagicMock()
+    response.json.return_value = {"content": [{"text": "Hi"}]}
+    response.timings = {"reused": True, "total": 0.1}
+    mock_transport.post.return_value = response
+    # Another chat's request on the shared transport.
+    mock_transport.last_timings = {"reused": False, "total": 2.0}
+
+    chat = Chat(str(tmp_path / "session"))
+    chat.get_response("Hello")
+
+    assert chat.last_timings == {"reused": True, "total": 0.1}
@@ -25,7 +25,7 @@ def test_process_command_without_cat(mock_chat):
 
 def test_main_with_prompt(mock_chat, monkeypatch, capsys):
     monkeypatch.setattr('sys.argv', ['rodeo-cli', 'Hello, World!'])
-    monkeypatch.setattr('src.rodeo.cli.Chat', lambda _: mock_chat)
+    monkeypatch.setattr('src.rodeo.cli.Chat', lambda *args, **kwargs: mock_chat)
     mock_chat.get_response.return_value = "Bonjour le monde!"
 
     from src.rodeo.cli import main
@@ -36,7 +36,7 @@ def test_main_with_prompt(mock_chat, monkeypatch, capsys):
 
 def test_main_with_piped_input(mock_chat, monkeypatch, capsys):
     monkeypatch.setattr('sys.argv', ['rodeo-cli'])
-    monkeypatch.setattr('src.rodeo.cli.Chat', lambda _: mock_chat)
+    monkeypatch.setattr('src.rodeo.cli.Chat', lambda *args, **kwargs: mock_chat)
     monkeypatch.setattr('sys.stdin.isatty', lambda: False)
     monkeypatch.setattr('sys.stdin.read', lambda: 'Hello, World!')
     mock_chat.get_response.return_value = "Bonjour le monde!"
@@ -46,3 +46,33 @@ def test_main_with_piped_input(mock_chat, monkeypatch, capsys):
 
     captured = capsys.readouterr()
     assert captured.out.strip() == "Bonjour le monde!"
+
+def test_main_with_stream(mock_chat, monkeypatch, capsys):
+    monkeypatch.setattr('sys.argv', ['rodeo-cli', '--stream', 'Hello, World!'])
+    monkeypatch.setattr('src.rodeo.cli.Chat', lambda *args, **kwargs: mock_chat)
+    mock_chat.stream_response.return_value = iter(["Bonjour ", "le monde!"])
+
+    from src.rodeo.cli import main
+    main()
+
+    captured = capsys.readouterr()
+    assert captured.out == "Bonjour le monde!\n"
+    mock_chat.stream_response.assert_called_once_with("Hello, World!")
+
+def test_build_content_marks_large_input():
+    from src.rodeo.cli import build_content
+    text = "x" * 5000
+
+    assert build_content("Summarize: $(cat)", "short", cache_input=True) == "Summarize: short"
+    assert build_content("Summarize: $(cat)", text) == "Summarize: " + text
+    assert build_content("Summarize: $(cat) in French", text, cache_input=True) == [
+        {"type": "text", "text": "Summarize: "},
+        {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": " in French"},
+    ]
+
+def test_format_usage():
+    from src.rodeo.cli import format_usage
+    usage = {"input_tokens": 12, "output_tokens": 5, "cache_read_input_tokens": 4000, "cache_creation_input_tokens": None}
+
+    assert format_usage(usage) == "usage: input=12 output=5 cache_read=4000 cache_write=0"
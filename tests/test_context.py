@@ -0,0 +1,66 @@
+import pytest
+import src.rodeo.context as context
+from src.rodeo.chat import Chat
+from src.rodeo.context import ContextWindow
+from src.rodeo.providers import StubProvider
+
+def turns(n, size=40):
+    messages = []
+    for i in range(n):
+        messages.append({"role": "user", "content": "u" * size})
+        messages.append({"role": "assistant", "content": "a" * size})
+    return messages
+
+def test_estimate_tokens_is_cached():
+    window = ContextWindow(100)
+    message = {"role": "user", "content": "x" * 40}
+
+    assert window.estimate_tokens(message) == 14
+    message["content"] = ""
+    assert window.estimate_tokens(message) == 14
+
+def test_token_count_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(context, "MAX_CACHED_COUNTS", 3)
+    window = ContextWindow(100)
+    messages = turns(5)
+    for message in messages:
+        window.estimate_tokens(message)
+
+    assert [entry[0] for entry in window._token_counts.values()] == messages[-3:]
+
+def test_replaced_history_drops_cached_counts(tmp_path):
+    chat = Chat(str(tmp_path / "session"), context=ContextWindow(100), provider=StubProvider())
+    chat.get_response("hello")
+    assert chat.context._token_counts
+
+    chat.clear_session()
+    assert not chat.context._token_counts
+    chat.get_response("hello")
+    chat.messages = []
+    assert not chat.context._token_counts
+
+def test_window_start_fits_budget():
+    window = ContextWindow(60)
+    messages = turns(5) + [{"role": "user", "content": "new"}]
+
+    start = window.window_start(messages)
+
+    assert start == 6
+    assert messages[start]["role"] == "user"
+    assert sum(window.estimate_tokens(m) for m in messages[start:]) <= 60
+
+def test_window_always_keeps_last_message():
+    window = ContextWindow(1)
+    messages = turns(2) + [{"role": "user", "content": "x" * 400}]
+
+    assert window.window_start(messages) == 4
+
+def test_window_starts_on_user_turn():
+    window = ContextWindow(20)
+    messages = turns(3) + [{"role": "user", "content": "new"}]
+
+    assert window.window_start(messages) == 6
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        ContextWindow(100, strategy="forget")
@@ -0,0 +1,130 @@
+import io
+import os
+import threading
+import pytest
+from unittest.mock import MagicMock
+from src.rodeo.chat import Chat
+from src.rodeo.cli import build_parser, client_env
+from src.rodeo.daemon import ChatPool, forward, serve, stop
+
+class EchoTransport:
+    timeout = (10.0, 600.0)
+    last_timings = None
+
+    def __init__(self):
+        self.calls = 0
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def post(self, url, json=None, headers=None, **kwargs):
+        with self.lock:
+            self.calls += 1
+            self.requests.append((json, headers))
+        response = MagicMock()
+        response.status_code = 200
+        response.timings = {"reused": True, "total": 0.0}
+        response.json.return_value = {"content": [{"text": json["messages"][-1]["content"].upper()}]}
+        return response
+
+@pytest.fixture
+def daemon(tmp_path):
+    socket_path = str(tmp_path / "rodeo.sock")
+    transport = EchoTransport()
+    thread = threading.Thread(target=serve, args=(socket_path, ChatPool(transport)), daemon=True)
+    thread.start()
+    while not os.path.exists(socket_path):
+        threading.Event().wait(0.01)
+    yield socket_path, transport
+    stop(socket_path)
+    thread.join(5)
+
+def test_forward_returns_none_without_daemon(tmp_path):
+    assert forward(["hi"], None, str(tmp_path / "missing.sock")) is None
+
+def test_daemon_uses_the_clients_environment_and_directory(daemon, tmp_path):
+    socket_path, transport = daemon
+    (tmp_path / "config.json").write_text('{"max_tokens": 7}')
+    env = {"RODEO_CONFIG": "config.json", "RODEO_METRICS": "metrics.jsonl", "ANTHROPIC_API_KEY": "client key"}
+
+    assert forward(["--session", "session", "hi"], None, socket_path, out=io.StringIO(), env=env, cwd=str(tmp_path)) == 0
+
+    payload, headers = transport.requests[-1]
+    assert payload["max_tokens"] == 7
+    assert headers["x-api-key"] == "client key"
+    assert (tmp_path / "metrics.jsonl").exists() and (tmp_path / "session").exists()
+
+def test_daemon_serves_prompts(daemon, tmp_path):
+    socket_path, transport = daemon
+    session = str(tmp_path / "session")
+    out = io.StringIO()
+
+    assert forward(["--session", session, "hello"], None, socket_path, out=out) == 0
+    assert forward(["--session", session, "again"], None, socket_path, out=out) == 0
+
+    assert out.getvalue() == "HELLO\nAGAIN\n"
+    assert len(Chat(session).messages) == 4
+
+def test_daemon_passes_piped_input(daemon, tmp_path):
+    socket_path, _ = daemon
+    out = io.StringIO()
+
+    assert forward(["--session", str(tmp_path / "session")], "piped text\n", socket_path, out=out) == 0
+    assert out.getvalue() == "PIPED TEXT\n"
+
+def test_daemon_usage_error(daemon, tmp_path):
+    socket_path, _ = daemon
+    out = io.StringIO()
+
+    assert forward(["--session", str(tmp_path / "session")], None, socket_path, out=out) == 1
+    assert out.getvalue().startswith("Usage:")
+
+def test_concurrent_clients_share_session(daemon, tmp_path):
+    socket_path, transport = daemon
+    session = str(tmp_path / "session")
+    threads = [
+        threading.Thread(target=forward, args=(["--session", session, f"p{i}"], None, socket_path), kwargs={"out": io.StringIO()})
+        for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    messages = Chat(session).messages
+    assert len(messages) == 16
+    assert [m["role"] for m in messages] == ["user", "assistant"] * 8
+    assert transport.calls == 8
+
+def test_daemon_sees_changes_from_other_processes(daemon, tmp_path):
+    socket_path, _ = daemon
+    session = str(tmp_path / "session")
+    forward(["--session", session, "hello"], None, socket_path, out=io.StringIO())
+
+    Chat(session).clear_session()
+    forward(["--session", session, "again"], None, socket_path, out=io.StringIO())
+
+    assert [m["content"] for m in Chat(session).messages] == ["again", "AGAIN"]
+
+def test_daemon_socket_is_private(daemon):
+    socket_path, _ = daemon
+
+    assert os.stat(socket_path).st_mode & 0o777 == 0o600
+
+def test_daemon_refuses_other_users(daemon, tmp_path, monkeypatch):
+    socket_path, transport = daemon
+    err = io.StringIO()
+    uid = os.getuid()
+    monkeypatch.setattr(os, "getuid", lambda: uid + 1)
+
+    assert forward(["--session", str(tmp_path / "session"), "hi"], None, socket_path, out=io.StringIO(), err=err) == 1
+
+    assert transport.calls == 0
+    assert "lost connection" in err.getvalue()
+
+def test_client_sends_only_the_variables_it_reads(tmp_path):
+    (tmp_path / "config.json").write_text('{"providers": {"local": {"type": "openai", "api_key_env": "LOCAL_KEY"}}}')
+    env = {"RODEO_CONFIG": "config.json", "ANTHROPIC_API_KEY": "a", "LOCAL_KEY": "l", "AWS_SECRET_ACCESS_KEY": "s", "PATH": "/bin"}
+
+    sent = client_env(build_parser().parse_args(["hi"]), env, str(tmp_path))
+
+    assert sent == {"RODEO_CONFIG": "config.json", "ANTHROPIC_API_KEY": "a", "LOCAL_KEY": "l"}
@@ -0,0 +1,101 @@
+import json
+import time
+import pytest
+from src.rodeo.chat import Chat
+from src.rodeo.evaluate import EvalCase, Evaluator, load_cases, main, parse_score, summarize
+from src.rodeo.cache import ResponseCache
+from tests.stub_server import StubAPI, default_reply
+
+def reply(payload):
+    """Answer prompts by upper-casing them; judge them 0.9 if the response says GOOD, else 0.2."""
+    text = default_reply(payload)
+    if "ON A SCALE OF 0 TO 1" in text:
+        if "NO SCORE" in text:
+            return "I cannot say."
+        return "0.9" if "ACTUAL RESPONSE: GOOD" in text else "0.2"
+    return text
+
+@pytest.fixture
+def api():
+    with StubAPI(reply=reply, latency=0.1) as api:
+        yield api
+
+def make_evaluator(api, cache=None, jobs=8):
+    def make_chat():
+        chat = Chat(None)
+        chat.api_url = api.url
+        return chat
+    return Evaluator(make_chat, make_chat, cache=cache, jobs=jobs)
+
+def test_load_cases(tmp_path):
+    jsonl = tmp_path / "cases.jsonl"
+    jsonl.write_text('{"prompt": "a", "expected_outcome": "A"}\n\n{"prompt": "b", "expected_outcome": "B", "threshold": 0.9, "name": "bee"}\n')
+    yaml_file = tmp_path / "cases.yaml"
+    yaml_file.write_text("cases:\n  - prompt: c $(cat)\n    input: x\n    expected_outcome: C\n")
+
+    cases = load_cases(str(jsonl)) + load_cases(str(yaml_file))
+
+    assert [(c.name, c.prompt, c.threshold) for c in cases] == [("cases.jsonl:1", "a", 0.7), ("bee", "b", 0.9), ("cases.yaml:1", "c $(cat)", 0.7)]
+    assert cases[2].input == "x"
+    bad = tmp_path / "bad.jsonl"
+    bad.write_text('{"prompt": "no expectation"}\n')
+    with pytest.raises(ValueError):
+        load_cases(str(bad))
+
+def test_parse_score():
+    assert parse_score("0.85") == 0.85
+    assert parse_score("Score: 1") == 1.0
+    assert parse_score("7") == 1.0
+    assert parse_score("none") is None
+
+def test_cases_run_concurrently_in_isolated_sessions(api):
+    cases = [EvalCase(f"good {i}" if i % 2 else f"bad {i}", "says good", name=str(i)) for i in range(8)]
+
+    start = time.monotonic()
+    results = make_evaluator(api).run(cases)
+
+    # 16 requests of 0.1s each, two rounds deep when run in parallel.
+    assert time.monotonic() - start < 0.8
+    assert [r["name"] for r in results] == [str(i) for i in range(8)]
+    assert [r["passed"] for r in results] == [i % 2 == 1 for i in range(8)]
+    generations = [p for p in api.requests if "scale of 0 to 1" not in p["messages"][-1]["content"]]
+    assert all(len(p["messages"]) == 1 for p in api.requests) and len(generations) == 8
+
+def test_judgements_are_cached(api, tmp_path):
+    cases = [EvalCase("good", "says good"), EvalCase("bad", "says good")]
+    cache = ResponseCache(str(tmp_path / "judge"))
+
+    first = make_evaluator(api, cache).run(cases)
+    second = make_evaluator(api, ResponseCache(str(tmp_path / "judge"))).run(cases)
+
+    assert len(api.requests) == 6
+    assert [r["score"] for r in second] == [r["score"] for r in first] == [0.9, 0.2]
+    assert [r["judge_cached"] for r in second] == [True, True]
+
+def test_errors_are_reported_per_case(api):
+    api.faults = [(400, {})]
+    results = make_evaluator(api, jobs=1).run([EvalCase("good", "x"), EvalCase("no score", "x"), EvalCase("good", "x")])
+
+    assert ["error" in r for r in results] == [True, True, False]
+    assert "without a score" in results[1]["error"]
+    summary = summarize(results, 1.0)
+    assert (summary["cases"], summary["passed"], summary["failed"], summary["errors"]) == (3, 1, 0, 2)
+    assert summary["mean_score"] == 0.9
+
+def test_eval_command(api, tmp_path):
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({"providers": {"local": {"type": "anthropic", "url": api.url}}}))
+    cases = tmp_path / "cases.jsonl"
+    cases.write_text("".join(json.dumps({"prompt": p, "expected_outcome": "good"}) + "\n" for p in ["good", "good: $(cat)", "bad"]))
+    args = [str(cases), "--config", str(config), "--provider", "local", "--judge-cache", str(tmp_path / "judge")]
+
+    report = tmp_path / "report.json"
+    with open(report, "w") as out:
+        assert main(args + ["--json", "--output", str(tmp_path / "results.jsonl")], out=out) == 1
+    summary = json.loads(report.read_text())["summary"]
+    assert (summary["cases"], summary["passed"], summary["failed"]) == (3, 2, 1)
+    assert len((tmp_path / "results.jsonl").read_text().splitlines()) == 3
+
+    with open(tmp_path / "again.txt", "w") as out:
+        main(args, out=out)
+    assert "3 cached judgements" in (tmp_path / "again.txt").read_text()
@@ -0,0 +1,92 @@
+import io
+import json
+import time
+import pytest
+from src.rodeo.fanout import FanOut, collect_files, main, read_done
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for i in range(6):
+        path = tmp_path / f"file{i}.txt"
+        path.write_text(f"contents of file {i}")
+        paths.append(str(path))
+    return paths
+
+@pytest.fixture
+def config(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"providers": {"slow": {"type": "stub", "latency": 0.2}}}))
+    return str(path)
+
+def rodeo_map(*argv, stdin=""):
+    out, err = io.StringIO(), io.StringIO()
+    status = main(list(argv), stdin=io.StringIO(stdin), out=out, err=err)
+    return status, out.getvalue(), err.getvalue()
+
+def test_collect_files(tmp_path, files):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "deep.txt").write_text("x")
+
+    assert collect_files([files[1]], [str(tmp_path / "*.txt")]) == [files[1], files[0]] + files[2:]
+    assert collect_files(patterns=[str(tmp_path / "**" / "deep.txt")]) == [str(tmp_path / "sub" / "deep.txt")]
+    assert collect_files(stream=io.StringIO(f"{files[0]}\n\n{files[0]}\n{tmp_path}\n")) == [files[0]]
+
+def test_map_runs_files_in_parallel(files, config):
+    start = time.monotonic()
+    status, out, err = rodeo_map("Summarize: $(cat)", *files, "--provider", "slow", "--config", config, "--jobs", "6")
+
+    assert status == 0
+    assert time.monotonic() - start < 0.2 * len(files) / 2
+    for i, path in enumerate(files):
+        assert f"==> {path} <==\nSUMMARIZE: CONTENTS OF FILE {i}\n" in out
+    assert "Processed 6 files (0 errors)" in err
+
+def test_map_ordered_json_from_piped_names(files, config):
+    status, out, _ = rodeo_map("Name the file", "--provider", "stub", "--ordered", "--json", stdin="\n".join(files))
+
+    results = [json.loads(line) for line in out.splitlines()]
+    assert [r["file"] for r in results] == files
+    assert results[0]["response"] == "NAME THE FILE\n\nCONTENTS OF FILE 0"
+
+def test_map_skips_empty_files(tmp_path, files):
+    empty = tmp_path / "empty.txt"
+    empty.write_text("\n")
+
+    status, out, err = rodeo_map("Summarize: $(cat)", files[0], str(empty), "--provider", "stub", "--ordered")
+
+    assert status == 0
+    assert f"==> {empty} <== skipped: empty file" in out
+    assert "$(CAT)" not in out
+    assert "(0 errors, 1 empty files skipped)" in err
+
+def test_map_resumes_from_output(tmp_path, files):
+    output = str(tmp_path / "results.jsonl")
+    missing = str(tmp_path / "missing.txt")
+    status, _, _ = rodeo_map("$(cat)", *files[:3], missing, "--provider", "stub", "--output", output)
+    assert status == 1
+    with open(output, 'a') as f:
+        f.write('{"file": "torn')
+
+    status, out, err = rodeo_map("$(cat)", *files, "--provider", "stub", "--output", output)
+
+    assert status == 0
+    assert "Skipping 3 files" in err
+    assert "Processed 3 files" in err
+    assert files[0] not in out and files[3] in out
+    assert read_done(output, "$(cat)") == set(files)
+    assert read_done(output, "another prompt") == set()
+
+def test_fan_out_cancels_pending_files_when_abandoned(files):
+    started = []
+
+    def make_chat():
+        started.append(1)
+        from src.rodeo.chat import Chat
+        from src.rodeo.providers import StubProvider
+        return Chat(None, provider=StubProvider(latency=0.1))
+
+    results = FanOut("$(cat)", make_chat, jobs=1).run(files)
+    next(results)
+    results.close()
+    assert len(started) < len(files)
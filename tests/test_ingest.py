@@ -0,0 +1,113 @@
+import io
+import threading
+from unittest.mock import MagicMock
+from src.rodeo.chat import Chat
+from src.rodeo.ingest import ChunkedRun, iter_chunks
+
+class CountingTransport:
+    """Answers map prompts with the number of lines they contain and reduce prompts with their part count."""
+
+    def __init__(self):
+        self.prompts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.last_timings = None
+
+    def post(self, url, json=None, **kwargs):
+        prompt = json["messages"][-1]["content"]
+        with self.lock:
+            self.prompts.append(prompt)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            threading.Event().wait(0.01)
+            if prompt.startswith("A long input"):
+                text = f"combined {prompt.count('Part ')} parts"
+            else:
+                text = f"{prompt.count('log line')} lines"
+            response = MagicMock()
+            response.json.return_value = {"content": [{"text": text}]}
+            return response
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+class TrackingStream(io.StringIO):
+    """Records how far ahead of the consumer the stream has been read."""
+
+    def __init__(self, text):
+        super().__init__(text)
+        self.reads = 0
+
+    def readline(self, size=-1):
+        self.reads += 1
+        return super().readline(size)
+
+def test_chunks_end_on_line_boundaries():
+    lines = [f"line {i:03d}\n" for i in range(100)]
+    chunks = list(iter_chunks(io.StringIO("".join(lines)), max_tokens=10))
+
+    assert "".join(chunks) == "".join(lines)
+    assert all(len(c) <= 40 and c.endswith("\n") for c in chunks)
+
+def test_long_line_is_split():
+    chunks = list(iter_chunks(io.StringIO("x" * 100), max_tokens=10))
+
+    assert chunks == ["x" * 40, "x" * 40, "x" * 20]
+
+def test_chunks_are_read_lazily():
+    stream = TrackingStream("log line\n" * 1000)
+    chunks = iter_chunks(stream, max_tokens=25)
+
+    next(chunks)
+    assert stream.reads <= 12
+
+def test_small_input_uses_single_request():
+    transport = CountingTransport()
+    chat = Chat(None, transport=transport)
+
+    answer = ChunkedRun(chat, chunk_tokens=1000).run("Count: $(cat)", io.StringIO("log line\nlog line\n"))
+
+    assert answer == "2 lines"
+    assert transport.prompts == ["Count: log line\nlog line"]
+    assert len(chat.messages) == 2
+
+def test_map_reduce_over_chunks():
+    transport = CountingTransport()
+    chat = Chat(None, transport=transport)
+    runner = ChunkedRun(chat, chunk_tokens=25, jobs=3)
+
+    answer = runner.run("Count them", io.StringIO("log line\n" * 100))
+
+    assert runner.chunks == 10
+    assert answer == "combined 10 parts"
+    assert transport.max_in_flight <= 3
+    map_prompts = [p for p in transport.prompts if not p.startswith("A long input")]
+    assert sum(p.count("log line") for p in map_prompts) == 100
+    # Only the final combination is recorded in the session.
+    assert chat.messages[-1] == {"role": "assistant", "content": "combined 10 parts"}
+    assert len(chat.messages) == 2
+
+def test_partial_answers_are_folded_when_they_outgrow_the_budget():
+    transport = CountingTransport()
+    chat = Chat(None, transport=transport)
+
+    answer = ChunkedRun(chat, chunk_tokens=3, jobs=2).run("Count", io.StringIO("log line\n" * 20))
+
+    reduces = [p for p in transport.prompts if p.startswith("A long input")]
+    assert len(reduces) > 1
+    assert answer.startswith("combined")
+
+def test_main_chunked(monkeypatch, capsys):
+    transport = CountingTransport()
+    monkeypatch.setattr('sys.argv', ['rodeo-cli', '--chunked', '--chunk-tokens', '25', '--no-daemon', 'Count'])
+    monkeypatch.setattr('src.rodeo.cli.Chat', lambda *args, **kwargs: Chat(None, transport=transport))
+    monkeypatch.setattr('sys.stdin', io.StringIO("log line\n" * 30))
+
+    from src.rodeo.cli import main
+    main()
+
+    captured = capsys.readouterr()
+    assert captured.out.strip() == "combined 3 parts"
+    assert "3 chunks" in captured.err
@@ -0,0 +1,94 @@
+import json
+import pytest
+# The package's own modules import rodeo.messages (not src.rodeo.messages),
+# so these tests use the same module to compare Message types.
+from rodeo import messages as messages_module
+from rodeo.chat import Chat
+from rodeo.messages import Message, dumps, encode_message, encode_request, loads_lines
+from rodeo.session_log import SessionLog
+from tests.stub_server import StubAPI
+
+def test_message_behaves_like_its_dict():
+    message = Message("user", "Hi")
+
+    assert message == {"role": "user", "content": "Hi"} and {"role": "user", "content": "Hi"} == message
+    assert message != {"role": "user", "content": "Hi", "extra": 1}
+    assert message["content"] == "Hi" and message.get("missing") is None and "meta" not in message
+    assert dict(message, content="Bye") == {"role": "user", "content": "Bye"}
+    assert json.dumps(message, default=dict) == json.dumps({"role": "user", "content": "Hi"})
+    with pytest.raises(TypeError):
+        message["content"] = "changed"
+    with pytest.raises(AttributeError):
+        message.extra = 1
+
+def test_message_encoding_is_cached():
+    message = Message("user", "Héllo")
+
+    assert json.loads(message.json()) == {"role": "user", "content": "Héllo"}
+    assert message.json() is message.json()
+    assert Message.coerce({"role": "user", "content": "x"}) == Message("user", "x")
+    assert type(Message.coerce({"role": "user", "content": "x", "name": "n"})) is dict
+
+def test_encode_request_reuses_message_encodings():
+    cached = Message("user", "old", b'{"role":"user","content":"old"}')
+    body = {"model": "m", "messages": [cached, {"role": "assistant", "content": "plain"}], "max_tokens": 5}
+
+    assert json.loads(encode_request(body)) == json.loads(dumps(body))
+    assert encode_message(cached) is cached.json()
+
+def test_session_lines_become_message_encodings(tmp_path):
+    log = SessionLog(str(tmp_path / "session"))
+    log.append([{"role": "user", "content": "Hi"}, {"role": "assistant", "content": [{"type": "text", "text": "Hello"}]}])
+    log.update_meta(summary="s")
+
+    loaded = log.load()
+
+    assert all(isinstance(m, Message) for m in loaded)
+    with open(log.path, 'rb') as f:
+        lines = f.read().splitlines()
+    assert [m.json() for m in loaded] == lines[1:3]
+    assert log.meta() == {"summary": "s"}
+
+def test_loads_lines_rejects_torn_lines():
+    assert loads_lines([b'{"a":1}', b'[2]']) == [{"a": 1}, [2]]
+    with pytest.raises(ValueError):
+        loads_lines([b'{"role":"user","content":"torn', b'{"a":1}'])
+
+def test_torn_line_is_skipped(tmp_path):
+    path = tmp_path / "session"
+    log = SessionLog(str(path))
+    log.append([{"role": "user", "content": "Hi"}])
+    with open(path, 'ab') as f:
+        f.write(b'{"role":"assistant","content":"Hel')
+    log.append([{"role": "user", "content": "Again"}])
+
+    assert log.load() == [{"role": "user", "content": "Hi"}, {"role": "user", "content": "Again"}]
+
+def test_orjson_is_only_loaded_for_large_json(monkeypatch):
+    pytest.importorskip("orjson")
+    monkeypatch.setattr(messages_module, "_orjson", None)
+
+    assert not messages_module.use_orjson(100)
+    assert messages_module.use_orjson(messages_module.ORJSON_MIN_BYTES)
+    assert json.loads(dumps({"role": "user", "content": "é"})) == {"role": "user", "content": "é"}
+    assert loads_lines([b'{"a":1}']) == [{"a": 1}]
+
+def test_turns_are_sent_and_saved_from_cached_encodings(tmp_path, monkeypatch):
+    session = str(tmp_path / "session")
+    with StubAPI() as api:
+        chat = Chat(session)
+        chat.api_url = api.url
+        chat.get_response("one")
+        chat = Chat(session)
+        chat.api_url = api.url
+
+        encoded = []
+        original = messages_module.Message.json
+        monkeypatch.setattr(messages_module.Message, "json", lambda self: encoded.append(self._json is None) or original(self))
+        chat.get_response("two")
+
+    # Only the new user turn (for the request) and the reply (for the session file) are encoded.
+    assert encoded.count(True) == 2
+    assert api.requests[-1]["messages"] == [{"role": "user", "content": c} for c in ("one",)] + \
+        [{"role": "assistant", "content": "ONE"}, {"role": "user", "content": "two"}]
+    assert [m["content"] for m in Chat(session).messages] == ["one", "ONE", "two", "TWO"]
@@ -0,0 +1,146 @@
+import io
+import json
+import time
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.rodeo.chat import Chat
+from src.rodeo.providers import (AnthropicProvider, OpenAIProvider, StubProvider, load_config, make_provider, route)
+
+class OpenAIHandler(BaseHTTPRequestHandler):
+    """A minimal OpenAI chat completions server replying with the upper-cased prompt."""
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((dict(self.headers), payload))
+        text = payload["messages"][-1]["content"].upper()
+        usage = {"prompt_tokens": 7, "completion_tokens": 2, "prompt_tokens_details": {"cached_tokens": 4}}
+        if payload.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            chunks = [{"choices": [{"delta": {"content": text[:3]}}]},
+                      {"choices": [{"delta": {"content": text[3:]}, "finish_reason": "stop"}]},
+                      {"choices": [], "usage": usage}]
+            for chunk in chunks:
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+        body = json.dumps({"choices": [{"message": {"role": "assistant", "content": text}, "finish_reason": "length"}],
+                           "usage": usage}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def openai_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OpenAIHandler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_stub_provider_answers_in_process(tmp_path):
+    chat = Chat(str(tmp_path / "session"), provider=StubProvider(latency=0.05))
+
+    start = time.monotonic()
+    assert chat.get_response("hello") == "HELLO"
+    assert time.monotonic() - start >= 0.05
+    assert chat.model == "stub"
+    assert chat.last_usage["output_tokens"] > 0
+    assert "".join(chat.stream_response("again")) == "AGAIN"
+    assert [m["content"] for m in Chat(chat.session_file).messages] == ["hello", "HELLO", "again", "AGAIN"]
+
+def test_stub_provider_streams_at_configured_pace():
+    chat = Chat(None, provider=StubProvider(tokens_per_second=100, reply=lambda payload: "x" * 40))
+
+    start = time.monotonic()
+    assert "".join(chat.stream_response("hello")) == "x" * 40
+    assert time.monotonic() - start >= 0.1
+
+def test_openai_provider_round_trip(openai_server):
+    url = f"http://127.0.0.1:{openai_server.server_port}/v1/chat/completions"
+    chat = Chat(None, provider=OpenAIProvider(url=url, default_model="local-model"), max_tokens=50)
+
+    assert chat.get_response("hello") == "HELLO"
+    assert chat.last_usage == {"input_tokens": 7, "output_tokens": 2, "cache_read_input_tokens": 4}
+    assert "".join(chat.stream_response("more")) == "MORE"
+
+    headers, payload = openai_server.requests[0]
+    assert payload == {"model": "local-model", "messages": [{"role": "user", "content": "hello"}], "max_tokens": 50}
+    assert "x-api-key" not in {k.lower() for k in headers}
+    assert openai_server.requests[1][1]["stream_options"] == {"include_usage": True}
+    assert [m["content"] for m in chat.messages] == ["hello", "HELLO", "more", "MORE"]
+
+def test_openai_prepare_flattens_system_and_blocks():
+    payload = {
+        "model": "m", "max_tokens": 10,
+        "system": [{"type": "text", "text": "Be brief.", "cache_control": {"type": "ephemeral"}}],
+        "messages": [{"role": "user", "content": [{"type": "text", "text": "a"}, {"type": "text", "text": "b"}]}],
+    }
+    assert OpenAIProvider().prepare(payload)["messages"] == [
+        {"role": "system", "content": "Be brief."}, {"role": "user", "content": "ab"}]
+    assert OpenAIProvider().parse({"choices": [{"message": {"content": None}, "finish_reason": "length"}]}) == {
+        "content": [{"type": "text", "text": ""}], "stop_reason": "max_tokens",
+        "usage": {"input_tokens": 0, "output_tokens": 0}}
+
+def test_make_provider_from_config():
+    config = {
+        "provider": "local",
+        "providers": {"local": {"type": "openai", "url": "http://localhost:8080/v1/chat/completions", "default_model": "llama"},
+                      "fake": {"type": "stub", "latency": 0.5}},
+    }
+
+    local = make_provider(None, config)
+    assert isinstance(local, OpenAIProvider)
+    assert (local.url, local.default_model) == ("http://localhost:8080/v1/chat/completions", "llama")
+    assert make_provider("fake", config).latency == 0.5
+    assert isinstance(make_provider(), AnthropicProvider)
+    with pytest.raises(ValueError):
+        make_provider("nope", config)
+
+def test_route_picks_first_matching_rule():
+    config = {"routes": [{"max_chars": 10, "model": "small"}, {"max_chars": 100, "model": "medium"}]}
+
+    assert route(config, "short")["model"] == "small"
+    assert route(config, [{"type": "text", "text": "x" * 50}])["model"] == "medium"
+    assert route(config, "x" * 500) is None
+    assert route({}, "short") is None
+
+def test_load_config(tmp_path, monkeypatch):
+    path = tmp_path / "config.json"
+    assert load_config(str(path)) == {}
+
+    path.write_text('{"provider": "stub"}')
+    monkeypatch.setenv("RODEO_CONFIG", str(path))
+    assert load_config() == {"provider": "stub"}
+
+    path.write_text('{"provider": ')
+    with pytest.raises(ValueError):
+        load_config()
+
+def test_cli_with_stub_provider_and_routes(tmp_path):
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({
+        "providers": {"fast": {"type": "stub", "default_model": "stub-fast"}},
+        "routes": [{"max_chars": 20, "provider": "fast"}],
+    }))
+    session = str(tmp_path / "session")
+    from src.rodeo.cli import build_parser, run
+
+    def rodeo(*argv):
+        out = io.StringIO()
+        args = build_parser().parse_args(["--session", session, "--metrics", str(tmp_path / "m.jsonl"), *argv])
+        assert not run(args, stdin=io.StringIO(), out=out)
+        return out.getvalue().strip()
+
+    assert rodeo("--provider", "stub", "hi there") == "HI THERE"
+    assert rodeo("--config", str(config), "short") == "SHORT"
+    models = [json.loads(line)["model"] for line in open(tmp_path / "m.jsonl")]
+    assert models == ["stub", "stub-fast"]
@@ -0,0 +1,153 @@
+import os
+import time
+import threading
+import multiprocessing
+import pytest
+import src.rodeo.ratelimit as ratelimit
+from src.rodeo.chat import Chat
+from src.rodeo.cli import build_parser, make_rate_limit
+from src.rodeo.providers import StubProvider
+from src.rodeo.ratelimit import RateLimiter, estimate_tokens
+from src.rodeo.retry import RetryPolicy
+from tests.stub_server import StubAPI
+
+KEY = "test"
+
+@pytest.fixture(autouse=True)
+def fast_window(monkeypatch):
+    # Limits refill over one second instead of a minute.
+    monkeypatch.setattr(ratelimit, "WINDOW", 1.0)
+
+class Response:
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+def timed(call, *args):
+    start = time.monotonic()
+    call(*args)
+    return time.monotonic() - start
+
+def test_requests_wait_for_the_bucket_to_refill(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "state.json"), requests_per_minute=10)
+    assert timed(lambda: [limiter.acquire(KEY, 0) for _ in range(10)]) < 0.05
+    assert 0.07 <= timed(limiter.acquire, KEY, 0) < 0.3
+    assert limiter.waits == 1
+
+def test_tokens_are_limited_and_output_tokens_spent(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "state.json"), tokens_per_minute=1000)
+    limiter.acquire(KEY, 700)
+    limiter.spend(KEY, 300)
+    assert 0.15 <= timed(limiter.acquire, KEY, 200) < 0.4
+
+def test_batch_calls_leave_a_reserve_for_interactive_ones(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "state.json"), tokens_per_minute=1000)
+    limiter.acquire(KEY, 750, "batch")
+    # Another 100 would take the batch class into the 20% reserve...
+    assert timed(limiter.acquire, KEY, 100, "batch") >= 0.04
+    # ...which an interactive call may use at once.
+    assert timed(limiter.acquire, KEY, 200) < 0.03
+
+def test_waiting_interactive_calls_go_first(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "state.json"), tokens_per_minute=1000)
+    limiter.acquire(KEY, 500)
+    order = []
+    # Larger than the bucket: waits until it is full again.
+    interactive = threading.Thread(target=lambda: (limiter.acquire(KEY, 1200), order.append("interactive")))
+    interactive.start()
+    time.sleep(0.1)
+    limiter.acquire(KEY, 10, "batch")
+    order.append("batch")
+    interactive.join()
+    assert order == ["interactive", "batch"]
+
+def test_limits_are_learned_from_headers(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "state.json"))
+    assert timed(lambda: [limiter.acquire(KEY, 10 ** 6) for _ in range(20)]) < 0.1
+
+    limiter.observe(KEY, Response(headers={"anthropic-ratelimit-requests-limit": "50",
+                                           "anthropic-ratelimit-requests-remaining": "0",
+                                           "x-ratelimit-limit-tokens": "9000"}))
+    state = limiter.snapshot(KEY)
+    assert state["limits"] == {"requests": 50, "tokens": 9000}
+    assert state["levels"]["requests"] < 1
+    assert timed(limiter.acquire, KEY, 0) >= 0.01
+
+def test_rate_limited_response_pauses_every_caller(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "state.json"))
+    limiter.observe(KEY, Response(429, {"retry-after": "0.3"}))
+    other = RateLimiter(str(tmp_path / "state.json"))
+    assert 0.25 <= timed(other.acquire, KEY, 0) < 0.6
+
+def test_state_is_replaced_atomically(tmp_path, monkeypatch):
+    path = tmp_path / "state.json"
+    limiter = RateLimiter(str(path))
+    limiter.observe(KEY, Response(429, {"retry-after": "30", "anthropic-ratelimit-requests-limit": "50"}))
+
+    def interrupted(*args):
+        raise KeyboardInterrupt
+    # Interrupted while the new state is being encoded and written.
+    monkeypatch.setattr(ratelimit.json, "dump", interrupted)
+    monkeypatch.setattr(ratelimit.json, "dumps", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        limiter.acquire(KEY, 0)
+    monkeypatch.undo()
+
+    state = RateLimiter(str(path)).snapshot(KEY)
+    assert state["limits"]["requests"] == 50 and state["paused"] > 25
+
+def test_state_is_not_flushed_to_disk(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(os, "fsync", synced.append)
+    limiter = RateLimiter(str(tmp_path / "state.json"), requests_per_minute=10)
+
+    limiter.acquire(KEY, 0)
+    limiter.observe(KEY, Response(200, {"anthropic-ratelimit-requests-limit": "50"}))
+
+    assert synced == []
+    assert RateLimiter(str(tmp_path / "state.json")).snapshot(KEY)["limits"]["requests"] == 50
+
+def take(path, count):
+    limiter = RateLimiter(path, requests_per_minute=10)
+    for _ in range(count):
+        limiter.acquire(KEY, 0)
+
+def test_buckets_are_shared_between_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(ratelimit, "WINDOW", 60.0)
+    path = str(tmp_path / "state.json")
+    process = multiprocessing.get_context("fork").Process(target=take, args=(path, 8))
+    process.start()
+    process.join()
+
+    state = RateLimiter(path, requests_per_minute=10).snapshot(KEY)
+    assert 2 <= state["levels"]["requests"] < 2.5
+
+def test_chat_paces_its_calls(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "state.json"), tokens_per_minute=1000)
+    chat = Chat(None, provider=StubProvider(reply=lambda payload: "x" * 400), rate_limit=limiter, priority="batch")
+    chat.get_response("hello " * 100)
+
+    state = limiter.snapshot(chat._rate_key())
+    # The prompt's estimated 150 input tokens, then the 101 output tokens.
+    assert 740 < state["levels"]["tokens"] < 760
+    assert estimate_tokens({"system": "abcd", "messages": [{"role": "user", "content": "abcd" * 3}]}) == 4
+
+def test_chat_adapts_to_the_api(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "state.json"))
+    with StubAPI() as api:
+        api.response_headers = {"anthropic-ratelimit-requests-limit": "120"}
+        api.faults = [(429, {"retry-after": "0.2"})]
+        chat = Chat(None, rate_limit=limiter, retry=RetryPolicy(max_retries=1, base=0.01))
+        chat.api_url = api.url
+        start = time.monotonic()
+        assert chat.get_response("hi") == "HI"
+        assert time.monotonic() - start >= 0.2
+    assert limiter.snapshot(chat._rate_key())["limits"]["requests"] == 120
+
+def test_rate_limit_options(tmp_path):
+    parser = build_parser()
+    assert make_rate_limit(parser.parse_args(["hi"]), {}) is None
+    config = {"rate_limit": {"state": str(tmp_path / "state.json"), "tokens_per_minute": 5000}}
+    limiter = make_rate_limit(parser.parse_args(["--rpm", "50", "hi"]), config)
+    assert limiter.limits == {"requests": 50, "tokens": 5000}
+    assert parser.parse_args(["--priority", "batch", "hi"]).priority == "batch"
@@ -0,0 +1,95 @@
+import io
+import json
+import time
+import pytest
+from src.rodeo.chat import Chat
+from src.rodeo.cli import build_parser
+from src.rodeo.repl import BackgroundSaver, repl
+from src.rodeo.transport import Transport
+from tests.stub_server import StubAPI
+
+@pytest.fixture
+def api():
+    with StubAPI() as api:
+        yield api
+
+def run_repl(tmp_path, api, script, *argv):
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({"provider": "local", "providers": {"local": {"type": "anthropic", "url": api.url}}}))
+    args = build_parser().parse_args(["-i", "--session", str(tmp_path / "session"), "--config", str(config), *argv])
+    out, err = io.StringIO(), io.StringIO()
+    assert repl(args, stdin=io.StringIO(script), out=out, err=err) == 0
+    return out.getvalue(), err.getvalue()
+
+def test_repl_streams_each_turn_in_one_chat(tmp_path, api):
+    out, err = run_repl(tmp_path, api, "hello\nagain\n/history 1\n/stats\n")
+
+    assert out.splitlines()[:3] == ["HELLO", "AGAIN", "assistant: AGAIN"]
+    assert "turns: 2  messages: 4" in out
+    assert "retries: 0  hedges: 0" in out
+    assert err == ""
+    assert all(payload["stream"] for payload in api.requests)
+    assert [m["content"] for m in api.requests[1]["messages"]] == ["hello", "HELLO", "again"]
+    # Saved in the background, and flushed on exit.
+    assert [m["content"] for m in Chat(str(tmp_path / "session")).messages] == ["hello", "HELLO", "again", "AGAIN"]
+
+def test_repl_slash_commands(tmp_path, api):
+    other = tmp_path / "other"
+    out, err = run_repl(tmp_path, api, f"one\n/clear\n/session {other}\ntwo\n/session\n/bogus\n/exit\nnever sent\n")
+
+    lines = out.splitlines()
+    assert lines[:3] == ["ONE", "Session cleared.", f"Session: {other} (0 messages)"]
+    assert lines[3:5] == ["TWO", f"Session: {other} (2 messages)"]
+    assert "Unknown command: /bogus" in err
+    assert len(api.requests) == 2
+    assert Chat(str(tmp_path / "session")).messages == []
+    assert [m["content"] for m in Chat(str(other)).messages] == ["two", "TWO"]
+
+def test_repl_reports_failed_turns_and_continues(tmp_path, api):
+    api.faults = [(400, {})]
+    out, err = run_repl(tmp_path, api, "bad\ngood\n", "--retries", "0")
+
+    assert "Error:" in err
+    assert out.splitlines() == ["GOOD"]
+    assert [m["content"] for m in Chat(str(tmp_path / "session")).messages] == ["good", "GOOD"]
+
+def test_background_saver_does_not_block_schedule():
+    saves = []
+
+    def slow_save():
+        time.sleep(0.2)
+        saves.append(time.monotonic())
+
+    saver = BackgroundSaver(slow_save)
+    start = time.monotonic()
+    for _ in range(3):
+        saver.schedule()
+    assert time.monotonic() - start < 0.1
+    assert saver.flush()
+    # Saves requested while one was running were folded into one more.
+    assert 1 <= len(saves) <= 2
+    saver.close()
+
+def test_background_saver_keeps_the_last_error():
+    failures = [OSError("disk full")]
+
+    def save():
+        if failures:
+            raise failures.pop()
+
+    saver = BackgroundSaver(save)
+    saver.schedule()
+    saver.flush()
+    assert isinstance(saver.error, OSError)
+    saver.schedule()
+    saver.close()
+    assert saver.error is None
+
+def test_preconnect_warms_the_first_request(api):
+    transport = Transport()
+
+    assert transport.preconnect(api.url)
+    transport.post(api.url, json={"model": "m", "max_tokens": 10, "messages": [{"role": "user", "content": "hi"}]})
+    assert transport.last_timings["reused"] is True
+    assert not transport.preconnect("stub://local")
+    transport.close()
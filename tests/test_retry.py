@@ -0,0 +1,146 @@
+"""
+Fault-injection tests for the request layer, run against tests/stub_server.py.
+
+Each test scripts the stub's ``faults`` for the upcoming requests: None to
+answer normally, a number of seconds to stall, "drop" to close the
+connection, or a (status, headers) tuple to fail.
+"""
+import time
+import pytest
+import requests
+from unittest.mock import MagicMock
+from src.rodeo.chat import Chat
+from src.rodeo.retry import DeadlineExceeded, LatencyTracker, RetryPolicy, backoff_delay, is_retryable
+from tests.stub_server import StubAPI
+
+@pytest.fixture
+def api():
+    with StubAPI() as api:
+        yield api
+
+def make_chat(api, tmp_path=None, **policy):
+    policy.setdefault("base", 0.01)
+    chat = Chat(str(tmp_path / "session") if tmp_path else None, retry=RetryPolicy(**policy))
+    chat.api_url = api.url
+    return chat
+
+def test_backoff_delay():
+    assert backoff_delay(3, retry_after=2.5) == 2.5
+    assert backoff_delay(3, retry_after=120, cap=60) == 60
+    assert all(0 <= backoff_delay(attempt, base=1.0, cap=4.0) <= min(4.0, 2 ** attempt) for attempt in range(6) for _ in range(20))
+
+def test_is_retryable():
+    def http_error(status):
+        return requests.HTTPError(response=MagicMock(status_code=status))
+
+    assert is_retryable(http_error(429)) and is_retryable(http_error(503)) and is_retryable(http_error(529))
+    assert not is_retryable(http_error(400)) and not is_retryable(http_error(401))
+    assert is_retryable(requests.ConnectionError()) and is_retryable(requests.ReadTimeout())
+    assert not is_retryable(ValueError())
+
+def test_retries_rate_limited_request_honoring_retry_after(api):
+    api.faults = [(429, {"retry-after": "0.3"}), (529, {"retry-after": "0"})]
+    chat = make_chat(api)
+
+    start = time.monotonic()
+    assert chat.get_response("hello") == "HELLO"
+
+    assert time.monotonic() - start >= 0.3
+    assert len(api.requests) == 3
+    assert chat.retry.retries == 2
+    assert chat.messages == [{"role": "user", "content": "hello"}, {"role": "assistant", "content": "HELLO"}]
+
+def test_client_error_is_not_retried_and_history_rolls_back(api, tmp_path):
+    chat = make_chat(api, tmp_path)
+    chat.get_response("first")
+    api.faults = [(400, {})]
+
+    with pytest.raises(requests.HTTPError):
+        chat.get_response("second")
+
+    assert len(api.requests) == 2
+    assert [m["content"] for m in chat.messages] == ["first", "FIRST"]
+    assert [m["content"] for m in Chat(chat.session_file).messages] == ["first", "FIRST"]
+    assert chat.get_response("third") == "THIRD"
+
+def test_gives_up_after_max_retries(api):
+    api.faults = [(503, {})] * 5
+    chat = make_chat(api, max_retries=2)
+
+    with pytest.raises(requests.HTTPError):
+        chat.get_response("hello")
+
+    assert len(api.requests) == 3
+    assert chat.messages == []
+
+def test_stalled_response_times_out_and_is_retried(api):
+    api.faults = [2.0]
+    chat = make_chat(api)
+    chat.timeout = 0.2
+
+    start = time.monotonic()
+    assert chat.get_response("hello") == "HELLO"
+    assert time.monotonic() - start < 1.5
+
+def test_dropped_connection_is_retried(api):
+    api.faults = ["drop"]
+
+    assert make_chat(api).get_response("hello") == "HELLO"
+    assert len(api.requests) == 2
+
+def test_deadline_bounds_the_whole_call(api):
+    api.faults = [1.0, 1.0, 1.0]
+    chat = make_chat(api, deadline=0.5, max_retries=5)
+
+    start = time.monotonic()
+    with pytest.raises((requests.Timeout, DeadlineExceeded)):
+        chat.get_response("hello")
+
+    assert time.monotonic() - start < 0.9
+    assert chat.messages == []
+
+def test_hedged_request_wins_over_stalled_one(api):
+    api.faults = [1.5]
+    chat = make_chat(api, hedge_after=0.1)
+
+    start = time.monotonic()
+    assert chat.get_response("hello") == "HELLO"
+
+    assert time.monotonic() - start < 1.0
+    assert chat.retry.hedges == 1
+    assert len(api.requests) == 2
+    assert chat.messages == [{"role": "user", "content": "hello"}, {"role": "assistant", "content": "HELLO"}]
+
+def test_fast_response_is_not_hedged(api):
+    chat = make_chat(api, hedge_after=0.5)
+
+    chat.get_response("hello")
+
+    assert chat.retry.hedges == 0
+    assert len(api.requests) == 1
+
+def test_p95_hedge_threshold():
+    tracker = LatencyTracker(min_samples=20)
+    for i in range(19):
+        tracker.observe(i / 100)
+    assert tracker.percentile(0.95) is None
+
+    tracker.observe(0.19)
+    assert tracker.percentile(0.95) == 0.19
+
+    policy = RetryPolicy(hedge_after="p95")
+    assert policy.hedge_threshold() is None
+    for _ in range(100):
+        policy.latencies.observe(0.1)
+    assert policy.hedge_threshold() == 0.1
+
+def test_failed_stream_rolls_back(api):
+    api.faults = [(500, {})]
+    chat = make_chat(api, max_retries=0)
+
+    with pytest.raises(requests.HTTPError):
+        list(chat.stream_response("hello"))
+
+    assert chat.messages == []
+    assert "".join(chat.stream_response("again")) == "AGAIN"
+    assert len(chat.messages) == 2
@@ -0,0 +1,134 @@
+import time
+import random
+import marshal
+from src.rodeo.chat import Chat
+from src.rodeo.context import ContextWindow
+from src.rodeo.providers import StubProvider
+from src.rodeo.search import INDEX_HEADER, INDEX_MAGIC, INDEX_VERSION, SNAPSHOT_EVERY, SearchIndex, search_path, tokenize
+
+def conversation():
+    return [
+        {"role": "user", "content": "My name is Alice and I live in Lisbon."},
+        {"role": "assistant", "content": "Nice to meet you, Alice."},
+        {"role": "user", "content": "I have a cat called Miso."},
+        {"role": "assistant", "content": "Miso sounds lovely."},
+        {"role": "user", "content": "Which trains go to Porto?"},
+        {"role": "assistant", "content": "The Alfa Pendular runs between Lisbon and Porto."},
+    ]
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("What's my NAME, again?") == ["s", "name", "again"]
+
+def test_search_ranks_by_relevance():
+    index = SearchIndex()
+    index.sync(conversation())
+
+    assert index.search("what is my cat called")[0][0] == 2
+    assert [position for position, _ in index.search("Porto trains")][:2] == [4, 5]
+    assert {position for position, _ in index.search("Miso")} == {2, 3}
+    assert [position for position, _ in index.search("Miso", before=3)] == [2]
+    assert index.search("unrelated words") == []
+
+def test_index_is_saved_and_extended_incrementally(tmp_path):
+    path = str(tmp_path / "session.search")
+    messages = conversation()
+    index = SearchIndex(path)
+    index.sync(messages[:4])
+    size = (tmp_path / "session.search").stat().st_size
+
+    index.sync(messages)
+    assert (tmp_path / "session.search").stat().st_size > size
+
+    reloaded = SearchIndex(path)
+    reloaded.sync(messages)
+    assert len(reloaded) == 6
+    assert reloaded.search("Porto") == index.search("Porto")
+
+def test_index_is_rebuilt_when_history_changes(tmp_path):
+    path = str(tmp_path / "session.search")
+    SearchIndex(path).sync(conversation())
+
+    index = SearchIndex(path)
+    replaced = [{"role": "user", "content": "Tell me about Porto."}, {"role": "assistant", "content": "Porto is a city."}]
+    index.sync(replaced)
+    assert len(index) == 2
+    assert index.search("Miso") == []
+
+    index.sync([])
+    assert len(index) == 0
+
+def test_torn_index_tail_is_reindexed(tmp_path):
+    path = tmp_path / "session.search"
+    messages = conversation()
+    index = SearchIndex(str(path))
+    index.sync(messages[:2])
+    index.sync(messages)
+    path.write_bytes(path.read_bytes()[:-5])
+
+    reloaded = SearchIndex(str(path))
+    reloaded.sync(messages)
+    assert len(reloaded) == 6
+    assert reloaded.search("Porto") == index.search("Porto")
+
+def test_damaged_snapshot_is_rebuilt(tmp_path):
+    path = tmp_path / "session.search"
+    messages = conversation()
+    expected = SearchIndex()
+    expected.sync(messages)
+    for snapshot in (b"\xff" * 16, marshal.dumps([1, 2]), marshal.dumps({"lengths": b"abc"})):
+        SearchIndex(str(path)).sync(messages)
+        path.write_bytes(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(snapshot)) + snapshot)
+
+        index = SearchIndex(str(path))
+        index.sync(messages)
+        assert index.search("Porto") == expected.search("Porto")
+        reloaded = SearchIndex(str(path))
+        reloaded.sync(messages)
+        assert len(reloaded) == 6 and reloaded._tail == 0
+
+def test_large_catch_up_is_snapshotted(tmp_path):
+    path = str(tmp_path / "session.search")
+    messages = [{"role": "user", "content": f"fact number {i} is word{i}"} for i in range(SNAPSHOT_EVERY + 10)]
+    SearchIndex(path).sync(messages)
+
+    index = SearchIndex(path)
+    index.sync(messages)
+    assert index._tail == 0
+    assert index.search("word7")[0][0] == 7
+
+def test_lookup_is_fast_on_long_histories():
+    words = [f"w{i}" for i in range(5000)]
+    rng = random.Random(0)
+    index = SearchIndex()
+    index.sync([{"role": "user", "content": " ".join(rng.choices(words, k=20))} for _ in range(20000)])
+
+    start = time.perf_counter()
+    index.search("w1 w2 w3 w4")
+    assert time.perf_counter() - start < 0.05
+
+def test_search_path():
+    assert search_path("/tmp/s.session") == "/tmp/s.session.search"
+    assert search_path("sqlite:/tmp/r.db#work") == "/tmp/r.db.work.search"
+
+def test_chat_recalls_relevant_older_turns(tmp_path):
+    seen = []
+
+    def reply(payload):
+        seen.append(payload)
+        return "ok"
+
+    session = str(tmp_path / "session")
+    chat = Chat(session, context=ContextWindow(100, strategy="retrieve"), provider=StubProvider(reply=reply))
+    chat.messages = conversation() + [{"role": "user", "content": "Filler " * 20}, {"role": "assistant", "content": "ok"}]
+    chat.save()
+
+    chat.get_response("Remind me, what is my name?")
+
+    payload = seen[-1]
+    assert payload["messages"][-1]["content"] == "Remind me, what is my name?"
+    assert "user: My name is Alice and I live in Lisbon." in payload["system"]
+    assert "Miso" not in payload["system"]
+    # Everything before the prompt was indexed next to the session.
+    index = SearchIndex(search_path(session))
+    index._load()
+    assert len(index) == 8
@@ -0,0 +1,125 @@
+import os
+import pytest
+from src.rodeo.chat import Chat
+from src.rodeo.context import ContextWindow
+from src.rodeo.providers import StubProvider
+from src.rodeo.segments import write_segments
+from src.rodeo.session_log import SessionLog
+
+def history(count):
+    return [{"role": ("user", "assistant")[i % 2], "content": f"message {i} " + "lorem ipsum " * 20} for i in range(count)]
+
+@pytest.fixture
+def log(tmp_path):
+    log = SessionLog(str(tmp_path / "session"))
+    log.hot_messages = 2
+    log.segment_messages = 4
+    return log
+
+def test_old_messages_move_to_cold_segments(log):
+    messages = history(11)
+    for message in messages:
+        log.append([message])
+
+    with open(log.path, 'rb') as f:
+        assert f.readline().startswith(b'{"rodeo_session": 1, "cold": 8')
+    assert os.path.exists(log.cold_path)
+    loaded = log.load()
+    assert (loaded.cold_count, len(loaded.hot)) == (8, 3)
+    assert loaded == messages
+    assert len(log) == 11
+    assert log.tail(2) == messages[-2:]
+    assert log.tail(6) == messages[-6:]
+
+def test_cold_segments_are_read_on_demand(log):
+    messages = history(14)
+    log.append(messages)
+    loaded = log.load()
+    assert loaded.cold_count == 12
+
+    assert loaded[-1] == messages[-1] and loaded[12:] == messages[12:]
+    assert loaded.cold._segments == {}
+    assert loaded[5] == messages[5]
+    assert list(loaded.cold._segments) == [1]
+    assert loaded[2:6] == messages[2:6]
+    assert sorted(loaded.cold._segments) == [0, 1]
+    # A prefix, as passed to the search index, shares the segments.
+    assert loaded[:-1].cold is loaded.cold and loaded[:-1] == messages[:-1]
+
+def test_history_behaves_as_a_list(log):
+    messages = history(10)
+    log.append(messages)
+    loaded = log.load()
+
+    loaded.append({"role": "user", "content": "new"})
+    del loaded[10:]
+    assert loaded.cold is not None and loaded == messages
+    assert loaded.pop() == messages[-1]
+    del loaded[0]
+    assert loaded.cold is None and loaded == messages[1:-1]
+    with pytest.raises(IndexError):
+        loaded[-100]
+
+def test_compaction_keeps_cold_segments(log):
+    messages = history(10)
+    log.append(messages)
+    log.update_meta(summary="s")
+    with open(log.cold_path, 'rb') as f:
+        cold = f.read()
+
+    assert log.compact() == 10
+    with open(log.cold_path, 'rb') as f:
+        assert f.read() == cold
+    assert log.load() == messages
+    assert log.meta() == {"summary": "s"}
+
+def test_rewrite_replaces_cold_segments(log):
+    log.append(history(10))
+    log.rewrite(history(3))
+
+    assert not os.path.exists(log.cold_path)
+    assert log.load() == history(3)
+
+def test_interrupted_tiering_is_ignored(log):
+    messages = history(6)
+    log.append(messages)
+    loaded = log.load()
+    # A segment written by a move that never updated the session file.
+    write_segments(log.cold_path, [history(4)], loaded.cold.end)
+
+    assert log.load() == messages
+    log.append(history(8)[6:])
+    assert log.load() == history(8)
+
+def test_missing_cold_file_keeps_the_hot_messages(log, capsys):
+    messages = history(6)
+    log.append(messages)
+    os.remove(log.cold_path)
+
+    assert log.load() == messages[4:]
+    assert "missing or damaged" in capsys.readouterr().out
+
+def test_compressed_session_is_smaller(tmp_path):
+    plain = SessionLog(str(tmp_path / "plain"))
+    plain.hot_messages = 10 ** 9
+    plain.append(history(5000))
+    tiered = SessionLog(str(tmp_path / "tiered"))
+    tiered.append(history(5000))
+
+    assert os.path.getsize(tiered.path) < os.path.getsize(plain.path) / 4
+    assert os.path.getsize(tiered.path) + os.path.getsize(tiered.cold_path) < os.path.getsize(plain.path) / 2
+
+def test_chat_leaves_cold_segments_unread(tmp_path):
+    session = str(tmp_path / "session")
+    chat = Chat(session, provider=StubProvider())
+    chat.log.hot_messages = 2
+    chat.log.segment_messages = 4
+    for i in range(6):
+        chat.get_response(f"turn {i}")
+
+    chat = Chat(session, context=ContextWindow(20), provider=StubProvider())
+    assert chat.messages.cold_count == 8
+    assert chat.get_response("again") == "AGAIN"
+    assert chat.messages.cold._segments == {}
+    assert [m["content"] for m in Chat(session).messages][-4:] == ["turn 5", "TURN 5", "again", "AGAIN"]
+    assert len(Chat(session).messages) == 14
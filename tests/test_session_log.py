@@ -0,0 +1,136 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+from src.rodeo.session_log import SessionLog, HEADER_LINE
+
+@pytest.fixture
+def log(tmp_path):
+    return SessionLog(str(tmp_path / "session.jsonl"))
+
+def test_append_and_load(log):
+    log.append([{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}])
+    log.append([{"role": "user", "content": "Again"}])
+
+    assert log.load() == [
+        {"role": "user", "content": "Hi"},
+        {"role": "assistant", "content": "Hello"},
+        {"role": "user", "content": "Again"},
+    ]
+    assert len(log) == 3
+
+def test_append_only_writes_new_lines(log):
+    log.append([{"role": "user", "content": "Hi"}])
+    with open(log.path, 'rb') as f:
+        before = f.read()
+
+    log.append([{"role": "assistant", "content": "Hello"}])
+
+    with open(log.path, 'rb') as f:
+        after = f.read()
+    assert after.startswith(before)
+    assert before.startswith(HEADER_LINE)
+
+def test_tail_uses_index(log):
+    log.append([{"role": "user", "content": str(i)} for i in range(100)])
+
+    assert log.tail(2) == [{"role": "user", "content": "98"}, {"role": "user", "content": "99"}]
+    assert log.tail(0) == []
+    assert len(log.tail(500)) == 100
+
+def test_meta_latest_wins(log):
+    log.append([{"role": "user", "content": "Hi"}])
+    log.update_meta(summary="first")
+    log.update_meta(summary="second")
+
+    assert log.meta() == {"summary": "second"}
+    assert log.load() == [{"role": "user", "content": "Hi"}]
+
+def test_migrates_legacy_json_array(tmp_path):
+    path = tmp_path / "legacy.session"
+    path.write_text(json.dumps([{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]))
+
+    log = SessionLog(str(path))
+
+    assert log.load() == [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]
+    assert path.read_bytes().startswith(HEADER_LINE)
+
+def test_torn_line_is_skipped(log):
+    log.append([{"role": "user", "content": "Hi"}])
+    with open(log.path, 'ab') as f:
+        f.write(b'{"role": "assistant", "cont')
+
+    log.append([{"role": "user", "content": "Still here"}])
+
+    assert log.load() == [{"role": "user", "content": "Hi"}, {"role": "user", "content": "Still here"}]
+    assert len(log) == 2
+    assert log.tail(2) == log.load()
+
+def test_corrupt_meta_line_keeps_the_last_good_one(log):
+    log.append([{"role": "user", "content": "Hi"}], meta={"summary": "kept"})
+    with open(log.path, 'ab') as f:
+        f.write(b'{"meta": {"summary": "tor\n')
+    log.append([{"role": "user", "content": "Again"}])
+
+    assert log.meta() == {"summary": "kept"}
+    assert len(log) == 2
+
+def test_compact_is_atomic_and_drops_garbage(log):
+    log.append([{"role": "user", "content": "Hi"}])
+    log.update_meta(summary="old")
+    log.update_meta(summary="new")
+    with open(log.path, 'ab') as f:
+        f.write(b'not json\n')
+
+    assert log.compact() == 1
+    lines = open(log.path, 'rb').read().splitlines()
+    assert len(lines) == 3
+    assert log.meta() == {"summary": "new"}
+    assert log.tail(1) == [{"role": "user", "content": "Hi"}]
+
+def test_legacy_corrupt_file_is_kept(tmp_path):
+    path = tmp_path / "legacy.session"
+    path.write_text('[{"role": "user", "content": "Hi"}')
+
+    assert SessionLog(str(path)).load() == []
+    assert (tmp_path / "legacy.session.corrupt").read_text() == '[{"role": "user", "content": "Hi"}'
+
+WORKER = """
+import sys
+from unittest.mock import MagicMock
+from rodeo.chat import Chat
+
+class EchoTransport:
+    timeout = (10.0, 600.0)
+
+    def post(self, url, json=None, **kwargs):
+        response = MagicMock()
+        response.json.return_value = {"content": [{"text": "re:" + json["messages"][-1]["content"]}]}
+        return response
+
+path, worker, turns = sys.argv[1], sys.argv[2], int(sys.argv[3])
+for i in range(turns):
+    Chat(path, transport=EchoTransport()).get_response(f"{worker}-{i}")
+"""
+
+def test_parallel_invocations_do_not_lose_turns(tmp_path):
+    """Many processes appending to one session must keep every turn intact and contiguous."""
+    path = str(tmp_path / "shared.session")
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+    env = dict(os.environ, PYTHONPATH=src)
+    workers, turns = 12, 10
+
+    processes = [
+        subprocess.Popen([sys.executable, "-c", WORKER, path, str(w), str(turns)], env=env)
+        for w in range(workers)
+    ]
+    assert all(p.wait(timeout=120) == 0 for p in processes)
+
+    messages = SessionLog(path).load()
+    assert len(messages) == workers * turns * 2
+    for user, assistant in zip(messages[::2], messages[1::2]):
+        assert user["role"] == "user"
+        assert assistant == {"role": "assistant", "content": "re:" + user["content"]}
+    assert {m["content"] for m in messages[::2]} == {f"{w}-{i}" for w in range(workers) for i in range(turns)}
+    assert len(SessionLog(path)) == len(messages)
@@ -0,0 +1,136 @@
+import os
+import time
+import fcntl
+import threading
+import multiprocessing
+import pytest
+import requests
+from unittest.mock import MagicMock
+from concurrent.futures import ThreadPoolExecutor
+from src.rodeo.chat import Chat
+from src.rodeo.cli import build_parser, make_coalesce
+from src.rodeo.providers import StubProvider
+from src.rodeo.retry import RetryPolicy
+from src.rodeo.singleflight import SingleFlight
+
+def ask(directory, calls_file, prompt="hello"):
+    def reply(payload):
+        with open(calls_file, 'a') as f:
+            f.write("call\n")
+        return "reply to " + payload["messages"][-1]["content"]
+
+    chat = Chat(None, provider=StubProvider(latency=0.3, reply=reply), coalesce=SingleFlight(directory))
+    return chat.get_response(prompt)
+
+def hold_lock(path):
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    return fd
+
+def test_identical_requests_in_threads_share_one_call(tmp_path):
+    calls = tmp_path / "calls"
+    with ThreadPoolExecutor(5) as pool:
+        replies = list(pool.map(lambda _: ask(str(tmp_path / "inflight"), str(calls)), range(5)))
+
+    assert replies == ["reply to hello"] * 5
+    assert calls.read_text().count("call") == 1
+
+def test_identical_requests_in_processes_share_one_call(tmp_path):
+    calls = tmp_path / "calls"
+    directory = str(tmp_path / "inflight")
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        replies = pool.starmap(ask, [(directory, str(calls))] * 4)
+
+    assert replies == ["reply to hello"] * 4
+    assert calls.read_text().count("call") == 1
+
+def test_different_requests_are_not_coalesced(tmp_path):
+    calls = tmp_path / "calls"
+    with ThreadPoolExecutor(2) as pool:
+        replies = list(pool.map(lambda prompt: ask(str(tmp_path / "inflight"), str(calls), prompt), ["a", "b"]))
+
+    assert replies == ["reply to a", "reply to b"]
+    assert calls.read_text().count("call") == 2
+
+def test_finished_calls_are_not_reused(tmp_path):
+    flight = SingleFlight(str(tmp_path))
+    assert flight.do("k", lambda: 1) == 1
+    assert flight.do("k", lambda: 2) == 2
+    assert (flight.led, flight.coalesced) == (2, 0)
+
+def test_waiters_make_the_call_when_the_leader_failed(tmp_path):
+    flight = SingleFlight(str(tmp_path))
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.2)
+        raise ValueError("bad request")
+
+    leader = ThreadPoolExecutor(1).submit(flight.do, "k", fail)
+    started.wait()
+    assert flight.do("k", lambda: "mine") == "mine"
+    with pytest.raises(ValueError):
+        leader.result()
+    assert flight.coalesced == 0
+
+def test_waiters_retry_a_rate_limited_call_themselves(tmp_path):
+    flight = SingleFlight(str(tmp_path))
+    started = threading.Event()
+    rate_limited = requests.HTTPError(response=MagicMock(status_code=429, headers={}))
+
+    def leader_call():
+        started.set()
+        time.sleep(0.2)
+        raise rate_limited
+
+    attempts = iter([rate_limited])
+
+    def waiter_send(remaining):
+        error = next(attempts, None)
+        if error is not None:
+            raise error
+        return "ok"
+
+    leader = ThreadPoolExecutor(1).submit(flight.do, "k", leader_call)
+    started.wait()
+    policy = RetryPolicy(max_retries=1, base=0)
+    assert flight.do("k", lambda: policy.call(waiter_send)) == "ok"
+    assert policy.retries == 1
+    with pytest.raises(requests.HTTPError):
+        leader.result()
+
+def test_waiter_takes_over_from_a_dead_leader(tmp_path):
+    flight = SingleFlight(str(tmp_path))
+    fd = hold_lock(str(tmp_path / "k"))
+    waiter = ThreadPoolExecutor(1).submit(flight.do, "k", lambda: "mine")
+    time.sleep(0.1)
+    assert not waiter.done()
+
+    os.close(fd)  # As when the leader's process dies: the lock goes, no result is written.
+    assert waiter.result(timeout=5) == "mine"
+    assert flight.led == 1
+
+def test_waiter_gives_up_on_a_hung_leader(tmp_path):
+    flight = SingleFlight(str(tmp_path), timeout=0.2)
+    fd = hold_lock(str(tmp_path / "k"))
+    try:
+        start = time.monotonic()
+        assert flight.do("k", lambda: "mine") == "mine"
+        assert 0.2 <= time.monotonic() - start < 1.0
+    finally:
+        os.close(fd)
+
+def test_stale_result_files_are_swept(tmp_path):
+    old = tmp_path / "old"
+    old.write_text("{}")
+    os.utime(old, (0, 0))
+    (tmp_path / "recent").write_text("{}")
+
+    SingleFlight(str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["recent"]
+
+def test_coalesce_flag(tmp_path):
+    assert make_coalesce(build_parser().parse_args(["hi"])) is None
+    flight = make_coalesce(build_parser().parse_args(["--coalesce", str(tmp_path), "--timeout", "30", "hi"]))
+    assert (flight.directory, flight.timeout) == (str(tmp_path), 30.0)
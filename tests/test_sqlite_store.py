@@ -0,0 +1,137 @@
+import io
+import json
+import time
+import pytest
+from unittest.mock import MagicMock
+from src.rodeo.chat import Chat
+from src.rodeo.session_manager import SessionManager, open_store, resolve_session
+from src.rodeo.sqlite_store import SqliteStore, connect, list_sessions, prune_sessions
+from src.rodeo import sessions
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "rodeo.db")
+
+def test_append_load_and_tail(db):
+    store = SqliteStore(db, "work")
+    store.append([{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}])
+    store.append([{"role": "user", "content": "Again"}])
+
+    assert store.load() == [
+        {"role": "user", "content": "Hi"},
+        {"role": "assistant", "content": "Hello"},
+        {"role": "user", "content": "Again"},
+    ]
+    assert len(store) == 3
+    assert store.tail(1) == [{"role": "user", "content": "Again"}]
+    assert SqliteStore(db, "other").load() == []
+
+def test_meta_rewrite_and_stamp(db):
+    store = SqliteStore(db, "work")
+    assert store.stamp() is None
+    store.append([{"role": "user", "content": "Hi"}])
+    first = store.stamp()
+    store.update_meta(summary="short")
+
+    assert store.meta() == {"summary": "short"}
+    assert store.stamp() != first
+
+    store.rewrite([{"role": "user", "content": "Fresh"}], {"summary": "new"})
+    assert store.load() == [{"role": "user", "content": "Fresh"}]
+    assert store.meta() == {"summary": "new"}
+
+def test_failed_transaction_rolls_back(db):
+    store = SqliteStore(db, "work")
+    store.append([{"role": "user", "content": "Hi"}])
+
+    with pytest.raises(RuntimeError):
+        with store.lock:
+            store.append([{"role": "assistant", "content": "Half"}])
+            raise RuntimeError("boom")
+
+    assert store.load() == [{"role": "user", "content": "Hi"}]
+
+def test_open_store_and_resolve(tmp_path):
+    spec = resolve_session("sqlite:rodeo.db#work", str(tmp_path))
+    assert spec == f"sqlite:{tmp_path}/rodeo.db#work"
+    assert open_store(spec).path == spec
+    assert resolve_session("chat.session", str(tmp_path)) == str(tmp_path / "chat.session")
+
+def test_chat_uses_sqlite_session(db):
+    transport = MagicMock()
+    transport.post.return_value.json.return_value = {"content": [{"text": "Hello"}]}
+    chat = Chat(f"sqlite:{db}#work", transport=transport)
+
+    chat.get_response("Hi")
+    chat.get_response("Again")
+
+    assert Chat(f"sqlite:{db}#work").messages == [
+        {"role": "user", "content": "Hi"},
+        {"role": "assistant", "content": "Hello"},
+        {"role": "user", "content": "Again"},
+        {"role": "assistant", "content": "Hello"},
+    ]
+
+def test_session_manager_inserts_turns(db):
+    manager = SessionManager(f"sqlite:{db}#work")
+    manager.add_message("user", "Hi")
+    manager.add_message("assistant", "Hello")
+
+    assert SessionManager(f"sqlite:{db}#work").get_history() == [
+        {"role": "user", "content": "Hi"},
+        {"role": "assistant", "content": "Hello"},
+    ]
+    manager.clear_history()
+    assert SqliteStore(db, "work").load() == []
+
+def test_session_manager_reads_legacy_file(tmp_path):
+    path = tmp_path / "old.session"
+    path.write_text(json.dumps({"history": [{"role": "user", "content": "Hi"}]}))
+
+    assert SessionManager(str(path)).get_history() == [{"role": "user", "content": "Hi"}]
+
+def test_list_and_prune(db):
+    conn = connect(db)
+    for name in ("a", "b", "c"):
+        SqliteStore(db, name, conn=conn).append([{"role": "user", "content": name}])
+    conn.execute("UPDATE sessions SET updated = ? WHERE id = 'a'", (time.time() - 30 * 86400,))
+
+    assert [row[:2] for row in list_sessions(conn)][-1] == ("a", 1)
+    assert prune_sessions(conn, older_than=7 * 86400) == ["a"]
+    assert prune_sessions(conn, keep=1) == ["b"]
+    assert [row[0] for row in list_sessions(conn)] == ["c"]
+    assert conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 1
+
+def test_sessions_command(db, tmp_path):
+    SqliteStore(db, "work").append([{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}])
+
+    out = io.StringIO()
+    sessions.main(["--db", db, "list"], out=out)
+    assert out.getvalue().startswith("work\t2 messages")
+
+    out = io.StringIO()
+    sessions.main(["--db", db, "show", "work"], out=out)
+    assert out.getvalue() == "user: Hi\nassistant: Hello\n"
+
+    out = io.StringIO()
+    sessions.main(["--db", db, "export", "work"], out=out)
+    assert [json.loads(line) for line in out.getvalue().splitlines()] == SqliteStore(db, "work").load()
+
+    legacy = tmp_path / "old.session"
+    legacy.write_text(json.dumps([{"role": "user", "content": "Old"}]))
+    sessions.main(["--db", db, "import", "--name", "old", str(legacy)], out=io.StringIO())
+    assert SqliteStore(db, "old").load() == [{"role": "user", "content": "Old"}]
+
+def test_import_rejects_one_name_for_several_files(db, tmp_path):
+    files = []
+    for name in ("a", "b"):
+        path = tmp_path / f"{name}.session"
+        path.write_text(json.dumps([{"role": "user", "content": name}]))
+        files.append(str(path))
+
+    with pytest.raises(SystemExit):
+        sessions.main(["--db", db, "import", "--name", "old", *files], out=io.StringIO())
+    assert not SqliteStore(db, "old").exists()
+
+    sessions.main(["--db", db, "import", *files], out=io.StringIO())
+    assert [SqliteStore(db, path).load() for path in files] == [[{"role": "user", "content": "a"}], [{"role": "user", "content": "b"}]]
@@ -0,0 +1,20 @@
+from src.rodeo.sse import iter_events
+
+def test_iter_events():
+    lines = [
+        ': keep-alive',
+        'event: ping',
+        'data: {}',
+        '',
+        'data: line one',
+        'data: line two',
+        '',
+        'event: trailing',
+        'data:no-space',
+    ]
+
+    assert list(iter_events(lines)) == [
+        ("ping", "{}"),
+        ("message", "line one\nline two"),
+        ("trailing", "no-space"),
+    ]
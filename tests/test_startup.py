@@ -0,0 +1,57 @@
+"""
+Start-up cost checks.
+
+rodeo runs once per shell command, so the import time of the CLI matters.
+These tests use ``python -X importtime`` to keep network-only dependencies
+off the start-up path.  Wall-clock import time depends on the machine and
+its load, so it is tracked by ``benchmarks/bench_cli.py``; the budget check
+here takes the best of a few runs against a generous default budget, which
+RODEO_IMPORT_BUDGET_MS overrides.
+"""
+import os
+import sys
+import subprocess
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+IMPORT_BUDGET_MS = float(os.getenv("RODEO_IMPORT_BUDGET_MS", "250"))
+HEAVY_MODULES = ("requests", "urllib3", "asyncio", "hashlib", "sqlite3")
+
+def run_python(code, *flags):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    return subprocess.run([sys.executable, *flags, "-c", code], capture_output=True, text=True, env=env, check=True)
+
+def import_times(module):
+    """Return {module: cumulative import time in microseconds} for importing ``module``."""
+    result = run_python(f"import {module}", "-X", "importtime")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+def test_cli_import_is_light():
+    times = import_times("rodeo.cli")
+
+    for module in HEAVY_MODULES:
+        assert module not in times, f"{module} is imported at start-up"
+
+def test_cli_import_is_within_budget():
+    best = min(import_times("rodeo.cli")["rodeo.cli"] for _ in range(3)) / 1000
+
+    assert best < IMPORT_BUDGET_MS, f"importing rodeo.cli took {best:.0f} ms"
+
+def test_clear_does_not_load_network_stack(tmp_path):
+    session = str(tmp_path / "session")
+    code = (
+        "import sys\n"
+        f"sys.argv = ['rodeo', '--session', {session!r}, '--clear']\n"
+        "from rodeo.cli import main\n"
+        "main()\n"
+        f"print(sorted(m for m in sys.modules if m in {HEAVY_MODULES!r}))\n"
+    )
+
+    result = run_python(code)
+
+    assert result.stdout.splitlines() == ["Session cleared.", "[]"]
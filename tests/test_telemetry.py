@@ -0,0 +1,80 @@
+import io
+import json
+import pytest
+import requests
+from src.rodeo.chat import Chat
+from src.rodeo.retry import RetryPolicy
+from src.rodeo.telemetry import Telemetry, make_record, percentile, prometheus_text, summarize, main
+from tests.stub_server import StubAPI
+
+@pytest.fixture
+def telemetry(tmp_path):
+    return Telemetry(str(tmp_path / "metrics.jsonl"))
+
+def test_records_each_call(telemetry):
+    with StubAPI() as api:
+        chat = Chat(None, telemetry=telemetry)
+        chat.api_url = api.url
+        chat.get_response("Hello")
+        list(chat.stream_response("Again"))
+        api.faults.append((529, {"retry-after": "0"}))
+        chat.get_response("Overloaded")
+
+    plain, streamed, failed, retried = telemetry.read()
+    assert plain["status"] == 200 and plain["stream"] is False
+    assert plain["model"] == chat.model
+    assert plain["output"] > 0 and plain["stop_reason"] == "end_turn"
+    assert {"dns", "connect", "tls", "first_byte", "total"} <= plain.keys()
+    assert streamed["stream"] is True and streamed["stop_reason"] == "end_turn"
+    assert streamed["total"] >= streamed["first_byte"]
+    assert failed["status"] == 529 and "output" not in failed
+    assert retried["status"] == 200
+
+def test_connection_failure_is_recorded(telemetry):
+    chat = Chat(None, telemetry=telemetry, retry=RetryPolicy(max_retries=0))
+    chat.api_url = "http://127.0.0.1:9/v1/messages"
+
+    with pytest.raises(requests.ConnectionError):
+        chat.get_response("Hello")
+
+    assert [(r["status"], r["error"]) for r in telemetry.read()] == [(None, "ConnectionError")]
+
+def test_summarize_per_model():
+    records = [make_record("a", 200, {"total": t / 10, "first_byte": t / 20}, {"usage": {"output_tokens": 10}}) for t in range(1, 101)]
+    records.append(make_record("a", 429))
+    records.append(make_record("b", 200, {"total": 2.0, "first_byte": 1.0}, {"usage": {"input_tokens": 5, "output_tokens": 100}}))
+
+    summary = summarize(records)
+
+    assert summary["a"]["requests"] == 101 and summary["a"]["errors"] == 1
+    assert summary["a"]["latency"] == {0.5: 5.0, 0.95: 9.5, 0.99: 9.9}
+    assert summary["a"]["tokens"]["output"] == 1000
+    assert summary["b"]["tokens_per_second"] == 50.0
+    assert summary["b"]["statuses"] == {"200": 1}
+    assert percentile([], 0.5) is None
+
+def test_prometheus_text():
+    summary = summarize([make_record("m", 200, {"total": 1.5, "first_byte": 0.5}, {"usage": {"output_tokens": 3}})])
+
+    text = prometheus_text(summary)
+
+    assert 'rodeo_requests_total{model="m",status="200"} 1' in text
+    assert 'rodeo_request_duration_seconds{model="m",quantile="0.99"} 1.5' in text
+    assert 'rodeo_tokens_total{model="m",kind="output"} 3' in text
+    assert text.endswith("\n")
+
+def test_stats_command(telemetry, tmp_path):
+    telemetry.record(make_record("m", 200, {"total": 0.25, "first_byte": 0.1}, {"usage": {"output_tokens": 5}}))
+    with open(telemetry.path, 'ab') as f:
+        f.write(b'{"torn')
+
+    out = io.StringIO()
+    main(["--metrics", telemetry.path, "--prometheus", str(tmp_path / "rodeo.prom")], out=out)
+
+    header, row = out.getvalue().splitlines()
+    assert row.split("\t")[:6] == ["m", "1", "0", "250ms", "250ms", "250ms"]
+    assert "rodeo_requests_total" in (tmp_path / "rodeo.prom").read_text()
+
+    out = io.StringIO()
+    main(["--metrics", telemetry.path, "--json"], out=out)
+    assert json.loads(out.getvalue())["m"]["tokens"]["output"] == 5
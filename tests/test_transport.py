@@ -0,0 +1,66 @@
+import json
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.rodeo.transport import Transport
+
+class EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        reply = json.dumps({"echo": json.loads(body)}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1/messages"
+    server.shutdown()
+    server.server_close()
+
+def test_connection_is_reused(server_url):
+    transport = Transport(pool_size=2)
+
+    first = transport.post(server_url, json={"n": 1})
+    first_timings = transport.last_timings
+    second = transport.post(server_url, json={"n": 2})
+    second_timings = transport.last_timings
+
+    assert first.json() == {"echo": {"n": 1}}
+    assert second.json() == {"echo": {"n": 2}}
+    assert first_timings["reused"] is False
+    assert first_timings["connect"] > 0
+    assert second_timings["reused"] is True
+    assert second_timings["connect"] == 0
+    assert second_timings["total"] >= second_timings["first_byte"]
+    transport.close()
+
+def test_keep_alive_disabled(server_url):
+    transport = Transport(keep_alive=False)
+
+    transport.post(server_url, json={})
+    transport.post(server_url, json={})
+
+    assert transport.last_timings["reused"] is False
+    transport.close()
+
+def test_dns_is_timed_separately(server_url):
+    transport = Transport()
+
+    transport.post(server_url.replace("127.0.0.1", "localhost"), json={})
+
+    timings = transport.last_timings
+    assert timings["dns"] > 0
+    assert timings["connect"] >= 0
+    assert transport.post(server_url.replace("127.0.0.1", "localhost"), json={}).timings["dns"] == 0
+    transport.close()